@@ -0,0 +1,355 @@
+"""压缩归档：把未引用的图片按次写入一个 zip / tar.zst 归档（附清单），并可按条目恢复"""
+import fnmatch
+import io
+import json
+import os
+import shutil
+import tarfile
+import time
+import zipfile
+
+try:
+    import zstandard
+except ImportError:  # tar.zst 格式为可选功能
+    zstandard = None
+
+from cleaner_core import DELETED_FOLDER_NAME, OperationCancelled
+from cleaner_journal import new_run_id
+
+ARCHIVE_FORMATS = ('zip', 'tar.zst')
+MANIFEST_NAME = 'MANIFEST.json'
+# 归档旁的清单副本，列出或恢复时无需读取归档本身
+SIDECAR_SUFFIX = '.json'
+# 本身已压缩的格式在 zip 中直接存储，再压缩只会浪费 CPU
+STORED_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+ZSTD_LEVEL = 3
+COPY_BUFFER = 1 << 20
+
+
+def archive_available(fmt):
+    return fmt == 'zip' or (fmt == 'tar.zst' and zstandard is not None)
+
+
+class _ZipWriter:
+    def __init__(self, fileobj):
+        self.zf = zipfile.ZipFile(fileobj, 'w', allowZip64=True)
+
+    def add(self, path, name):
+        info = zipfile.ZipInfo.from_file(path, name)
+        info.compress_type = (zipfile.ZIP_STORED if name.lower().endswith(STORED_EXTENSIONS)
+                              else zipfile.ZIP_DEFLATED)
+        with open(path, 'rb') as src, self.zf.open(info, 'w', force_zip64=True) as dst:
+            shutil.copyfileobj(src, dst, COPY_BUFFER)
+
+    def add_bytes(self, name, data):
+        self.zf.writestr(name, data, zipfile.ZIP_DEFLATED)
+
+    def close(self):
+        self.zf.close()
+
+
+class _TarZstWriter:
+    def __init__(self, fileobj):
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        self.stream = compressor.stream_writer(fileobj, closefd=False)
+        self.tar = tarfile.open(fileobj=self.stream, mode='w|')
+
+    def add(self, path, name):
+        info = self.tar.gettarinfo(path, arcname=name)
+        with open(path, 'rb') as src:
+            self.tar.addfile(info, src)
+
+    def add_bytes(self, name, data):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self.tar.addfile(info, io.BytesIO(data))
+
+    def close(self):
+        self.tar.close()
+        self.stream.flush(zstandard.FLUSH_FRAME)
+        self.stream.close()
+
+
+def _abort(writer):
+    """放弃写了一半的归档：尽量关闭内部状态（临时文件随后被删除），忽略其中的错误"""
+    try:
+        writer.close()
+    except Exception:
+        pass
+
+
+_WRITERS = {'zip': _ZipWriter, 'tar.zst': _TarZstWriter}
+
+
+def _emit(log, message):
+    if log is not None:
+        log(message)
+
+
+def _member_name(img):
+    return img.replace(os.sep, '/')
+
+
+def _fsync_dir(folder):
+    """让目录项（重命名）落盘；Windows 上无法打开目录，跳过"""
+    try:
+        fd = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _write_json(path, data):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _archive_path(folder, assets_folder, run_id, fmt):
+    stem = f"{os.path.basename(os.path.normpath(assets_folder))}-{run_id}"
+    path = os.path.join(folder, f"{stem}.{fmt}")
+    n = 1
+    while os.path.lexists(path):
+        path = os.path.join(folder, f"{stem}~{n}.{fmt}")
+        n += 1
+    return path
+
+
+def archive_unused_images(assets_folder, unused_images, fmt='zip', archive_dir=None, log=None,
+                          progress=None, stats=None, should_stop=None):
+    """把未引用的图片顺序写入一个压缩归档，确认落盘后再删除原文件，返回已归档并删除的图片列表
+
+    归档默认放在 deleted_images 中，也可用 archive_dir 放到笔记库之外。归档先写入 .partial
+    临时文件并 fsync，重命名后写出同名 .json 清单，之后才逐个删除原文件；归档期间
+    被修改过的原文件不会删除。should_stop() 在写入阶段返回真时放弃整个归档，不删除任何文件。
+    """
+    if not unused_images:
+        return []
+    if fmt not in ARCHIVE_FORMATS:
+        raise ValueError(f"不支持的归档格式: {fmt}")
+    if not archive_available(fmt):
+        raise RuntimeError("tar.zst 格式需要安装 zstandard（pip install zstandard），或改用 zip")
+
+    start = time.perf_counter()
+    folder = archive_dir or os.path.join(assets_folder, DELETED_FOLDER_NAME)
+    os.makedirs(folder, exist_ok=True)
+    run_id = new_run_id()
+    archive_path = _archive_path(folder, assets_folder, run_id, fmt)
+    partial = archive_path + '.partial'
+
+    entries = []
+    total = len(unused_images)
+    manifest = None
+    try:
+        with open(partial, 'wb') as f:
+            writer = _WRITERS[fmt](f)
+            try:
+                # 按路径顺序写入，同一子文件夹中的文件连续读取
+                for i, img in enumerate(sorted(unused_images)):
+                    if should_stop is not None and should_stop():
+                        raise OperationCancelled()
+                    path = os.path.join(assets_folder, img)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        _emit(log, f"文件不存在: {img} (已被移动?)\n")
+                        continue
+                    writer.add(path, _member_name(img))
+                    entries.append({'src': img, 'name': _member_name(img),
+                                    'size': st.st_size, 'mtime_ns': st.st_mtime_ns})
+                    if progress is not None:
+                        progress(i, total)
+                manifest = {
+                    'run': run_id,
+                    'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'assets_folder': os.path.abspath(assets_folder),
+                    'format': fmt,
+                    'entries': entries,
+                }
+                writer.add_bytes(MANIFEST_NAME,
+                                 json.dumps(manifest, ensure_ascii=False).encode('utf-8'))
+            except BaseException:
+                _abort(writer)
+                raise
+            writer.close()
+            f.flush()
+            os.fsync(f.fileno())
+        if not entries:
+            os.remove(partial)
+            return []
+        os.replace(partial, archive_path)
+        _write_json(archive_path + SIDECAR_SUFFIX, manifest)
+        _fsync_dir(folder)
+    except BaseException:
+        try:
+            os.remove(partial)
+        except OSError:
+            pass
+        raise
+
+    original_bytes = sum(entry['size'] for entry in entries)
+    archive_bytes = os.path.getsize(archive_path)
+    _emit(log, f"已写入归档: {archive_path}（{len(entries)} 个文件，"
+               f"{original_bytes / 1024 / 1024:.2f} MB -> {archive_bytes / 1024 / 1024:.2f} MB）\n")
+
+    removed = []
+    removed_bytes = 0
+    for entry in entries:
+        path = os.path.join(assets_folder, entry['src'])
+        try:
+            st = os.stat(path)
+            if (st.st_size, st.st_mtime_ns) != (entry['size'], entry['mtime_ns']):
+                _emit(log, f"归档期间已修改，保留原文件: {entry['src']}\n")
+                continue
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            _emit(log, f"错误: 无法删除 {entry['src']}: {str(e)}\n")
+            continue
+        removed.append(entry['src'])
+        removed_bytes += entry['size']
+        _emit(log, f"已归档: {entry['src']}\n")
+
+    if stats is not None:
+        stats.stage('archive').add(time.perf_counter() - start, len(removed), removed_bytes)
+        stats.count('archive_written_bytes', archive_bytes)
+    return removed
+
+
+def read_manifest(archive_path):
+    """读取归档清单：优先读旁边的 .json，没有时从归档中读取"""
+    try:
+        with open(archive_path + SIDECAR_SUFFIX, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        pass
+    if archive_path.endswith('.zip'):
+        with zipfile.ZipFile(archive_path) as zf:
+            return json.loads(zf.read(MANIFEST_NAME).decode('utf-8'))
+    with _open_tar_zst(archive_path) as tar:
+        for member in tar:
+            if member.name == MANIFEST_NAME:
+                return json.loads(tar.extractfile(member).read().decode('utf-8'))
+    raise ValueError(f"归档中没有清单: {archive_path}")
+
+
+class _open_tar_zst:
+    """以流方式打开 tar.zst（只能顺序读取）"""
+
+    def __init__(self, path):
+        if zstandard is None:
+            raise RuntimeError("读取 tar.zst 需要安装 zstandard（pip install zstandard）")
+        self.file = open(path, 'rb')
+        self.reader = zstandard.ZstdDecompressor().stream_reader(self.file)
+        self.tar = tarfile.open(fileobj=self.reader, mode='r|')
+
+    def __enter__(self):
+        return self.tar
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tar.close()
+        self.reader.close()
+        self.file.close()
+
+
+def find_archives(path):
+    """根据归档文件、清单文件或目录查找归档；在目录中递归查找时只认带 .json 清单的归档"""
+    if os.path.isfile(path):
+        if path.endswith(SIDECAR_SUFFIX):
+            path = path[:-len(SIDECAR_SUFFIX)]
+        return [path]
+    archives = []
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        names = set(filenames)
+        for name in sorted(filenames):
+            if (name.endswith(tuple('.' + fmt for fmt in ARCHIVE_FORMATS))
+                    and name + SIDECAR_SUFFIX in names):
+                archives.append(os.path.join(dirpath, name))
+    return archives
+
+
+def _select(entries, patterns):
+    if not patterns:
+        return list(entries)
+    return [entry for entry in entries
+            if any(entry['src'] == p or fnmatch.fnmatch(entry['src'], p) for p in patterns)]
+
+
+def _restore_stream(src, entry, target, log, counts):
+    """把一个条目的数据流写回原位置（先写临时文件再重命名），已有同名文件时跳过"""
+    dst = os.path.normpath(os.path.join(target, entry['src']))
+    if os.path.commonpath([dst, target]) != target:
+        counts['failed'] += 1
+        _emit(log, f"错误: 条目路径越界，跳过: {entry['src']}\n")
+        return
+    if os.path.lexists(dst):
+        counts['skipped'] += 1
+        _emit(log, f"原位置已有同名文件，跳过: {entry['src']}\n")
+        return
+    tmp = dst + '.restoring'
+    try:
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        with open(tmp, 'wb') as f:
+            shutil.copyfileobj(src, f, COPY_BUFFER)
+        os.replace(tmp, dst)
+        mtime = entry['mtime_ns']
+        os.utime(dst, ns=(mtime, mtime))
+        counts['restored'] += 1
+        _emit(log, f"已恢复: {entry['src']}\n")
+    except Exception as e:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        counts['failed'] += 1
+        _emit(log, f"错误: 无法恢复 {entry['src']}: {str(e)}\n")
+
+
+def restore_archive(archive_path, patterns=None, target=None, log=None):
+    """从归档中恢复选中的条目（fnmatch 模式，默认全部）到原 .assets 文件夹或 target
+
+    zip 直接定位到各条目；tar.zst 顺序解压，只写出选中的条目，全部找到后提前结束。
+    返回 {'restored': n, 'skipped': n, 'failed': n}。
+    """
+    manifest = read_manifest(archive_path)
+    target = os.path.abspath(target or manifest['assets_folder'])
+    wanted = {entry['name']: entry for entry in _select(manifest['entries'], patterns)}
+    counts = {'restored': 0, 'skipped': 0, 'failed': 0}
+    if not wanted:
+        return counts
+
+    if archive_path.endswith('.zip'):
+        with zipfile.ZipFile(archive_path) as zf:
+            for name, entry in wanted.items():
+                try:
+                    src = zf.open(name)
+                except KeyError:
+                    counts['failed'] += 1
+                    _emit(log, f"错误: 归档中缺少条目 {name}\n")
+                    continue
+                with src:
+                    _restore_stream(src, entry, target, log, counts)
+        return counts
+
+    with _open_tar_zst(archive_path) as tar:
+        for member in tar:
+            entry = wanted.pop(member.name, None)
+            if entry is not None:
+                _restore_stream(tar.extractfile(member), entry, target, log, counts)
+            if not wanted:
+                break
+    for name in wanted:
+        counts['failed'] += 1
+        _emit(log, f"错误: 归档中缺少条目 {name}\n")
+    return counts
@@ -0,0 +1,282 @@
+"""基准测试：生成合成笔记库，分别计时清理流程的各个阶段并输出 JSON"""
+import json
+import os
+import platform
+import random
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+from cleaner_core import (assets_folder_for, diff_images, move_unused_images, scan_images,
+                          scan_used_images)
+from cleaner_stats import StageStats
+
+DEFAULT_PARAMS = {
+    'docs': 200,              # Markdown 文件数
+    'refs_per_doc': 20,       # 每个文件引用的图片数
+    'assets_per_doc': 25,     # 每个 .assets 文件夹中的图片数（超出引用数的部分即为孤儿）
+    'orphan_ratio': None,     # 直接指定孤儿比例时覆盖 assets_per_doc
+    'md_kb': 64,              # 每个 Markdown 文件的大小（KB），用正文和表格填充
+    'image_width': 1920,
+    'image_height': 1080,
+    'preview_limit': 200,     # 预览阶段解码的缩略图数量上限
+    'seed': 0,
+}
+
+# 在子进程中从解释器启动计时到拿到第一份分析结果：只用核心模块，或启动界面并展示预览
+_FIRST_RESULT_CORE = '''
+import sys, time
+from cleaner_core import analyze_markdown
+analyze_markdown(sys.argv[1])
+print(time.time())
+'''
+_FIRST_RESULT_GUI = '''
+import sys, time
+from PyQt5.QtWidgets import QApplication
+from cleaner_gui import MainWindow
+
+class ProbeWindow(MainWindow):
+    def show_analysis(self, result):
+        super().show_analysis(result)
+        QApplication.processEvents()
+        print(time.time(), flush=True)
+        self.close()
+        QApplication.quit()
+
+app = QApplication(sys.argv[:1])
+window = ProbeWindow()
+window.show()
+window.analyze_file(sys.argv[1])
+app.exec_()
+'''
+
+
+def make_png(width, height, seed=0):
+    """生成指定尺寸的 PNG（只依赖标准库），内容为带噪声的渐变以避免被过度压缩"""
+    rng = random.Random(seed)
+    row_pattern = bytes(rng.randrange(256) for _ in range(min(width * 3, 4096)))
+    rows = []
+    for y in range(height):
+        shift = (y * 7) % len(row_pattern)
+        row = (row_pattern[shift:] + row_pattern[:shift]) * (width * 3 // len(row_pattern) + 1)
+        rows.append(b'\x00' + row[:width * 3])
+    raw = b''.join(rows)
+
+    def chunk(tag, data):
+        return (struct.pack('>I', len(data)) + tag + data
+                + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff))
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header)
+            + chunk(b'IDAT', zlib.compress(raw, 1)) + chunk(b'IEND', b''))
+
+
+def _filler(rng, size):
+    """生成大约 size 字节的 Markdown 正文（段落 + 表格 + 普通链接）"""
+    words = ['typora', 'markdown', 'assets', 'image', 'note', 'vault', '清理', '图片', '笔记']
+    parts = []
+    total = 0
+    while total < size:
+        if rng.random() < 0.3:
+            line = '| ' + ' | '.join(rng.choice(words) for _ in range(8)) + ' |\n'
+        elif rng.random() < 0.1:
+            line = f"参考 [链接](https://example.com/{rng.randrange(10 ** 6)}) 与 [a] [b] (c)\n"
+        else:
+            line = ' '.join(rng.choice(words) for _ in range(16)) + '\n\n'
+        parts.append(line)
+        total += len(line.encode('utf-8'))
+    return ''.join(parts)
+
+
+def generate_vault(root, params):
+    """在 root 下生成合成笔记库，返回 Markdown 文件列表"""
+    rng = random.Random(params['seed'])
+    refs = params['refs_per_doc']
+    if params['orphan_ratio'] is not None:
+        ratio = min(max(params['orphan_ratio'], 0.0), 0.99)
+        assets = max(refs, int(round(refs / (1 - ratio))))
+    else:
+        assets = max(refs, params['assets_per_doc'])
+    png = make_png(params['image_width'], params['image_height'], params['seed'])
+
+    md_files = []
+    for d in range(params['docs']):
+        folder = os.path.join(root, f"dir{d % 20:02d}")
+        os.makedirs(folder, exist_ok=True)
+        md_file = os.path.join(folder, f"note{d:05d}.md")
+        assets_folder = assets_folder_for(md_file)
+        os.makedirs(assets_folder)
+        names = [f"image-{d:05d}-{i:04d}.png" for i in range(assets)]
+        for name in names:
+            with open(os.path.join(assets_folder, name), 'wb') as f:
+                f.write(png)
+
+        body = [f"# 笔记 {d}\n\n"]
+        per_ref = max(1, params['md_kb'] * 1024 // max(1, refs))
+        assets_rel = os.path.basename(assets_folder)
+        for name in rng.sample(names, refs):
+            body.append(f"![{name}]({assets_rel}/{name})\n\n")
+            body.append(_filler(rng, per_ref))
+        with open(md_file, 'w', encoding='utf-8') as f:
+            f.write(''.join(body))
+        md_files.append(md_file)
+    return md_files
+
+
+def _bench_preview(images, limit):
+    """离屏 Qt 下计时预览阶段：模型填充与缩略图解码；未安装 PyQt5 时返回 None"""
+    try:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        from PyQt5.QtWidgets import QApplication
+        from cleaner_thumbs import ThumbnailLoader, read_thumbnail
+        from cleaner_gui import PreviewModel
+    except ImportError:
+        return None
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    stages = {'preview_model': StageStats(), 'preview_decode': StageStats()}
+
+    loader = ThumbnailLoader()
+    model = PreviewModel(loader)
+    start = time.perf_counter()
+    model.add_images(images)
+    app.processEvents()
+    stages['preview_model'].seconds = time.perf_counter() - start
+    stages['preview_model'].items = len(images)
+
+    sample = [path for path, _ in images[:limit]]
+    start = time.perf_counter()
+    for path in sample:
+        read_thumbnail(path)
+    stages['preview_decode'].seconds = time.perf_counter() - start
+    stages['preview_decode'].items = len(sample)
+    stages['preview_decode'].bytes = sum(os.path.getsize(p) for p in sample)
+    loader.shutdown()
+    return stages
+
+
+def _first_result_seconds(script, md_file, cache_dir):
+    """在新进程中运行 script，返回从启动进程到其打印时间戳的秒数；失败时返回 None
+
+    缓存目录指向 cache_dir，保证测的是冷启动（没有索引和缩略图缓存）。
+    """
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen', XDG_CACHE_HOME=cache_dir,
+               LOCALAPPDATA=cache_dir)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)),
+                                                      env.get('PYTHONPATH')]))
+    start = time.time()
+    try:
+        output = subprocess.run([sys.executable, '-c', script, md_file], env=env,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                timeout=300, check=True).stdout
+        return float(output.split()[-1]) - start
+    except (OSError, subprocess.SubprocessError, ValueError, IndexError):
+        return None
+
+
+def _bench_first_result(md_file, root, gui):
+    """计时首个结果：first_result_core 只走核心分析，first_result 为启动界面到预览出现"""
+    stages = {}
+    scripts = [('first_result_core', _FIRST_RESULT_CORE)]
+    if gui:
+        scripts.append(('first_result', _FIRST_RESULT_GUI))
+    for name, script in scripts:
+        seconds = _first_result_seconds(script, md_file, os.path.join(root, '.cache', name))
+        if seconds is not None:
+            stages[name] = StageStats()
+            stages[name].add(seconds, 1)
+    return stages
+
+
+def run_benchmark(params, workdir=None, preview=True):
+    """生成笔记库并按阶段计时，返回可序列化为 JSON 的结果字典"""
+    params = dict(DEFAULT_PARAMS, **params)
+    own_dir = workdir is None
+    root = tempfile.mkdtemp(prefix='typora_cleaner_bench_') if own_dir else workdir
+    try:
+        stages = {name: StageStats() for name in ('generate', 'parse', 'listing', 'diff', 'move')}
+
+        start = time.perf_counter()
+        md_files = generate_vault(root, params)
+        stages['generate'].seconds = time.perf_counter() - start
+        stages['generate'].items = len(md_files)
+
+        plans = []
+        for md_file in md_files:
+            assets_folder = assets_folder_for(md_file)
+
+            start = time.perf_counter()
+            used = scan_used_images(md_file)
+            stages['parse'].seconds += time.perf_counter() - start
+            stages['parse'].items += 1
+            stages['parse'].bytes += os.path.getsize(md_file)
+
+            start = time.perf_counter()
+            all_images = scan_images(assets_folder)
+            stages['listing'].seconds += time.perf_counter() - start
+            stages['listing'].items += len(all_images)
+
+            start = time.perf_counter()
+            unused, used_in_folder = diff_images(assets_folder, all_images, used)
+            stages['diff'].seconds += time.perf_counter() - start
+            stages['diff'].items += len(all_images)
+            plans.append((assets_folder, unused, used_in_folder))
+
+        # 移动之前、在未改动的文件上测量，与 Typora 中“打开方式”启动的场景一致
+        first_result_stages = _bench_first_result(md_files[0], root, preview) if md_files else {}
+
+        preview_stages = None
+        if preview:
+            images = []
+            for assets_folder, unused, used_in_folder in plans:
+                images.extend((os.path.join(assets_folder, img), False) for img in unused)
+                images.extend((os.path.join(assets_folder, img), True) for img in used_in_folder)
+            preview_stages = _bench_preview(images, params['preview_limit'])
+
+        for assets_folder, unused, _ in plans:
+            sizes = sum(os.path.getsize(os.path.join(assets_folder, img)) for img in unused)
+            start = time.perf_counter()
+            moved = move_unused_images(assets_folder, unused)
+            stages['move'].seconds += time.perf_counter() - start
+            stages['move'].items += len(moved)
+            stages['move'].bytes += sizes
+
+        result_stages = {name: stage.to_dict() for name, stage in stages.items()}
+        result_stages.update({name: stage.to_dict() for name, stage in first_result_stages.items()})
+        if preview_stages is not None:
+            result_stages.update({name: stage.to_dict() for name, stage in preview_stages.items()})
+        return {
+            'meta': {
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'params': params,
+                'preview': preview_stages is not None,
+            },
+            'stages': result_stages,
+        }
+    finally:
+        if own_dir:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+def compare_results(baseline, current):
+    """对比两次基准测试结果，返回 [(阶段, 基线耗时, 当前耗时, 倍数)]"""
+    rows = []
+    for name, stage in current['stages'].items():
+        old = baseline.get('stages', {}).get(name)
+        if old is None:
+            continue
+        ratio = stage['seconds'] / old['seconds'] if old['seconds'] else float('inf')
+        rows.append((name, old['seconds'], stage['seconds'], ratio))
+    return rows
+
+
+def load_results(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,801 @@
+"""命令行入口：无需 PyQt5 即可批量清理整个笔记库"""
+import argparse
+import fnmatch
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from cleaner_core import (assets_folder_for, clean_markdown_file, diff_images, iter_markdown_files,
+                          move_unused_images, path_key, remove_unused_images, scan_images,
+                          scan_used_images)
+from cleaner_graph import ReferenceGraph
+from cleaner_index import INDEX_FILE_NAME, ReferenceIndex, file_key
+from cleaner_journal import find_journals, undo_moves
+from cleaner_stats import CleanStats
+
+COMMANDS = ('scan', 'undo', 'restore', 'optimize', 'dedup', 'similar', 'bench', 'watch')
+
+
+def _collect_jobs(root):
+    """将每个 .md 文件与其 .assets 文件夹配对，返回 (待处理列表, 跳过数量)"""
+    jobs = []
+    skipped = 0
+    for md_file in iter_markdown_files(root):
+        if os.path.isdir(assets_folder_for(md_file)):
+            jobs.append(md_file)
+        else:
+            skipped += 1
+    return jobs, skipped
+
+
+def _clean_job(job, archive=None):
+    md_file, dry_run, used_images, all_images, _ = job
+    return clean_markdown_file(md_file, dry_run, used_images, all_images, archive)
+
+
+def _archive_option(args):
+    """把 --archive / --archive-dir 转为 clean_markdown_file 的 archive 参数，格式不可用时返回 False"""
+    if not args.archive:
+        return None
+    from cleaner_archive import archive_available
+    if not archive_available(args.archive):
+        print("错误: tar.zst 格式需要安装 zstandard（pip install zstandard），或改用 --archive zip",
+              file=sys.stderr)
+        return False
+    archive_dir = os.path.abspath(args.archive_dir) if args.archive_dir else None
+    if archive_dir:
+        os.makedirs(archive_dir, exist_ok=True)
+    return args.archive, archive_dir
+
+
+def _open_index(args, root):
+    if args.no_index:
+        return None
+    db_path = args.index or os.path.join(root, INDEX_FILE_NAME)
+    try:
+        return ReferenceIndex(db_path)
+    except (OSError, sqlite3.Error) as e:
+        print(f"警告: 无法打开索引 {db_path}: {e}，将进行全量扫描", file=sys.stderr)
+        return None
+
+
+def _plan_jobs(jobs, index, dry_run):
+    """根据索引筛选需要处理的文件，返回 (任务列表, 未变化数量)
+
+    Markdown 与 .assets 文件夹均未变化且没有未引用图片时直接跳过；
+    只有其中之一命中缓存时，把缓存结果交给工作进程以省去对应的 I/O。
+    """
+    if index is None:
+        return [(md_file, dry_run, None, None, None) for md_file in jobs], 0
+
+    planned = []
+    unchanged = 0
+    for md_file in jobs:
+        folder = assets_folder_for(md_file)
+        md_key = file_key(md_file)
+        used_images = index.get_references(md_file, md_key)
+        all_images = index.get_listing(folder, file_key(folder))
+        if used_images is not None and all_images is not None \
+                and not diff_images(folder, all_images, used_images)[0]:
+            unchanged += 1
+            continue
+        # md_key 在解析前读取：解析期间文件若被修改，下次运行时会因 mtime 不一致而重新解析
+        planned.append((md_file, dry_run, used_images, all_images, md_key))
+    return planned, unchanged
+
+
+def _record_result(index, job, result):
+    """将工作进程的解析结果写回索引（目录 mtime 在移动之后重新读取）"""
+    md_file, _, used_images, _, md_key = job
+    if index is None or result['error']:
+        return
+    if used_images is None:
+        index.put_references(md_file, md_key, result['used_images'])
+    if result['subdirs'] is None:
+        # 列表来自缓存：没有移动时缓存仍然有效；有移动时目录 mtime 已变，下次重新扫描
+        return
+    folder = result['assets_folder']
+    index.put_listing(folder, file_key(folder), result['remaining_images'], result['subdirs'])
+
+
+def _print_result(result, root, verbose):
+    rel = os.path.relpath(result['md_file'], root)
+    if result['error']:
+        print(f"[失败] {rel}: {result['error']}", flush=True)
+    else:
+        print(f"[完成] {rel}  引用 {result['used']}  图片 {result['images']}  "
+              f"未引用 {result['unused']}  已移动 {result['moved']}", flush=True)
+    if verbose:
+        for message in result['messages']:
+            print('    ' + message.rstrip('\n'), flush=True)
+
+
+def _write_stats(args, stats):
+    """按 --stats / --stats-format 输出统计（- 表示标准输出）"""
+    if not args.stats:
+        return
+    text = stats.to_prometheus() if args.stats_format == 'prometheus' else stats.to_json() + '\n'
+    if args.stats == '-':
+        sys.stdout.write(text)
+        return
+    tmp = args.stats + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp, args.stats)
+
+
+def _parse_document(md_file):
+    try:
+        return scan_used_images(md_file), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _build_graph(args, root, md_files):
+    """并行解析所有 Markdown（未变化的文件直接用索引缓存），返回 (ReferenceGraph, 失败数)"""
+    index = _open_index(args, root)
+    graph = ReferenceGraph()
+    to_parse = []
+    for md_file in md_files:
+        md_key = file_key(md_file)
+        cached = index.get_references(md_file, md_key) if index is not None else None
+        if cached is None:
+            to_parse.append((md_file, md_key))
+        else:
+            graph.set_document(md_file, cached)
+
+    workers = args.workers or os.cpu_count() or 1
+    print(f"找到 {len(md_files)} 个 Markdown 文件（需解析 {len(to_parse)} 个），"
+          f"使用 {workers} 个进程", flush=True)
+
+    failed = 0
+    try:
+        if to_parse:
+            chunksize = max(1, min(64, len(to_parse) // (workers * 4)))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = pool.map(_parse_document, [md for md, _ in to_parse], chunksize=chunksize)
+                for (md_file, md_key), (references, error) in zip(to_parse, results):
+                    if error:
+                        failed += 1
+                        print(f"[失败] {os.path.relpath(md_file, root)}: {error}", flush=True)
+                        continue
+                    graph.set_document(md_file, references)
+                    if index is not None:
+                        index.put_references(md_file, md_key, references)
+        if index is not None:
+            index.prune(root, md_files)
+    finally:
+        if index is not None:
+            index.close()
+    return graph, failed
+
+
+def _scan_shared(args, root):
+    """共享资源模式：汇总目录树下所有 Markdown 的引用，再清理共享图片文件夹"""
+    folders = [os.path.abspath(folder) for folder in args.shared]
+    for folder in folders:
+        if not os.path.isdir(folder):
+            print(f"错误: 共享图片文件夹 {folder} 不存在", file=sys.stderr)
+            return 2
+
+    archive = _archive_option(args)
+    if archive is False:
+        return 2
+
+    start_time = time.time()
+    stats = CleanStats()
+    md_files = list(iter_markdown_files(root))
+    with stats.timed('parse', items=len(md_files)):
+        graph, failed = _build_graph(args, root, md_files)
+
+    # 有文件解析失败时其引用未知，移动可能误伤仍在使用的图片
+    dry_run = args.dry_run or failed > 0
+    if failed and not args.dry_run:
+        print(f"警告: {failed} 个文件解析失败，本次只分析不移动", file=sys.stderr)
+
+    log = (lambda message: print('    ' + message.rstrip('\n'), flush=True)) if args.verbose else None
+    images_total = orphans_total = moved_total = 0
+    for folder in folders:
+        with stats.timed('listing') as stage:
+            images = scan_images(folder)
+            stage.items += len(images)
+        with stats.timed('diff', items=len(images)):
+            orphans = graph.orphans(folder, images)
+        print(f"[共享] {folder}  图片 {len(images)}  未引用 {len(orphans)}", flush=True)
+        moved = [] if dry_run else remove_unused_images(folder, orphans, log, stats=stats,
+                                                        archive=archive)
+        images_total += len(images)
+        orphans_total += len(orphans)
+        moved_total += len(moved)
+
+    elapsed = max(time.time() - start_time, 1e-9)
+    print(f"\n共 {len(md_files)} 个文件引用 {len(graph.refcounts)} 张图片，共享文件夹中 "
+          f"{images_total} 张图片，未引用 {orphans_total} 张，已移动 {moved_total} 张，失败 {failed} 个")
+    print(f"耗时: {elapsed:.2f} 秒，吞吐量: {len(md_files) / elapsed:.1f} 文件/秒，"
+          f"{images_total / elapsed:.1f} 图片/秒")
+    stats.count('documents_failed', failed)
+    stats.stage('total').add(elapsed, len(md_files))
+    _write_stats(args, stats)
+    return 1 if failed else 0
+
+
+def cmd_scan(args):
+    """scan 子命令：并行清理目录树下所有 Markdown 文件"""
+    root = os.path.abspath(args.root)
+    if not os.path.isdir(root):
+        print(f"错误: 目录 {root} 不存在", file=sys.stderr)
+        return 2
+    if args.shared:
+        return _scan_shared(args, root)
+    archive = _archive_option(args)
+    if archive is False:
+        return 2
+
+    start_time = time.time()
+    stats = CleanStats()
+    jobs, skipped = _collect_jobs(root)
+    index = _open_index(args, root)
+    planned, unchanged = _plan_jobs(jobs, index, args.dry_run)
+    workers = args.workers or os.cpu_count() or 1
+    print(f"找到 {len(jobs)} 个带 .assets 文件夹的 Markdown 文件（跳过 {skipped} 个，"
+          f"未变化 {unchanged} 个），使用 {workers} 个进程", flush=True)
+
+    files_done = images_done = unused_total = moved_total = failed = 0
+    try:
+        if planned:
+            # 分块提交，减少进程间通信次数
+            chunksize = max(1, min(64, len(planned) // (workers * 4)))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = pool.map(partial(_clean_job, archive=archive), planned,
+                                   chunksize=chunksize)
+                for job, result in zip(planned, results):
+                    _print_result(result, root, args.verbose)
+                    _record_result(index, job, result)
+                    stats.merge_dict(result['stats'])
+                    files_done += 1
+                    images_done += result['images']
+                    unused_total += result['unused']
+                    moved_total += result['moved']
+                    if result['error']:
+                        failed += 1
+        if index is not None:
+            index.prune(root, jobs)
+    finally:
+        if index is not None:
+            index.close()
+
+    elapsed = max(time.time() - start_time, 1e-9)
+    print(f"\n共处理 {files_done} 个文件，{images_done} 张图片，未引用 {unused_total} 张，"
+          f"已移动 {moved_total} 张，失败 {failed} 个")
+    print(f"耗时: {elapsed:.2f} 秒，吞吐量: {files_done / elapsed:.1f} 文件/秒，"
+          f"{images_done / elapsed:.1f} 图片/秒")
+    stats.count('documents_unchanged', unchanged)
+    stats.count('documents_skipped', skipped)
+    stats.count('documents_failed', failed)
+    stats.stage('total').add(elapsed, files_done, 0)
+    _write_stats(args, stats)
+    return 1 if failed else 0
+
+
+def cmd_undo(args):
+    """undo 子命令：按移动日志把 deleted_images 中的文件并行移回原位置"""
+    journals = []
+    for path in args.paths:
+        if not os.path.exists(path):
+            print(f"错误: 路径 {path} 不存在", file=sys.stderr)
+            return 2
+        journals.extend(find_journals(path))
+    if not journals:
+        print("未找到移动日志，没有可撤销的操作")
+        return 0
+
+    start_time = time.time()
+    log = (lambda message: print(message.rstrip('\n'), flush=True)) if args.verbose else None
+    counts = undo_moves(journals, all_runs=args.all, workers=args.workers, log=log)
+    elapsed = time.time() - start_time
+    print(f"共恢复 {counts['restored']} 个文件，跳过 {counts['skipped']} 个，"
+          f"失败 {counts['failed']} 个（{len(journals)} 个日志，耗时 {elapsed:.2f} 秒）")
+    return 1 if counts['failed'] else 0
+
+
+def cmd_restore(args):
+    """restore 子命令：从压缩归档中恢复选中的条目，不解开整个归档"""
+    from cleaner_archive import find_archives, read_manifest, restore_archive
+
+    archives = []
+    for path in args.paths:
+        if not os.path.exists(path):
+            print(f"错误: 路径 {path} 不存在", file=sys.stderr)
+            return 2
+        archives.extend(find_archives(path))
+    if not archives:
+        print("未找到归档，没有可恢复的文件")
+        return 0
+
+    if args.list:
+        for archive_path in archives:
+            manifest = read_manifest(archive_path)
+            print(f"{archive_path}（{manifest['created']}，{manifest['assets_folder']}）")
+            for entry in manifest['entries']:
+                if not args.entry or any(entry['src'] == p or fnmatch.fnmatch(entry['src'], p)
+                                         for p in args.entry):
+                    print(f"  {entry['src']}  {entry['size']} 字节")
+        return 0
+
+    start_time = time.time()
+    log = (lambda message: print(message.rstrip('\n'), flush=True)) if args.verbose else None
+    totals = {'restored': 0, 'skipped': 0, 'failed': 0}
+    for archive_path in archives:
+        try:
+            counts = restore_archive(archive_path, args.entry, args.to, log)
+        except Exception as e:
+            print(f"[失败] {archive_path}: {e}", flush=True)
+            totals['failed'] += 1
+            continue
+        for name, n in counts.items():
+            totals[name] += n
+    elapsed = time.time() - start_time
+    print(f"共恢复 {totals['restored']} 个文件，跳过 {totals['skipped']} 个，"
+          f"失败 {totals['failed']} 个（{len(archives)} 个归档，耗时 {elapsed:.2f} 秒）")
+    return 1 if totals['failed'] else 0
+
+
+def cmd_dedup(args):
+    """dedup 子命令：合并文件夹内内容相同的图片，改写引用后把多余副本移入 deleted_images"""
+    from cleaner_dedup import choose_canonical, find_duplicates, rewrite_references
+
+    root = os.path.abspath(args.root)
+    if not os.path.isdir(root):
+        print(f"错误: 目录 {root} 不存在", file=sys.stderr)
+        return 2
+
+    start_time = time.time()
+    md_files = list(iter_markdown_files(root))
+    if args.shared:
+        folders = [os.path.abspath(folder) for folder in args.shared]
+    else:
+        folders = [folder for folder in map(assets_folder_for, md_files) if os.path.isdir(folder)]
+    graph, failed = _build_graph(args, root, md_files)
+    dry_run = args.dry_run or failed > 0
+    if failed and not args.dry_run:
+        print(f"警告: {failed} 个文件解析失败，本次只分析不改写", file=sys.stderr)
+
+    folder_images = {}
+    for folder in folders:
+        try:
+            folder_images[folder] = scan_images(folder)
+        except OSError as e:
+            print(f"[失败] {folder}: {e}", flush=True)
+    groups = find_duplicates(folder_images, workers=args.hash_workers)
+    locations = {os.path.join(folder, img): (folder, img)
+                 for folder, images in folder_images.items() for img in images}
+
+    replacements = {}  # 重复副本的路径键 -> 保留副本的路径
+    duplicates = {}  # 路径键 -> (文件夹, 相对路径)
+    reclaimable = 0
+    for group in groups:
+        canonical = choose_canonical(group, graph)
+        if args.verbose:
+            print(f"[重复] 保留 {os.path.relpath(canonical, root)}", flush=True)
+        for path in group:
+            if path == canonical:
+                continue
+            key = path_key(path)
+            replacements[key] = canonical
+            duplicates[key] = locations[path]
+            reclaimable += os.path.getsize(path)
+            if args.verbose:
+                print(f"    重复: {os.path.relpath(path, root)}", flush=True)
+
+    rewritten_docs = rewritten_links = moved_total = 0
+    if not dry_run and replacements:
+        by_key = {path_key(md_file): md_file for md_file in md_files}
+        blocked = set()  # 改写失败的文档仍引用的副本不能移动
+        for doc_key, references in graph.documents.items():
+            affected = references & replacements.keys()
+            if not affected:
+                continue
+            md_file = by_key[doc_key]
+            try:
+                rewritten_links += rewrite_references(md_file, replacements)
+                rewritten_docs += 1
+            except Exception as e:
+                blocked |= affected
+                print(f"[失败] 无法改写 {os.path.relpath(md_file, root)}: {e}", flush=True)
+
+        to_move = {}
+        for key, (folder, rel) in duplicates.items():
+            if key not in blocked:
+                to_move.setdefault(folder, []).append(rel)
+        log = (lambda m: print('    ' + m.rstrip('\n'), flush=True)) if args.verbose else None
+        for folder, names in to_move.items():
+            moved_total += len(move_unused_images(folder, names, log))
+
+    elapsed = max(time.time() - start_time, 1e-9)
+    print(f"\n共 {len(groups)} 组重复，{len(replacements)} 个多余副本，"
+          f"可回收 {reclaimable / 1024 / 1024:.2f} MB")
+    if not dry_run:
+        print(f"改写 {rewritten_docs} 个文件中的 {rewritten_links} 处引用，已移动 {moved_total} 个副本")
+    print(f"耗时: {elapsed:.2f} 秒")
+    return 1 if failed else 0
+
+
+def cmd_optimize(args):
+    """optimize 子命令：用进程池无损压缩被引用的 PNG/JPEG，只在变小时替换原文件"""
+    from cleaner_optimize import OPTIMIZE_EXTENSIONS, optimize_image
+
+    root = os.path.abspath(args.root)
+    if not os.path.isdir(root):
+        print(f"错误: 目录 {root} 不存在", file=sys.stderr)
+        return 2
+
+    start_time = time.time()
+    stats = CleanStats()
+    md_files = list(iter_markdown_files(root))
+    if args.shared:
+        folders = [os.path.abspath(folder) for folder in args.shared]
+    else:
+        folders = [folder for folder in map(assets_folder_for, md_files) if os.path.isdir(folder)]
+    graph, failed = _build_graph(args, root, md_files)
+
+    candidates = []
+    for folder in folders:
+        try:
+            images = scan_images(folder)
+        except OSError as e:
+            print(f"[失败] {folder}: {e}", flush=True)
+            continue
+        candidates.extend(path for path in (os.path.join(folder, img) for img in images)
+                          if path.lower().endswith(OPTIMIZE_EXTENSIONS) and graph.refcount(path))
+
+    # 上次处理后大小和修改时间都没变的图片不再读取
+    index = _open_index(args, root)
+    pending = [path for path in candidates
+               if index is None or not index.is_optimized(path, file_key(path))]
+    skipped = len(candidates) - len(pending)
+    stats.count('optimize_skipped', skipped)
+    workers = args.workers or os.cpu_count() or 1
+    print(f"找到 {len(candidates)} 张被引用的 PNG/JPEG（{skipped} 张已优化且未变化），"
+          f"使用 {workers} 个进程", flush=True)
+
+    before_total = after_total = replaced = errors = 0
+    try:
+        with stats.timed('optimize', items=len(pending)) as stage:
+            if pending:
+                chunksize = max(1, min(16, len(pending) // (workers * 4)))
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    job = partial(optimize_image, dry_run=args.dry_run)
+                    for result in pool.map(job, pending, chunksize=chunksize):
+                        path = result['path']
+                        if result['error']:
+                            errors += 1
+                            print(f"[失败] {os.path.relpath(path, root)}: {result['error']}",
+                                  flush=True)
+                            continue
+                        before_total += result['before']
+                        after_total += result['after']
+                        replaced += result['replaced'] or (args.dry_run and
+                                                           result['after'] < result['before'])
+                        if args.verbose and result['after'] < result['before']:
+                            print(f"[优化] {os.path.relpath(path, root)}  "
+                                  f"{result['before'] / 1024:.1f} KB -> {result['after'] / 1024:.1f} KB",
+                                  flush=True)
+                        if index is not None and not args.dry_run:
+                            index.put_optimized(path, result['key'])
+            stage.bytes += before_total
+    finally:
+        if index is not None:
+            index.close()
+
+    saved = before_total - after_total
+    stats.count('optimize_saved_bytes', saved)
+    stats.count('optimize_replaced', replaced)
+    if errors:
+        stats.count('optimize_failed', errors)
+    elapsed = max(time.time() - start_time, 1e-9)
+    optimize_seconds = max(stats.stage('optimize').seconds, 1e-9)
+    ratio = saved / before_total * 100 if before_total else 0.0
+    verb = ("可替换", "可节省") if args.dry_run else ("已替换", "节省")
+    print(f"\n共处理 {len(pending) - errors} 张图片，{verb[0]} {replaced} 张，"
+          f"{verb[1]} {saved / 1024 / 1024:.2f} MB（原 {before_total / 1024 / 1024:.2f} MB，"
+          f"减少 {ratio:.1f}%），失败 {errors} 张")
+    print(f"耗时: {elapsed:.2f} 秒，吞吐量: {len(pending) / optimize_seconds:.1f} 图片/秒，"
+          f"{before_total / optimize_seconds / 1e6:.2f} MB/秒")
+    _write_stats(args, stats)
+    return 1 if errors or failed else 0
+
+
+def cmd_similar(args):
+    """similar 子命令：按感知哈希列出每个文件夹中彼此相似的图片组（只读，不移动）"""
+    from cleaner_meta import format_dimensions, read_image_info
+    from cleaner_similar import compute_hashes, find_similar_groups, similar_available
+
+    if not similar_available():
+        print("错误: 查找相似图片需要安装 numpy 和 Pillow（pip install numpy pillow）", file=sys.stderr)
+        return 2
+    root = os.path.abspath(args.root)
+    if not os.path.isdir(root):
+        print(f"错误: 目录 {root} 不存在", file=sys.stderr)
+        return 2
+
+    start_time = time.time()
+    stats = CleanStats()
+    md_files = list(iter_markdown_files(root))
+    if args.shared:
+        folders = [os.path.abspath(folder) for folder in args.shared]
+    else:
+        folders = [folder for folder in map(assets_folder_for, md_files) if os.path.isdir(folder)]
+    graph, failed = _build_graph(args, root, md_files)
+
+    index = _open_index(args, root)
+    all_groups = []
+    total_images = 0
+    try:
+        for folder in folders:
+            try:
+                paths = [os.path.join(folder, img) for img in scan_images(folder)]
+            except OSError as e:
+                print(f"[失败] {folder}: {e}", flush=True)
+                continue
+            total_images += len(paths)
+            hashes = compute_hashes(paths, index, args.workers or None, stats)
+            all_groups.extend(find_similar_groups(hashes, args.distance))
+    finally:
+        if index is not None:
+            index.close()
+
+    unused_count = unused_bytes = 0
+    report = []
+    for number, group in enumerate(all_groups, 1):
+        print(f"[相似组 {number}] {os.path.relpath(os.path.dirname(group[0]), root)}（{len(group)} 张）")
+        members = []
+        for path in group:
+            info = read_image_info(path)
+            refs = graph.refcount(path)
+            size = info.size if info is not None else 0
+            if not refs:
+                unused_count += 1
+                unused_bytes += size
+            dims = format_dimensions(info)
+            state = f"被引用 {refs} 次" if refs else "未引用"
+            print(f"    {os.path.basename(path)}  {dims + '  ' if dims else ''}"
+                  f"{size / 1024:.1f} KB  {state}")
+            members.append({'path': path, 'size': size, 'references': refs,
+                            'width': info.width if info else None,
+                            'height': info.height if info else None})
+        report.append(members)
+
+    hashed = stats.stage('similar')
+    elapsed = max(time.time() - start_time, 1e-9)
+    print(f"\n共 {len(all_groups)} 组相似图片，涉及 {sum(map(len, all_groups))} 张，"
+          f"其中未引用 {unused_count} 张（{unused_bytes / 1024 / 1024:.2f} MB）")
+    print(f"共 {total_images} 张图片，新计算哈希 {hashed.items} 张"
+          f"（缓存 {stats.counters.get('similar_cached', 0)} 张），耗时: {elapsed:.2f} 秒"
+          + (f"，{hashed.items / hashed.seconds:.1f} 图片/秒" if hashed.seconds > 0 else ""))
+    if args.json:
+        tmp = args.json + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'root': root, 'distance': args.distance, 'groups': report}, f,
+                      ensure_ascii=False, indent=2)
+        os.replace(tmp, args.json)
+    return 1 if failed else 0
+
+
+def cmd_bench(args):
+    """bench 子命令：在合成笔记库上分阶段计时，结果以 JSON 输出"""
+    from cleaner_bench import DEFAULT_PARAMS, compare_results, load_results, run_benchmark
+
+    params = {name: getattr(args, name) for name in DEFAULT_PARAMS
+              if getattr(args, name, None) is not None}
+    result = run_benchmark(params, workdir=args.workdir, preview=not args.no_preview)
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"结果已写入 {args.output}")
+    else:
+        print(text)
+
+    if args.compare:
+        print(f"\n与 {args.compare} 对比（耗时，秒）:")
+        for name, old, new, ratio in compare_results(load_results(args.compare), result):
+            flag = '  <-- 变慢' if ratio > 1 + args.tolerance else ''
+            print(f"  {name:<16} {old:>10.4f} -> {new:>10.4f}  x{ratio:.2f}{flag}")
+    return 0
+
+
+def _write_orphan_state(path, state):
+    """把当前孤儿集合原子地写入 JSON 文件，供其他程序随时读取"""
+    data = {'updated': time.strftime('%Y-%m-%dT%H:%M:%S'), 'root': state.root,
+            'documents': len(state.graph), 'images': len(state.images),
+            'orphans': state.orphan_paths()}
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def cmd_watch(args):
+    """watch 子命令：监视笔记库，增量维护未引用图片集合（不移动文件）"""
+    from cleaner_watch import VaultState, VaultWatcher
+
+    root = os.path.abspath(args.root)
+    if not os.path.isdir(root):
+        print(f"错误: 目录 {root} 不存在", file=sys.stderr)
+        return 2
+    shared = [os.path.abspath(folder) for folder in args.shared or ()]
+    for folder in shared:
+        if not os.path.isdir(folder):
+            print(f"错误: 共享图片文件夹 {folder} 不存在", file=sys.stderr)
+            return 2
+
+    graph, failed = _build_graph(args, root, list(iter_markdown_files(root)))
+    state = VaultState(root, shared, graph)
+    state.load(parse_documents=False)
+    watcher = VaultWatcher(state, debounce=args.debounce, poll_interval=args.interval,
+                           polling=args.polling)
+    print(f"监视 {root}（{watcher.backend}）: {len(graph)} 个文件，{len(state.images)} 张图片，"
+          f"未引用 {len(state.orphans)} 张，解析失败 {failed} 个", flush=True)
+    if args.verbose:
+        for image_path in state.orphan_paths():
+            print(f"  未引用: {os.path.relpath(image_path, root)}")
+    if args.state:
+        _write_orphan_state(args.state, state)
+
+    def on_change(added, removed):
+        for image_path in added:
+            print(f"[未引用] {os.path.relpath(image_path, root)}", flush=True)
+        for key in removed:
+            print(f"[恢复引用或已删除] {os.path.relpath(key, root)}", flush=True)
+        print(f"当前未引用 {len(state.orphans)} 张", flush=True)
+        if args.state:
+            _write_orphan_state(args.state, state)
+
+    try:
+        watcher.run(on_change)
+    except KeyboardInterrupt:
+        print("\n已停止监视")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='typora_assets_cleaner.py',
+                                     description='Typora 未引用图片清理工具（命令行模式）')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    scan = subparsers.add_parser('scan', help='批量清理目录树下所有 Markdown 文件的未引用图片')
+    scan.add_argument('root', help='笔记库根目录')
+    scan.add_argument('-j', '--workers', type=int, default=0,
+                      help='工作进程数（默认等于 CPU 核心数）')
+    scan.add_argument('-n', '--dry-run', action='store_true', help='只分析，不移动文件')
+    scan.add_argument('-v', '--verbose', action='store_true', help='输出每个文件的详细日志')
+    scan.add_argument('--index', help=f'索引文件路径（默认为根目录下的 {INDEX_FILE_NAME}）')
+    scan.add_argument('--no-index', action='store_true', help='不使用索引，强制全量扫描')
+    scan.add_argument('--shared', action='append', metavar='DIR',
+                      help='共享图片文件夹（可重复）：按目录树下所有 Markdown 的引用合集清理，'
+                           '而不是每个文件对应自己的 .assets 文件夹')
+    scan.add_argument('--archive', choices=('zip', 'tar.zst'),
+                      help='把未引用的图片写入每次运行一个的压缩归档（附清单），而不是逐个移入 deleted_images；'
+                           'tar.zst 需要安装 zstandard')
+    scan.add_argument('--archive-dir', metavar='DIR',
+                      help='归档存放目录（默认为各 .assets 文件夹下的 deleted_images），'
+                           '可放到笔记库之外以免被同步')
+    scan.add_argument('--stats', metavar='FILE',
+                      help='把各阶段耗时、计数和移动延迟写入文件（- 表示标准输出）；'
+                           '多进程时各阶段耗时为所有进程之和')
+    scan.add_argument('--stats-format', choices=('json', 'prometheus'), default='json',
+                      help='统计的输出格式（默认 json）')
+    scan.set_defaults(func=cmd_scan)
+
+    undo = subparsers.add_parser('undo', help='按移动日志恢复被移入 deleted_images 的图片')
+    undo.add_argument('paths', nargs='+',
+                      help='笔记库目录、Markdown 文件、.assets 文件夹或日志文件')
+    undo.add_argument('--all', action='store_true', help='撤销日志中的全部运行（默认只撤销最近一次）')
+    undo.add_argument('-j', '--workers', type=int, default=8, help='并行恢复的线程数')
+    undo.add_argument('-v', '--verbose', action='store_true', help='输出每个文件的恢复结果')
+    undo.set_defaults(func=cmd_undo)
+
+    restore = subparsers.add_parser('restore', help='从压缩归档中恢复图片（可只恢复部分条目）')
+    restore.add_argument('paths', nargs='+', help='归档文件，或在其中递归查找归档的目录')
+    restore.add_argument('-e', '--entry', action='append', metavar='PATTERN',
+                         help='只恢复匹配的条目（相对 .assets 的路径，支持通配符，可重复）')
+    restore.add_argument('--to', metavar='DIR', help='恢复到指定目录（默认恢复到原 .assets 文件夹）')
+    restore.add_argument('-l', '--list', action='store_true', help='只列出归档中的条目')
+    restore.add_argument('-v', '--verbose', action='store_true', help='输出每个文件的恢复结果')
+    restore.set_defaults(func=cmd_restore)
+
+    optimize = subparsers.add_parser('optimize',
+                                     help='无损压缩被引用的图片（PNG 重新压缩，JPEG 去掉元数据）')
+    optimize.add_argument('root', help='笔记库根目录')
+    optimize.add_argument('--shared', action='append', metavar='DIR',
+                          help='共享图片文件夹（可重复指定），代替各文件的 .assets 文件夹')
+    optimize.add_argument('-j', '--workers', type=int, default=0,
+                          help='并行进程数（默认为 CPU 核心数）')
+    optimize.add_argument('-n', '--dry-run', action='store_true', help='只计算可节省的空间，不替换文件')
+    optimize.add_argument('-v', '--verbose', action='store_true', help='输出每个变小的文件')
+    optimize.add_argument('--index', help=f'索引文件路径（默认为根目录下的 {INDEX_FILE_NAME}）')
+    optimize.add_argument('--no-index', action='store_true',
+                          help='不使用索引：强制全量解析，并重新处理已优化过的图片')
+    optimize.add_argument('--stats', metavar='FILE', help='把耗时与节省的字节数写入文件（- 表示标准输出）')
+    optimize.add_argument('--stats-format', choices=('json', 'prometheus'), default='json',
+                          help='统计的输出格式（默认 json）')
+    optimize.set_defaults(func=cmd_optimize)
+
+    dedup = subparsers.add_parser('dedup', help='合并内容相同的图片并改写 Markdown 中的引用')
+    dedup.add_argument('root', help='笔记库根目录')
+    dedup.add_argument('--shared', action='append', metavar='DIR',
+                       help='共享图片文件夹（可重复），默认处理每个 Markdown 对应的 .assets 文件夹')
+    dedup.add_argument('-j', '--workers', type=int, default=0,
+                       help='解析 Markdown 的进程数（默认等于 CPU 核心数）')
+    dedup.add_argument('--hash-workers', type=int, default=8, help='并行读取并计算哈希的线程数')
+    dedup.add_argument('-n', '--dry-run', action='store_true', help='只报告重复，不改写也不移动')
+    dedup.add_argument('-v', '--verbose', action='store_true', help='列出每组重复文件')
+    dedup.add_argument('--index', help=f'索引文件路径（默认为根目录下的 {INDEX_FILE_NAME}）')
+    dedup.add_argument('--no-index', action='store_true', help='不使用索引，强制全量解析')
+    dedup.set_defaults(func=cmd_dedup)
+
+    similar = subparsers.add_parser('similar',
+                                    help='查找相似图片（重新粘贴、裁剪或重新编码的近似副本），需要 numpy 和 Pillow')
+    similar.add_argument('root', help='笔记库根目录')
+    similar.add_argument('--shared', action='append', metavar='DIR',
+                         help='共享图片文件夹（可重复），默认处理每个 Markdown 对应的 .assets 文件夹')
+    similar.add_argument('-d', '--distance', type=int, default=10,
+                         help='哈希汉明距离不超过该值视为相似（0~64，默认 10，越小越严格）')
+    similar.add_argument('-j', '--workers', type=int, default=0,
+                         help='计算哈希的进程数（默认为 CPU 核心数）')
+    similar.add_argument('--json', metavar='FILE', help='把分组结果写入 JSON 文件')
+    similar.add_argument('--index', help=f'索引文件路径（默认为根目录下的 {INDEX_FILE_NAME}）')
+    similar.add_argument('--no-index', action='store_true', help='不使用索引，重新解析并重新计算全部哈希')
+    similar.set_defaults(func=cmd_similar)
+
+    bench = subparsers.add_parser('bench', help='在合成笔记库上对扫描、对比、移动和预览阶段计时')
+    bench.add_argument('--docs', type=int, help='Markdown 文件数')
+    bench.add_argument('--refs-per-doc', dest='refs_per_doc', type=int, help='每个文件引用的图片数')
+    bench.add_argument('--assets-per-doc', dest='assets_per_doc', type=int,
+                       help='每个 .assets 文件夹中的图片数')
+    bench.add_argument('--orphan-ratio', dest='orphan_ratio', type=float,
+                       help='未引用图片的比例（覆盖 --assets-per-doc）')
+    bench.add_argument('--md-kb', dest='md_kb', type=int, help='每个 Markdown 文件的大小（KB）')
+    bench.add_argument('--image-width', dest='image_width', type=int, help='图片宽度')
+    bench.add_argument('--image-height', dest='image_height', type=int, help='图片高度')
+    bench.add_argument('--preview-limit', dest='preview_limit', type=int,
+                       help='预览阶段解码的缩略图数量上限')
+    bench.add_argument('--seed', type=int, help='随机种子')
+    bench.add_argument('--no-preview', action='store_true', help='跳过需要 PyQt5 的预览阶段')
+    bench.add_argument('--workdir', help='在指定目录生成笔记库并保留（默认使用临时目录）')
+    bench.add_argument('-o', '--output', help='结果 JSON 的输出路径（默认打印到标准输出）')
+    bench.add_argument('--compare', help='与之前保存的结果 JSON 对比')
+    bench.add_argument('--tolerance', type=float, default=0.1,
+                       help='对比时超过该比例的变慢会被标出（默认 0.1）')
+    bench.set_defaults(func=cmd_bench)
+
+    watch = subparsers.add_parser('watch', help='监视笔记库，实时维护未引用图片列表')
+    watch.add_argument('root', help='笔记库根目录')
+    watch.add_argument('--shared', action='append', metavar='DIR',
+                       help='同时监视的共享图片文件夹（可多次指定）')
+    watch.add_argument('--state', metavar='FILE', help='每次变化后把未引用图片列表写入该 JSON 文件')
+    watch.add_argument('--debounce', type=float, default=0.5,
+                       help='事件停止多少秒后才处理（合并 Typora 自动保存产生的连续事件）')
+    watch.add_argument('--polling', action='store_true', help='强制使用轮询（默认在 Linux 上使用 inotify）')
+    watch.add_argument('--interval', type=float, default=2.0, help='轮询间隔（秒）')
+    watch.add_argument('-j', '--workers', type=int, default=0,
+                       help='初次解析使用的进程数（默认为 CPU 核心数）')
+    watch.add_argument('-v', '--verbose', action='store_true', help='启动时列出全部未引用图片')
+    watch.add_argument('--index', help=f'索引文件路径（默认为根目录下的 {INDEX_FILE_NAME}）')
+    watch.add_argument('--no-index', action='store_true', help='不使用索引，强制全量解析')
+    watch.set_defaults(func=cmd_watch)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
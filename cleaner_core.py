@@ -0,0 +1,894 @@
+"""Typora 未引用图片清理的核心逻辑（不依赖 PyQt5，可在命令行/后台进程中使用）"""
+import mmap
+import os
+import re
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from types import MappingProxyType
+from urllib.parse import unquote
+
+from cleaner_index import file_key
+from cleaner_journal import MoveJournal, new_run_id, rename_or_move
+from cleaner_stats import CleanStats, ProgressTracker
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.svg', '.tiff', '.webp', '.gif')
+DELETED_FOLDER_NAME = 'deleted_images'
+
+# analyze_markdown 的进度阶段（按执行顺序）
+ANALYSIS_STAGES = ('listing', 'parse', 'diff')
+
+# 并行移动文件的线程数（网络盘上每次往返都有毫秒级延迟）
+MOVE_WORKERS = 8
+
+# 流式扫描时每次读取的字符数
+SCAN_CHUNK_SIZE = 1 << 20
+# 超过该大小（字节）的 Markdown 文件改用内存映射扫描，按窗口推进并及时释放已扫描的页
+MMAP_THRESHOLD = 32 << 20
+MMAP_WINDOW = 8 << 20
+# 单个链接目标的最大长度，超过该长度的目标在跨块时不再保留
+MAX_TARGET_LENGTH = 4096
+# 查找 YAML front matter（typora-root-url）时最多读取文件开头的字节数
+FRONT_MATTER_LIMIT = 64 << 10
+_ROOT_URL_RE = re.compile(r'typora-root-url[ \t]*:[ \t]*(.*?)[ \t]*$')
+
+# 引用的各类写法各用一个以字面字符开头的模式，正则引擎可以借字面前缀快速跳过无关文本
+# （把它们拼成一个多分支模式反而会在每个位置逐个尝试所有分支，慢数倍）：
+# - 行内链接/图片 `](x)`、`](<x y>)`、`](x "标题")`，目标中允许成对的括号和反斜杠转义
+#   （标题在匹配后由 _strip_title 去掉）
+# - 围栏代码块的起止行（其中的内容不计入引用）；用前导换行代替 `^`，文本开头需补一个换行
+# - 引用式链接定义 `[id]: x`（不区分是否被使用，保守地全部计入）：以 `]:` 为字面前缀匹配，
+#   再由 _is_definition 检查所在行的开头，允许任意缩进以及列表项、引用块的前缀
+#   （如 `- [id]: x`、`> [id]: x`）；在每行开头尝试匹配的写法会拖慢列表很多的文档
+# - HTML `<img src="x">`，属性之间可以换行
+# 每个模式中目标所在的分组都是最后闭合的分组，因此 match.lastgroup 即为命中的写法。
+# 模式只用到 ASCII 字符，UTF-8 多字节序列中不会出现 ASCII 字节，因此同一份源码
+# 编译成 bytes 版本后可以直接在未解码的文件内容上匹配。
+_INLINE_PATTERN = r'''
+    \]\([ \t]*
+        (?: <(?P<angle>[^>\n]*)>[^)\n]*
+          | (?P<inline>[^()\n\\]*(?:(?:\\.|\([^()\n]*\))[^()\n\\]*)*) )
+        \)
+'''
+_LINE_PATTERN = r'''
+    \n(?=[ `~])[ ]{0,3}(?P<fence>`{3,}|~{3,})[^\n]*
+'''
+_DEFINITION_PATTERN = r'''
+    \]:[ \t]*(?:<(?P<defangle>[^>\n]*)>|(?P<definition>[^\s<]\S*))
+'''
+# 引用定义所在行从行首到 `]` 的部分：缩进、容器前缀（引用块、列表项）和标签（不能是脚注 `[^1]`）
+_DEFINITION_PREFIX = r'[ \t]*(?:(?:>|[-*+]|[0-9]{1,9}[.)])[ \t]*)*\[(?!\^)[^\]\n]+\]'
+_HTML_PATTERN = r'''
+    <(?i:img\b[^>]*?\bsrc\s*=\s*)
+        (?: "(?P<src>[^"\n]*)" | '(?P<src_single>[^'\n]*)' | (?P<src_bare>[^\s>"']+) )
+'''
+
+
+class _Syntax:
+    """同一组模式源码编译出的 str 或 bytes 版本，以及匹配后处理用到的字符常量"""
+
+    def __init__(self, convert):
+        self.inline = re.compile(convert(_INLINE_PATTERN), re.VERBOSE)
+        self.line = re.compile(convert(_LINE_PATTERN), re.VERBOSE)
+        self.definition = re.compile(convert(_DEFINITION_PATTERN), re.VERBOSE)
+        self.definition_prefix = re.compile(convert(_DEFINITION_PREFIX))
+        self.newline = convert('\n')
+        self.html = re.compile(convert(_HTML_PATTERN), re.VERBOSE)
+        self.blanks = convert(' \t')
+        self.title_ends = convert('"\') \t')
+        self.title_openers = {convert(k): convert(v) for k, v in (('"', '"'), ("'", "'"), (')', '('))}
+        self.backtick = convert('`')
+
+
+_STR_SYNTAX = _Syntax(str)
+_BYTES_SYNTAX = _Syntax(lambda source: source.encode('ascii'))
+# 带协议的链接（http:、data: 等）不指向本地文件；单个字母视为 Windows 盘符
+_URL_SCHEME_RE = re.compile(r'^[A-Za-z][A-Za-z0-9+.-]+:')
+
+
+def user_cache_dir():
+    """返回当前用户的缓存目录（索引、缩略图等）"""
+    if sys.platform.startswith('win'):
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~\\AppData\\Local')
+    elif sys.platform.startswith('darwin'):
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'typora_assets_cleaner')
+
+
+def assets_folder_for(md_file):
+    """返回 Markdown 文件对应的 .assets 文件夹路径"""
+    return os.path.splitext(md_file)[0] + '.assets'
+
+
+def backup_path_for(assets_folder, image_path):
+    """返回 assets_folder 中的图片被移入 deleted_images 后的路径"""
+    return os.path.join(assets_folder, DELETED_FOLDER_NAME,
+                        os.path.relpath(image_path, assets_folder))
+
+
+def path_key(path):
+    """返回用于比较的规范化绝对路径（Windows 下不区分大小写）"""
+    return os.path.normcase(os.path.normpath(os.path.abspath(path)))
+
+
+def parse_root_url(text):
+    """返回 YAML front matter 中 typora-root-url 的值，没有 front matter 或未设置时返回 None"""
+    lines = text.lstrip('\ufeff').splitlines()
+    if not lines or lines[0].rstrip() != '---':
+        return None
+    for line in lines[1:]:
+        if line.rstrip() in ('---', '...'):
+            break
+        match = _ROOT_URL_RE.match(line)
+        if match:
+            value = match.group(1)
+            if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+                value = value[1:-1]
+            return value or None
+    return None
+
+
+def typora_root_dir(md_file, text=None):
+    """返回 typora-root-url 指向的目录（相对路径按 Markdown 所在目录解析），未设置时返回 None
+
+    text 为已读入的文件内容；不传时只读取文件开头。根地址是网址时同样返回 None。
+    """
+    if text is None:
+        try:
+            with open(md_file, 'rb') as f:
+                text = f.read(FRONT_MATTER_LIMIT).decode('utf-8', 'replace')
+        except OSError:
+            return None
+    root = parse_root_url(text[:FRONT_MATTER_LIMIT])
+    if root is None:
+        return None
+    if root.lower().startswith('file://'):
+        root = root[7:]
+        if re.match(r'^/[A-Za-z]:', root):
+            root = root[1:]
+    elif _URL_SCHEME_RE.match(root):
+        return None
+    return os.path.join(os.path.dirname(os.path.abspath(md_file)), unquote(root))
+
+
+def _root_dirs(base_dir, root_dir):
+    """以 / 开头的目标可能相对的目录
+
+    设置了 typora-root-url 时只有该目录；否则无法确定根目录，保守地取 Markdown 所在目录
+    及其各级上级目录，避免把按笔记库根目录书写的引用误判为未引用。
+    """
+    if root_dir is not None:
+        return [root_dir]
+    dirs = [base_dir]
+    while os.path.dirname(dirs[-1]) != dirs[-1]:
+        dirs.append(os.path.dirname(dirs[-1]))
+    return dirs
+
+
+def resolve_reference(base_dir, target, root_dir=None):
+    """把链接目标解析为规范化的绝对路径键集合，外部链接返回空集合
+
+    为避免把仍被引用的图片误判为未引用，对可能有歧义的写法保守地同时保留多种解释：
+    原样、URL 解码后、去掉 ?query / #fragment 后，以及把反斜杠视为分隔符。
+    以 / 开头的目标既按文件系统绝对路径解析，也按 root_dir（typora-root-url）解析，
+    没有 root_dir 时见 _root_dirs。
+    """
+    target = target.strip()
+    if not target or target.startswith('#'):
+        return set()
+    file_url = target.lower().startswith('file://')
+    if file_url:
+        target = target[7:]
+        if re.match(r'^/[A-Za-z]:', target):  # file:///C:/...
+            target = target[1:]
+    elif _URL_SCHEME_RE.match(target):
+        return set()
+
+    candidates = {target, unquote(target)}
+    if '\\' in target:  # Markdown 反斜杠转义，如 img\(1\).png
+        candidates.add(re.sub(r'\\([^\w\s])', r'\1', target))
+    for candidate in list(candidates):
+        stripped = re.split(r'[?#]', candidate, 1)[0]
+        if stripped:
+            candidates.add(stripped)
+    for candidate in list(candidates):
+        if '\\' in candidate:
+            candidates.add(candidate.replace('\\', '/'))
+    keys = {path_key(os.path.join(base_dir, candidate)) for candidate in candidates}
+    rooted = [c.lstrip('/') for c in candidates if c.startswith('/') and not c.startswith('//')]
+    if rooted and not file_url:
+        for root in _root_dirs(base_dir, root_dir):
+            keys.update(path_key(os.path.join(root, candidate)) for candidate in rooted)
+    return keys
+
+
+class OperationCancelled(Exception):
+    """扫描过程中 should_stop() 返回真时抛出（部分结果没有意义，直接放弃）"""
+
+
+def _check_stop(should_stop):
+    if should_stop is not None and should_stop():
+        raise OperationCancelled()
+
+
+def _emit(log, message):
+    if log is not None:
+        log(message)
+
+
+class _FenceTracker:
+    """记录当前是否处于围栏代码块中（``` 或 ~~~，结束行须为同种字符且不短于开始行）"""
+
+    def __init__(self):
+        self.fence = None
+
+    def visit(self, match, syntax):
+        """处理一个围栏行，返回该行之后是否位于代码块中"""
+        fence = match.group('fence')
+        info = match.string[match.end('fence'):match.end()]
+        if self.fence is None:
+            # 反引号围栏的信息串中不能再有反引号（否则是行内代码）
+            if not (fence[:1] == syntax.backtick and syntax.backtick in info):
+                self.fence = fence
+        elif fence[:1] == self.fence[:1] and len(fence) >= len(self.fence) and not info.strip():
+            self.fence = None
+        return self.fence is not None
+
+
+def _strip_title(text, start, end, syntax):
+    """去掉行内链接目标末尾的标题（`x.png "标题"`），返回新的结束位置"""
+    blanks = syntax.blanks
+    while end > start and text[end - 1:end] in blanks:
+        end -= 1
+    opener = syntax.title_openers.get(text[end - 1:end]) if end > start else None
+    if opener is not None:
+        i = text.rfind(opener, start, end - 1)
+        if i > start and text[i - 1:i] in blanks:
+            end = i - 1
+            while end > start and text[end - 1:end] in blanks:
+                end -= 1
+    return end
+
+
+def _scan_lines(text, pos, endpos, fences, syntax):
+    """扫描围栏行，返回代码块之外的区间 [(起始, 结束)]"""
+    segments = []
+    segment_start = pos if fences.fence is None else None
+    for match in syntax.line.finditer(text, pos, endpos):
+        inside = fences.visit(match, syntax)
+        if inside and segment_start is not None:
+            segments.append((segment_start, match.start()))
+            segment_start = None
+        elif not inside and segment_start is None:
+            segment_start = match.end()
+    if segment_start is not None:
+        segments.append((segment_start, endpos))
+    return segments
+
+
+def _is_definition(text, match, pos, syntax):
+    """`]:` 匹配所在行从行首（或 pos）开始是否是引用定义的开头"""
+    line_start = max(text.rfind(syntax.newline, pos, match.start()) + 1, pos)
+    return syntax.definition_prefix.fullmatch(text, line_start, match.start() + 1) is not None
+
+
+def _iter_references(text, pos=0, endpos=None, fences=None):
+    """遍历 text[pos:endpos] 中的引用，跳过围栏代码块，按位置顺序产出 (起始位置, 结束位置, 目标, 写法)
+
+    写法为命中的分组名：inline / angle（行内链接）、definition / defangle（引用定义）、
+    src / src_single / src_bare（HTML 图片）。
+
+    先扫描围栏行得到代码块之外的区间，再在这些区间中扫描引用定义、行内链接和 HTML 图片。
+    fences 在分块扫描时跨块保存代码块状态。
+    """
+    syntax = _STR_SYNTAX if isinstance(text, str) else _BYTES_SYNTAX
+    fences = fences or _FenceTracker()
+    endpos = len(text) if endpos is None else endpos
+    segments = _scan_lines(text, pos, endpos, fences, syntax)
+    matches = []
+    for start, end in segments:
+        matches.extend(match for match in syntax.definition.finditer(text, start, end)
+                       if _is_definition(text, match, start, syntax))
+        matches.extend(syntax.inline.finditer(text, start, end))
+        matches.extend(syntax.html.finditer(text, start, end))
+
+    spans = []
+    for match in matches:
+        group = match.lastgroup
+        start, end = match.start(group), match.end(group)
+        if group == 'inline':
+            end = _strip_title(text, start, end, syntax)
+        spans.append((start, end, group))
+    spans.sort()
+    last = pos
+    for start, end, group in spans:
+        if start >= last:  # 理论上不会重叠，保险起见丢弃与前一个目标重叠的匹配
+            yield start, end, text[start:end], group
+            last = end
+
+
+def _find_targets(text, pos, endpos, fences):
+    """返回 text[pos:endpos] 中的引用目标列表（与 _iter_references 的目标相同，但不保证顺序）
+
+    逐个区间用 findall 批量取出目标，省去逐个匹配对象的开销。
+    """
+    syntax = _STR_SYNTAX if isinstance(text, str) else _BYTES_SYNTAX
+    segments = _scan_lines(text, pos, endpos, fences, syntax)
+    targets = []
+    for start, end in segments:
+        for match in syntax.definition.finditer(text, start, end):
+            if _is_definition(text, match, start, syntax):
+                targets.append(match.group(match.lastgroup))
+        for angle, inline in syntax.inline.findall(text, start, end):
+            if angle:
+                targets.append(angle)
+            elif inline and inline[-1:] in syntax.title_ends:
+                targets.append(inline[:_strip_title(inline, 0, len(inline), syntax)])
+            else:
+                targets.append(inline)
+        for src, src_single, src_bare in syntax.html.findall(text, start, end):
+            targets.append(src or src_single or src_bare)
+    return targets
+
+
+def _tag_end(buf):
+    """最后一个可作为切分点的 '>' 之后的位置，没有时返回 0
+
+    紧跟 ')' 的 '>' 是 ![](<路径>) 尖括号目标的一部分，不能在这里切分；
+    位于末尾的 '>' 还看不到下一个字节，也先不切分。
+    """
+    end = buf.rfind(b'>', 0, len(buf) - 1)
+    while end >= 0 and buf[end + 1:end + 2] == b')':
+        end = buf.rfind(b'>', 0, end)
+    return end + 1
+
+
+def _open_img_tag(buf, pos, end):
+    """buf[pos:end] 末尾尚未闭合的 <img 标签的起始位置，没有时返回 -1"""
+    start = buf.rfind(b'<', pos, end)
+    if start < 0 or buf.find(b'>', start, end) >= 0 or buf[start + 1:start + 4].lower() != b'img':
+        return -1
+    return start
+
+
+class ReferenceScanner:
+    """单遍流式提取 Markdown 引用目标（在未解码的 UTF-8 字节上匹配）
+
+    通过 feed() 按块送入字节，在最后一个换行处切分，剩余的半行保留到下一块拼接，
+    因此行首写法（围栏、引用定义）不会被截断，内存占用只与块大小有关。
+    只有匹配到的目标才会被解码，close() 返回目标字符串集合。
+    """
+
+    def __init__(self):
+        self.targets = set()
+        self._carry = b'\n'
+        self._fences = _FenceTracker()
+
+    def feed(self, data):
+        buf = self._carry + data
+        cut = buf.rfind(b'\n') + 1
+        tag = _open_img_tag(buf, 0, cut)
+        if tag >= 0 and cut - tag <= MAX_TARGET_LENGTH:
+            cut = tag  # 属性换行的 <img> 还没有结束，整个标签留到下一块
+        if len(buf) - cut > MAX_TARGET_LENGTH:
+            # 超长的行：在行内链接可能结束的位置切分
+            cut = max(cut, buf.rfind(b')') + 1, _tag_end(buf))
+        self.targets.update(_find_targets(buf, 0, cut, self._fences))
+        # 多保留切分点前的一个字节，下一块开头的行首写法才能匹配到前导换行；
+        # 没有切分（cut == 0）时整块都要留到下一块
+        keep = max(cut, len(buf) - MAX_TARGET_LENGTH - 2)
+        self._carry = buf[max(keep - 1, 0):]
+
+    def close(self):
+        """结束扫描并返回解码后的目标集合；目标不是合法的 UTF-8 时抛出 UnicodeDecodeError"""
+        self.targets.update(_find_targets(self._carry, 0, len(self._carry), self._fences))
+        self._carry = b'\n'
+        return {target.decode('utf-8') for target in self.targets}
+
+
+def iter_target_spans(text):
+    """遍历文本中的引用目标，产出 (起始位置, 结束位置, 目标, 写法)，用于改写引用（写法见 _iter_references）"""
+    for start, end, target, kind in _iter_references('\n' + text):
+        yield start - 1, end - 1, target, kind
+
+
+def _scan_mapped(buf, window=MMAP_WINDOW, progress=None, should_stop=None):
+    """直接在整个缓冲区（内存映射的文件）上扫描引用目标，返回未解码的目标集合
+
+    正则引擎通过 pos/endpos 在缓冲区上按窗口匹配，不复制也不解码全文；
+    每个窗口扫描完后通知内核丢弃这些页，常驻内存不随文件大小增长。
+    progress(字节数) 在每个窗口后调用，should_stop 在每个窗口前检查。
+    """
+    fences = _FenceTracker()
+    targets = set()
+    size = len(buf)
+    pos = 0
+    # 围栏行依赖前导换行，首行单独拼上换行匹配（只复制一行）
+    line_end = buf.find(b'\n', 0, MAX_TARGET_LENGTH)
+    head = b'\n' + buf[:line_end if line_end >= 0 else MAX_TARGET_LENGTH]
+    first = _BYTES_SYNTAX.line.match(head)
+    if first is not None:
+        fences.visit(first, _BYTES_SYNTAX)
+        pos = line_end if line_end >= 0 else size
+
+    release = getattr(buf, 'madvise', None) if hasattr(mmap, 'MADV_DONTNEED') else None
+    released = 0
+    while pos < size:
+        _check_stop(should_stop)
+        cut = next_pos = min(size, pos + window)
+        if cut < size:
+            # 在最后一个换行处切分，并把换行留给下一个窗口，使其开头的行首写法能够匹配；
+            # 窗口内没有换行时延伸到行尾（在映射区上匹配不需要额外内存）
+            newline = buf.rfind(b'\n', pos + 1, cut)
+            if newline < 0:
+                newline = buf.find(b'\n', cut)
+            if newline >= 0 and _open_img_tag(buf, pos, newline + 1) >= 0:
+                # 属性换行的 <img> 跨过了切分点：延伸到标签结束所在的行尾
+                close = buf.find(b'>', newline, newline + MAX_TARGET_LENGTH)
+                if close >= 0:
+                    newline = buf.find(b'\n', close)
+            if newline >= 0:
+                cut, next_pos = newline + 1, newline
+            else:
+                cut = next_pos = size
+        targets.update(_find_targets(buf, pos, cut, fences))
+        if release is not None:
+            done = (cut - 1) // mmap.PAGESIZE * mmap.PAGESIZE
+            if done > released:
+                release(mmap.MADV_DONTNEED, released, done - released)
+                released = done
+        if progress is not None:
+            progress(next_pos - pos)
+        pos = next_pos
+    return targets
+
+
+def scan_markdown_targets(md_file, chunk_size=SCAN_CHUNK_SIZE, progress=None, should_stop=None):
+    """读取 Markdown 文件并返回其中所有引用目标的集合
+
+    一般文件分块读取；超过 MMAP_THRESHOLD 的文件内存映射后直接在映射区上扫描。
+    progress(字节数) 在每块扫描后调用；should_stop() 返回真时抛出 OperationCancelled。
+    """
+    with open(md_file, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                    buf.madvise(mmap.MADV_SEQUENTIAL)
+                targets = _scan_mapped(buf, progress=progress, should_stop=should_stop)
+                return {target.decode('utf-8') for target in targets}
+
+        scanner = ReferenceScanner()
+        while True:
+            _check_stop(should_stop)
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            scanner.feed(chunk)
+            if progress is not None:
+                progress(len(chunk))
+    return scanner.close()
+
+
+def scan_used_images(md_file, progress=None, should_stop=None):
+    """返回 Markdown 文件中引用的图片路径键集合（见 resolve_reference），读取失败时抛出异常"""
+    base_dir = os.path.dirname(os.path.abspath(md_file))
+    root_dir = typora_root_dir(md_file)
+    used_images = set()
+    for target in scan_markdown_targets(md_file, progress=progress, should_stop=should_stop):
+        for key in resolve_reference(base_dir, target, root_dir):
+            if key.lower().endswith(IMAGE_EXTENSIONS):
+                used_images.add(key)
+    return used_images
+
+
+def _timed_scan(md_file, stats, progress=None, should_stop=None):
+    """scan_used_images，并把耗时和扫描的字节数计入 stats 的 parse 阶段"""
+    if stats is None:
+        return scan_used_images(md_file, progress, should_stop)
+    with stats.timed('parse', items=1) as stage:
+        used_images = scan_used_images(md_file, progress, should_stop)
+        stage.bytes += os.path.getsize(md_file)
+    return used_images
+
+
+def find_used_images(md_file, log=None, index=None, stats=None, progress=None, should_stop=None):
+    """查找 Markdown 文件中引用的图片，返回规范化绝对路径的集合
+
+    传入 index（ReferenceIndex）时，文件未变化则直接使用缓存结果。
+    传入 stats（CleanStats）时记录解析耗时与字节数。
+    progress(字节数) 报告扫描进度；should_stop() 返回真时抛出 OperationCancelled。
+    """
+    key = file_key(md_file) if index is not None else None
+    if key is not None:
+        cached = index.get_references(md_file, key)
+        if cached is not None:
+            if stats is not None:
+                stats.count('parse_cached')
+            return cached
+
+    try:
+        used_images = _timed_scan(md_file, stats, progress, should_stop)
+    except OperationCancelled:
+        raise
+    except FileNotFoundError:
+        _emit(log, f"错误: 文件 {md_file} 未找到\n")
+        return set()
+    except Exception as e:
+        _emit(log, f"错误: 读取文件时发生异常: {str(e)}\n")
+        return set()
+
+    if key is not None:
+        index.put_references(md_file, key, used_images)
+    return used_images
+
+
+def scan_images(assets_folder, subdirs=None, should_stop=None, sizes=None):
+    """递归列出 .assets 文件夹中的所有图片（相对路径），扫描失败时抛出异常
+
+    跳过 deleted_images 和隐藏目录；传入 subdirs 列表时会追加遍历到的子文件夹相对路径。
+    传入 sizes 字典时从目录项中填入 {相对路径: 文件大小}（Windows 上目录项自带大小，无需额外 stat）。
+    should_stop 在进入每个子文件夹前检查。
+    """
+    all_images = []
+    pending = ['']
+    while pending:
+        _check_stop(should_stop)
+        rel_dir = pending.pop()
+        with os.scandir(os.path.join(assets_folder, rel_dir)) as entries:
+            for entry in entries:
+                rel = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name != DELETED_FOLDER_NAME and not entry.name.startswith('.'):
+                        pending.append(rel)
+                        if subdirs is not None:
+                            subdirs.append(rel)
+                elif entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    all_images.append(rel)
+                    if sizes is not None:
+                        sizes[rel] = entry.stat().st_size
+    return all_images
+
+
+def diff_images(assets_folder, all_images, used_images):
+    """按路径键计算集合差，返回 (未引用列表, 已引用列表)，元素为相对 assets_folder 的路径"""
+    keyed = {path_key(os.path.join(assets_folder, img)): img for img in all_images}
+    unused = sorted(keyed[key] for key in keyed.keys() - used_images)
+    used = sorted(keyed[key] for key in keyed.keys() & used_images)
+    return unused, used
+
+
+def _timed_listing(assets_folder, subdirs, stats, should_stop=None, sizes=None):
+    if stats is None:
+        return scan_images(assets_folder, subdirs, should_stop, sizes)
+    with stats.timed('listing') as stage:
+        all_images = scan_images(assets_folder, subdirs, should_stop, sizes)
+        stage.items += len(all_images)
+    return all_images
+
+
+def get_all_images(assets_folder, log=None, index=None, stats=None, should_stop=None, sizes=None):
+    """递归列出 .assets 文件夹中的所有图片（相对路径）
+
+    传入 index 时，文件夹及子文件夹 mtime 未变化则直接使用缓存的列表。
+    传入 sizes 字典时，实际列目录的情况下填入各图片的大小（使用缓存时保持为空）。
+    should_stop() 返回真时抛出 OperationCancelled。
+    """
+    if not os.path.exists(assets_folder):
+        _emit(log, f"错误: 文件夹 {assets_folder} 不存在\n")
+        return []
+
+    key = file_key(assets_folder) if index is not None else None
+    if key is not None:
+        cached = index.get_listing(assets_folder, key)
+        if cached is not None:
+            if stats is not None:
+                stats.count('listing_cached')
+            return cached
+
+    subdirs = []
+    try:
+        all_images = _timed_listing(assets_folder, subdirs, stats, should_stop, sizes)
+    except OperationCancelled:
+        raise
+    except Exception as e:
+        _emit(log, f"错误: 扫描文件夹时发生异常: {str(e)}\n")
+        return []
+
+    if key is not None:
+        index.put_listing(assets_folder, key, all_images, subdirs)
+    return all_images
+
+
+class AnalysisResult(namedtuple('AnalysisResult', 'md_file assets_folder unused used sizes')):
+    """一次分析的不可变结果，unused / used 为相对 assets_folder 的路径元组（已排序）
+
+    分析与移动分开进行：界面先展示结果，用户确认后只对选中的子集执行移动，
+    结果对象可以在线程之间直接传递。sizes 为列目录时得到的 {相对路径: 大小} 只读映射，
+    图片列表来自索引缓存时为空。
+    """
+    __slots__ = ()
+
+    def __new__(cls, md_file, assets_folder, unused, used, sizes=None):
+        return super().__new__(cls, md_file, assets_folder, tuple(unused), tuple(used),
+                               MappingProxyType(dict(sizes or {})))
+
+    @property
+    def total(self):
+        return len(self.unused) + len(self.used)
+
+    def preview_items(self):
+        """[(图片绝对路径, 是否被使用)]，未引用的图片在前"""
+        return ([(os.path.join(self.assets_folder, img), False) for img in self.unused]
+                + [(os.path.join(self.assets_folder, img), True) for img in self.used])
+
+
+def analyze_markdown(md_file, log=None, index=None, stats=None, tracker=None, report=None,
+                     should_stop=None):
+    """列出图片、解析引用并比对，返回 AnalysisResult；文件夹中没有图片时返回 None
+
+    只读不写。先列目录：得到图片数后才能估计后续各阶段的工作量。
+    传入 tracker（ProgressTracker，至少包含 ANALYSIS_STAGES）时按实际工作量推进，
+    其中之后按图片计量的阶段（如界面读取图片信息）的总量同样按图片数设置；
+    report(文字) 在各阶段开始和解析推进时调用，用于刷新进度显示。
+    should_stop() 返回真时抛出 OperationCancelled。
+    """
+    stats = stats if stats is not None else CleanStats()
+    tracker = tracker if tracker is not None else ProgressTracker(ANALYSIS_STAGES)
+    report = report or (lambda text: None)
+    assets_folder = assets_folder_for(md_file)
+
+    tracker.begin('listing')
+    report("正在列出图片...")
+    sizes = {}
+    all_images = get_all_images(assets_folder, log, index, stats, should_stop, sizes)
+    tracker.finish('listing', len(all_images))
+    if not all_images:
+        _emit(log, f"错误: 在 {assets_folder} 中未找到图片文件\n")
+        return None
+
+    total_images = len(all_images)
+    _emit(log, f"在 {assets_folder} 中找到 {total_images} 张图片\n")
+    tracker.set_total('parse', os.path.getsize(md_file))
+    for stage in tracker.stages:
+        if stage not in ('listing', 'parse') and tracker.totals[stage] is None:
+            tracker.set_total(stage, total_images)
+
+    def on_parse(nbytes):
+        tracker.advance('parse', nbytes)
+        report("正在查找引用图片...")
+
+    tracker.begin('parse')
+    report("正在查找引用图片...")
+    used_images = find_used_images(md_file, log, index, stats, on_parse, should_stop)
+    tracker.finish('parse')
+    if not used_images:
+        _emit(log, "警告: 在Markdown文件中未找到引用的图片\n")
+
+    _check_stop(should_stop)
+    tracker.begin('diff')
+    report("正在分析图片引用...")
+    with stats.timed('diff', items=total_images):
+        unused_images, used_in_folder = diff_images(assets_folder, all_images, used_images)
+    tracker.finish('diff')
+    return AnalysisResult(md_file, assets_folder, unused_images, used_in_folder, sizes)
+
+
+def exclude_referenced(md_file, images, log=None, index=None, stats=None, progress=None,
+                       should_stop=None):
+    """重新读取 Markdown，把分析之后又被引用的图片排除在外，返回 (仍未引用, 已跳过)
+
+    images 为相对 .assets 文件夹的路径；Markdown 未变化且传入 index 时直接使用缓存。
+    """
+    assets_folder = assets_folder_for(md_file)
+    used_now = find_used_images(md_file, log, index, stats, progress, should_stop)
+    remaining = []
+    skipped = []
+    for img in images:
+        if path_key(os.path.join(assets_folder, img)) in used_now:
+            _emit(log, f"跳过: {img} 在分析之后被引用\n")
+            skipped.append(img)
+        else:
+            remaining.append(img)
+    return remaining, skipped
+
+
+def _plan_destinations(deleted_folder, images):
+    """为每个待移动文件选择 deleted_images 中不冲突的目标路径，返回 [(src, dst)]"""
+    taken = set()
+
+    def is_taken(name):
+        return name in taken or os.path.lexists(os.path.join(deleted_folder, name))
+
+    plan = []
+    for img in images:
+        dst = img
+        if is_taken(dst):
+            stem, ext = os.path.splitext(img)
+            n = 1
+            while is_taken(f"{stem}~{n}{ext}"):
+                n += 1
+            dst = f"{stem}~{n}{ext}"
+        taken.add(dst)
+        plan.append((img, dst))
+    return plan
+
+
+def _move_one(assets_folder, deleted_folder, img, dst):
+    """移动单个文件，返回 (状态, 错误信息, 文件大小, 耗时)"""
+    start = time.perf_counter()
+    src_path = os.path.join(assets_folder, img)
+    dst_path = os.path.join(deleted_folder, dst)
+    try:
+        size = os.stat(src_path).st_size
+    except OSError:
+        return 'missing', None, 0, time.perf_counter() - start
+    try:
+        parent = os.path.dirname(dst_path)
+        if parent != deleted_folder:
+            os.makedirs(parent, exist_ok=True)
+        rename_or_move(src_path, dst_path)
+        return 'moved', None, size, time.perf_counter() - start
+    except Exception as e:
+        return 'failed', str(e), 0, time.perf_counter() - start
+
+
+def move_unused_images(assets_folder, unused_images, log=None, progress=None,
+                       workers=MOVE_WORKERS, stats=None, should_stop=None):
+    """将未引用的图片移动到 deleted_images 文件夹，返回成功移动的文件名列表
+
+    先把整批移动写入 deleted_images/.journal.jsonl，再用有界线程池并行移动，
+    之后可通过 undo 命令按日志恢复。progress(i, total) 在每完成一个文件后调用
+    （在调用方线程中）。传入 stats 时记录移动阶段耗时、字节数和单个文件的延迟。
+
+    should_stop() 返回真时不再提交新的移动，等进行中的几个文件完成后返回已移动的部分，
+    并把未执行的条目从日志中删除，日志与磁盘上的实际状态保持一致。
+    """
+    if not unused_images:
+        return []
+    deleted_folder = os.path.join(assets_folder, DELETED_FOLDER_NAME)
+    # 只有在需要移动文件时才创建备份文件夹
+    if not os.path.exists(deleted_folder):
+        os.makedirs(deleted_folder)
+        _emit(log, f"创建备份文件夹: {deleted_folder}\n")
+
+    plan = _plan_destinations(deleted_folder, unused_images)
+    journal = MoveJournal(deleted_folder)
+    run_id = new_run_id()
+    journal.record(run_id, plan)
+
+    moved = []
+    total = len(plan)
+    workers = max(1, min(workers, total))
+    start = time.perf_counter()
+    moved_bytes = 0
+    # 只保持少量移动在进行中，取消时最多再等这几个文件完成
+    next_index = 0
+    completed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        while True:
+            if should_stop is None or not should_stop():
+                while next_index < total and len(futures) < 2 * workers:
+                    img, dst = plan[next_index]
+                    futures[pool.submit(_move_one, assets_folder, deleted_folder, img, dst)] = (img, dst)
+                    next_index += 1
+            if not futures:
+                break
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                img, dst = futures.pop(future)
+                status, error, size, seconds = future.result()
+                if stats is not None:
+                    if status == 'moved':
+                        stats.move_latency.observe(seconds)
+                    else:
+                        stats.count(f'move_{status}')
+                if status == 'moved':
+                    moved.append(img)
+                    moved_bytes += size
+                    target = DELETED_FOLDER_NAME if dst == img else os.path.join(DELETED_FOLDER_NAME, dst)
+                    _emit(log, f"已移动: {img} -> {target}\n")
+                elif status == 'missing':
+                    _emit(log, f"文件不存在: {img} (已被移动?)\n")
+                else:
+                    _emit(log, f"错误: 无法移动 {img}: {error}\n")
+
+                if progress is not None:
+                    progress(completed, total)
+                completed += 1
+
+    if next_index < total:
+        journal.discard(run_id, plan[next_index:])
+        _emit(log, f"已取消: 剩余 {total - next_index} 张图片未移动\n")
+    if stats is not None:
+        stats.stage('move').add(time.perf_counter() - start, len(moved), moved_bytes)
+        if next_index < total:
+            stats.count('move_cancelled', total - next_index)
+    return moved
+
+
+def remove_unused_images(assets_folder, unused_images, log=None, progress=None, stats=None,
+                         should_stop=None, archive=None):
+    """archive 为 (格式, 归档目录或 None) 时写入压缩归档，否则移入 deleted_images；返回处理掉的图片"""
+    if archive is None:
+        return move_unused_images(assets_folder, unused_images, log, progress,
+                                  stats=stats, should_stop=should_stop)
+    from cleaner_archive import archive_unused_images
+    fmt, archive_dir = archive
+    try:
+        return archive_unused_images(assets_folder, unused_images, fmt, archive_dir, log,
+                                     progress, stats, should_stop)
+    except OperationCancelled:
+        _emit(log, "已取消: 归档未完成，没有删除任何图片\n")
+        return []
+
+
+def iter_markdown_files(root):
+    """递归遍历目录树中的 .md 文件（跳过隐藏目录与 .assets 目录）"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames
+                       if not d.startswith('.') and not d.endswith('.assets')]
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith('.md'):
+                yield os.path.join(dirpath, name)
+
+
+def clean_markdown_file(md_file, dry_run=False, used_images=None, all_images=None, archive=None):
+    """对单个 Markdown 文件执行完整的分析与清理，返回结果字典
+
+    该函数不依赖 Qt，可在进程池的工作进程中直接调用。used_images / all_images
+    可传入索引中缓存的结果以跳过解析或目录扫描。Markdown 读取失败时不会移动任何文件。
+    archive 为 (格式, 归档目录或 None) 时把未引用的图片写入压缩归档，而不是移入 deleted_images。
+    结果中的 stats 为 CleanStats.to_dict()，可在主进程中汇总。
+    """
+    stats = CleanStats()
+    messages = []
+    assets_folder = assets_folder_for(md_file)
+    result = {
+        'md_file': md_file,
+        'assets_folder': assets_folder,
+        'used': 0,
+        'images': 0,
+        'unused': 0,
+        'moved': 0,
+        'error': None,
+        'messages': messages,
+        'used_images': None,
+        'remaining_images': None,
+        'subdirs': None,
+        'stats': None,
+    }
+    try:
+        if used_images is None:
+            used_images = _timed_scan(md_file, stats)
+        else:
+            stats.count('parse_cached')
+        if all_images is None:
+            result['subdirs'] = []
+            all_images = _timed_listing(assets_folder, result['subdirs'], stats)
+        else:
+            stats.count('listing_cached')
+        with stats.timed('diff', items=len(all_images)):
+            unused_images, used_in_folder = diff_images(assets_folder, all_images, used_images)
+
+        result['used'] = len(used_in_folder)
+        result['images'] = len(all_images)
+        result['unused'] = len(unused_images)
+        result['used_images'] = used_images
+
+        moved = []
+        if unused_images and not dry_run:
+            moved = remove_unused_images(assets_folder, unused_images, messages.append,
+                                         stats=stats, archive=archive)
+        result['moved'] = len(moved)
+        moved_set = set(moved)
+        result['remaining_images'] = [img for img in all_images if img not in moved_set]
+    except Exception as e:
+        result['error'] = str(e)
+    result['stats'] = stats.to_dict()
+    return result
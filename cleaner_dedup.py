@@ -0,0 +1,179 @@
+"""按内容哈希查找重复图片：保留一份，改写 Markdown 中的引用，其余移入 deleted_images"""
+import hashlib
+import os
+import re
+import shutil
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, unquote
+
+from cleaner_core import iter_target_spans, path_key, resolve_reference, typora_root_dir
+
+HASH_WORKERS = 8
+# 先只比较文件开头这么多字节的哈希，相同的再比较全文件哈希
+HEAD_BYTES = 64 * 1024
+READ_BLOCK = 1 << 20
+
+try:  # 可选依赖：安装了 xxhash 时使用更快的非加密哈希
+    import xxhash
+
+    def _new_hash():
+        return xxhash.xxh3_128()
+except ImportError:
+    def _new_hash():
+        return hashlib.blake2b(digest_size=16)
+
+
+def hash_file(path, limit=None):
+    """计算文件（或前 limit 字节）的哈希"""
+    h = _new_hash()
+    remaining = limit
+    with open(path, 'rb') as f:
+        while remaining is None or remaining > 0:
+            block = f.read(READ_BLOCK if remaining is None else min(READ_BLOCK, remaining))
+            if not block:
+                break
+            h.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return h.digest()
+
+
+def _refine(groups, key_func, pool):
+    """用 key_func 并行细分每个候选组，只保留仍有 2 个以上成员的组"""
+    paths = [path for group in groups for path in group]
+    keys = dict(zip(paths, pool.map(key_func, paths)))
+    refined = []
+    for group in groups:
+        buckets = defaultdict(list)
+        for path in group:
+            if keys[path] is not None:
+                buckets[keys[path]].append(path)
+        refined.extend(bucket for bucket in buckets.values() if len(bucket) > 1)
+    return refined
+
+
+def _safe(func):
+    def wrapper(path):
+        try:
+            return func(path)
+        except OSError:
+            return None
+    return wrapper
+
+
+def find_duplicates(folder_images, workers=HASH_WORKERS):
+    """在每个文件夹内部查找内容完全相同的图片
+
+    folder_images: {文件夹: [相对路径]}。先按文件大小分组，只有大小相同的文件才会被读取，
+    再依次比较开头 64KB 的哈希和全文件哈希。返回 [[绝对路径, ...], ...]，每组至少 2 个。
+    """
+    by_size = defaultdict(list)
+    for folder, images in folder_images.items():
+        for img in images:
+            path = os.path.join(folder, img)
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            if size:
+                by_size[(path_key(folder), size)].append(path)
+
+    groups = [group for group in by_size.values() if len(group) > 1]
+    if not groups:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        groups = _refine(groups, _safe(lambda p: hash_file(p, HEAD_BYTES)), pool)
+        # 小于 HEAD_BYTES 的文件已经比较过全部内容
+        small = [g for g in groups if os.path.getsize(g[0]) <= HEAD_BYTES]
+        large = [g for g in groups if os.path.getsize(g[0]) > HEAD_BYTES]
+        groups = small + _refine(large, _safe(hash_file), pool)
+    return [sorted(group) for group in groups]
+
+
+def choose_canonical(group, graph=None):
+    """选择保留的副本：被引用次数最多者优先，其次路径最短、最早创建"""
+    def rank(path):
+        refs = graph.refcount(path) if graph is not None else 0
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = float('inf')
+        return -refs, len(path), mtime, path
+    return min(group, key=rank)
+
+
+class DocumentChanged(Exception):
+    """改写期间 Markdown 文件被修改（例如 Typora 自动保存），放弃改写"""
+
+
+# 行内链接和引用定义中需要用 <> 括起来的目标：含空白、括号或尖括号
+_NEEDS_ANGLE_RE = re.compile(r'[\s()<>]')
+
+
+def format_target(target, kind):
+    """按原链接的写法（见 iter_target_spans）把新目标写成合法的形式"""
+    if kind in ('inline', 'definition'):
+        if _NEEDS_ANGLE_RE.search(target):
+            return '<' + target.replace('<', '%3C').replace('>', '%3E') + '>'
+        return target
+    if kind in ('angle', 'defangle'):
+        return target.replace('>', '%3E')
+    if kind == 'src':
+        return target.replace('"', '%22')
+    if kind == 'src_single':
+        return target.replace("'", '%27')
+    if kind == 'src_bare' and re.search(r'[\s>"\']', target):
+        return '"' + target.replace('"', '%22') + '"'
+    return target
+
+
+def rewrite_references(md_file, replacements):
+    """把 Markdown 中指向 replacements 键（路径键）的链接改写为对应的新绝对路径
+
+    新目标写成相对 Markdown 所在目录的路径；原目标是 URL 编码的则同样编码，
+    含空格或括号的目标按原写法加上 <> 或引号。通过临时文件原子替换（保留文件权限），
+    替换前发现文件在读取之后被修改时放弃并抛出 DocumentChanged。返回改写的链接数。
+    """
+    base_dir = os.path.dirname(os.path.abspath(md_file))
+    st = os.stat(md_file)
+    with open(md_file, 'r', encoding='utf-8', newline='') as f:
+        content = f.read()
+    root_dir = typora_root_dir(md_file, content)
+
+    parts = []
+    last = 0
+    count = 0
+    for start, end, target, kind in iter_target_spans(content):
+        new_path = None
+        for key in resolve_reference(base_dir, target, root_dir):
+            if key in replacements:
+                new_path = replacements[key]
+                break
+        if new_path is None:
+            continue
+        new_target = os.path.relpath(new_path, base_dir).replace(os.sep, '/')
+        if unquote(target) != target:
+            new_target = quote(new_target, safe='/')
+        parts.append(content[last:start])
+        parts.append(format_target(new_target, kind))
+        last = end
+        count += 1
+
+    if count:
+        parts.append(content[last:])
+        tmp = md_file + '.dedup.tmp'
+        try:
+            with open(tmp, 'w', encoding='utf-8', newline='') as f:
+                f.write(''.join(parts))
+                f.flush()
+                os.fsync(f.fileno())
+            shutil.copymode(md_file, tmp)
+            current = os.stat(md_file)
+            if (current.st_size, current.st_mtime_ns) != (st.st_size, st.st_mtime_ns):
+                raise DocumentChanged("文件在读取之后被修改，已跳过")
+            os.replace(tmp, md_file)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    return count
@@ -0,0 +1,56 @@
+"""共享资源模式：多个 Markdown 文件共用同一个图片文件夹时的反向引用索引"""
+import os
+from collections import Counter
+
+from cleaner_core import path_key
+
+
+class ReferenceGraph:
+    """Markdown 文件 -> 引用的图片，以及反向的图片 -> 引用计数
+
+    更新单个文档只需对新旧引用集合做差，调整变化部分的计数，
+    因此增量更新的开销与该文档的引用数成正比，与库的大小无关。
+    """
+
+    def __init__(self):
+        self.documents = {}  # Markdown 路径键 -> frozenset(图片路径键)
+        self.refcounts = Counter()  # 图片路径键 -> 引用它的文档数
+
+    def __len__(self):
+        return len(self.documents)
+
+    def set_document(self, md_file, references):
+        """设置（或替换）一个文档的引用集合，返回 (新增引用, 移除引用)"""
+        key = path_key(md_file)
+        new = frozenset(references)
+        old = self.documents.get(key, frozenset())
+        added = new - old
+        removed = old - new
+        for ref in added:
+            self.refcounts[ref] += 1
+        for ref in removed:
+            self._decrement(ref)
+        self.documents[key] = new
+        return added, removed
+
+    def remove_document(self, md_file):
+        """删除一个文档及其全部引用，返回被移除的引用"""
+        old = self.documents.pop(path_key(md_file), frozenset())
+        for ref in old:
+            self._decrement(ref)
+        return old
+
+    def _decrement(self, ref):
+        count = self.refcounts[ref] - 1
+        if count > 0:
+            self.refcounts[ref] = count
+        else:
+            del self.refcounts[ref]
+
+    def refcount(self, image_path):
+        return self.refcounts.get(path_key(image_path), 0)
+
+    def orphans(self, folder, images):
+        """返回 folder 中（相对路径列表 images）没有被任何文档引用的图片"""
+        return sorted(img for img in images
+                      if path_key(os.path.join(folder, img)) not in self.refcounts)
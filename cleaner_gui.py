@@ -0,0 +1,1751 @@
+"""图形界面：分析/移动线程、预览模型与主窗口
+
+扫描、比对和移动都在 cleaner_core 中完成，这里只负责线程、信号与界面。
+由 typora_assets_cleaner.py 在需要界面时才导入，命令行模式不会加载 PyQt5。
+"""
+import sys
+import os
+import time
+from collections import OrderedDict
+
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QPushButton, QVBoxLayout,
+                             QHBoxLayout, QPlainTextEdit, QFileDialog, QWidget, QLabel,
+                             QProgressBar, QMessageBox, QSplitter, QListView,
+                             QGroupBox, QSizePolicy, QStyledItemDelegate, QStyle,
+                             QStyleOptionButton, QComboBox, QTableView, QHeaderView,
+                             QAbstractItemView, QSpinBox, QStyleOptionProgressBar, QToolTip)
+from PyQt5.QtCore import (Qt, QThread, pyqtSignal, QDir, QUrl, QAbstractListModel,
+                          QAbstractTableModel, QModelIndex, QRect, QSize, QEvent)
+from PyQt5.QtGui import QPixmap, QFont, QColor, QPen
+from PyQt5.QtGui import QDesktopServices
+
+from cleaner_core import (ANALYSIS_STAGES, OperationCancelled, analyze_markdown, assets_folder_for,
+                          exclude_referenced, iter_markdown_files, move_unused_images, path_key,
+                          user_cache_dir, backup_path_for)
+from cleaner_index import ReferenceIndex
+from cleaner_log import OperationLog
+from cleaner_meta import iter_image_info, format_dimensions
+from cleaner_similar import compute_hashes, find_similar_groups, similar_available
+from cleaner_stats import CleanStats, ProgressTracker, format_bytes
+from cleaner_thumbs import THUMB_SIZE, ThumbnailCache, ThumbnailLoader
+
+
+class SignalBatcher:
+    """把工作线程的高频事件合并成按时间片发送的批次
+
+    每条日志、每条图片信息、每次进度更新都单独 emit 会在 GUI 事件循环里排起长队，
+    这里先缓存起来，距上次发送超过 interval 秒时一次性送出：日志和图片信息整批发送，
+    进度只保留最新一次。
+    """
+
+    def __init__(self, thread, interval=0.05):
+        self.thread = thread
+        self.interval = interval
+        self.logs = []
+        self.infos = []
+        self.latest_progress = None
+        self.last_flush = time.monotonic()
+
+    def log(self, message):
+        self.logs.append(message)
+        self._maybe_flush()
+
+    def info(self, image_path, info):
+        self.infos.append((image_path, info))
+        self._maybe_flush()
+
+    def progress(self, value, text):
+        self.latest_progress = (value, text)
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if time.monotonic() - self.last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if self.infos:
+            infos, self.infos = self.infos, []
+            self.thread.info_signal.emit(infos)
+        if self.logs:
+            logs, self.logs = self.logs, []
+            self.thread.update_signal.emit(logs)
+        if self.latest_progress is not None:
+            value, text = self.latest_progress
+            self.latest_progress = None
+            self.thread.progress_signal.emit(value, text)
+        self.last_flush = time.monotonic()
+
+
+class WorkerThread(QThread):
+    """后台工作线程的公共部分：批量信号、统计、加权进度与协作式取消
+
+    进度按各阶段的实际工作量（Markdown 字节数、图片数）加权，并根据实测吞吐量估计剩余时间。
+    requestInterruption() 可随时取消，子类在安全点检查并停止。
+    """
+    update_signal = pyqtSignal(list)  # 日志行
+    progress_signal = pyqtSignal(int, str)
+    finish_signal = pyqtSignal(int)
+    metrics_signal = pyqtSignal(object)  # CleanStats 快照
+    info_signal = pyqtSignal(list)  # [(图片路径, ImageInfo)]
+
+    STAGES = ()
+
+    def __init__(self, md_file):
+        super().__init__()
+        self.md_file = md_file
+        self.assets_folder = assets_folder_for(md_file)
+        self.index = None
+        self.batcher = SignalBatcher(self)
+        self.stats = CleanStats()
+        self.tracker = ProgressTracker(self.STAGES)
+        self.cancelled = False
+
+    def open_index(self):
+        """打开用户缓存目录下的引用索引，失败时退化为全量扫描"""
+        try:
+            return ReferenceIndex(os.path.join(user_cache_dir(), 'index.db'))
+        except Exception as e:
+            self.batcher.log(f"警告: 无法打开索引，将进行全量扫描: {str(e)}\n")
+            return None
+
+    def run(self):
+        # SQLite 连接只能在创建它的线程中使用，因此在 run() 内打开
+        self.index = self.open_index()
+        try:
+            self.work()
+        except OperationCancelled:
+            self.cancelled = True
+            self.on_cancelled()
+        except Exception as e:
+            self.batcher.log(f"致命错误: {str(e)}\n")
+            self.batcher.progress(100, "操作失败")
+            self.finish(-1)
+        finally:
+            if self.index is not None:
+                self.index.close()
+                self.index = None
+
+    def work(self):
+        raise NotImplementedError
+
+    def on_cancelled(self):
+        self.batcher.progress(self.progress_value(), "已取消")
+        self.finish(0)
+
+    def report(self, text):
+        """按加权进度更新进度条，文本后附上剩余时间估计"""
+        eta = self.tracker.eta_text()
+        self.batcher.progress(self.progress_value(), f"{text} · {eta}" if eta else text)
+
+    def progress_value(self):
+        return int(self.tracker.fraction() * 100)
+
+    def check_cancel(self):
+        if self.isInterruptionRequested():
+            raise OperationCancelled()
+
+    def finish(self, count):
+        """先送出缓冲中的批次和统计，再通知完成"""
+        self.batcher.flush()
+        self.emit_metrics()
+        self.finish_signal.emit(count)
+
+    def emit_metrics(self):
+        """发送统计快照（副本），GUI 线程读取时工作线程仍可继续累加"""
+        snapshot = CleanStats()
+        snapshot.merge_dict(self.stats.to_dict())
+        self.metrics_signal.emit(snapshot)
+
+
+class AnalysisThread(WorkerThread):
+    """分析线程：列出图片、解析引用并比对，只读不写
+
+    比对完成后立即通过 result_signal 发送不可变的 AnalysisResult，界面据此展示预览；
+    随后在线程池中只读取文件头，通过 info_signal 陆续送出各图片的大小、格式与尺寸
+    （未引用的图片优先）。移动由用户确认后交给 MoveThread。
+    finish_signal 的参数为未引用图片数（失败时为 -1）。
+    """
+    result_signal = pyqtSignal(object)  # AnalysisResult
+
+    STAGES = ANALYSIS_STAGES + ('metadata',)
+
+    def work(self):
+        start_time = time.time()
+        self.batcher.log(f"开始分析文件: {os.path.basename(self.md_file)}\n")
+        self.batcher.progress(0, "准备分析...")
+
+        result = analyze_markdown(self.md_file, self.batcher.log, self.index, self.stats,
+                                  self.tracker, self.report, self.isInterruptionRequested)
+        if result is None:
+            self.batcher.progress(100, "操作完成")
+            self.finish(0)
+            return
+
+        self.batcher.flush()
+        self.result_signal.emit(result)
+        unused_images = result.unused
+        self.batcher.log(f"其中 {len(unused_images)} 张图片未在Markdown中引用\n")
+
+        self.read_metadata(result)
+        self.batcher.log(f"分析完成！耗时: {time.time() - start_time:.2f} 秒\n")
+        self.batcher.log(f"各阶段: {self.stats.summary()}\n")
+        if unused_images:
+            self.batcher.log("请在右侧确认要清理的图片（默认全选未引用的图片），然后点击“清理选中”\n")
+        else:
+            self.batcher.log("没有需要清理的图片\n")
+        self.batcher.progress(100, "分析完成")
+        self.finish(len(unused_images))
+
+    def read_metadata(self, result):
+        """只读文件头获取尺寸与格式；取消时停止读取，但保留已经得到的分析结果"""
+        tracker = self.tracker
+        tracker.begin('metadata')
+        self.report("正在读取图片信息...")
+        sizes = {os.path.join(result.assets_folder, img): size for img, size in result.sizes.items()}
+        paths = [path for path, _ in result.preview_items()]
+        unused = set(paths[:len(result.unused)])
+        reclaimable = 0
+        with self.stats.timed('metadata', items=len(paths)):
+            for path, info in iter_image_info(paths, sizes, should_stop=self.isInterruptionRequested):
+                if info is not None:
+                    self.batcher.info(path, info)
+                    if path in unused:
+                        reclaimable += info.size
+                tracker.advance('metadata')
+                self.report("正在读取图片信息...")
+        if self.isInterruptionRequested():
+            self.batcher.log("已停止读取图片信息\n")
+        else:
+            tracker.finish('metadata')
+            if result.unused:
+                self.batcher.log(f"未引用的图片共 {format_bytes(reclaimable)}\n")
+
+    def on_cancelled(self):
+        self.batcher.log("\n分析已取消\n")
+        super().on_cancelled()
+
+
+class MoveThread(WorkerThread):
+    """移动线程：把用户确认的未引用图片移入 deleted_images
+
+    移动前重新读取 Markdown（文件未变化时直接用索引），排除分析之后新被引用的图片。
+    取消时在进行中的文件完成后停止，日志中只保留实际移动的条目。
+    moved_signal / skipped_signal 发送已移动 / 因新被引用而跳过的图片（绝对路径），
+    finish_signal 的参数为移动的数量。
+    """
+    moved_signal = pyqtSignal(list)
+    skipped_signal = pyqtSignal(list)
+
+    STAGES = ('parse', 'move')
+
+    def __init__(self, md_file, images):
+        super().__init__(md_file)
+        self.images = list(images)  # 相对 assets_folder 的路径
+
+    def work(self):
+        tracker = self.tracker
+        start_time = time.time()
+        tracker.set_total('parse', os.path.getsize(self.md_file))
+        tracker.set_total('move', len(self.images))
+
+        # 分析之后 Markdown 可能又在 Typora 中被编辑过
+        tracker.begin('parse')
+        self.report("正在确认引用...")
+        images, skipped = exclude_referenced(self.md_file, self.images, self.batcher.log,
+                                             self.index, self.stats,
+                                             lambda n: self.tracker.advance('parse', n),
+                                             self.isInterruptionRequested)
+        tracker.finish('parse')
+        if skipped:
+            self.skipped_signal.emit([os.path.join(self.assets_folder, img) for img in skipped])
+        tracker.set_total('move', len(images))
+
+        self.check_cancel()
+        self.batcher.log(f"开始清理 {len(images)} 张选中的图片...\n")
+        tracker.begin('move')
+
+        def report_move(i, total):
+            tracker.advance('move')
+            self.report(f"已清理 {i + 1}/{total}")
+
+        moved = move_unused_images(self.assets_folder, images, self.batcher.log,
+                                   report_move, stats=self.stats,
+                                   should_stop=self.isInterruptionRequested)
+        self.moved_signal.emit([os.path.join(self.assets_folder, img) for img in moved])
+        if self.isInterruptionRequested():
+            self.cancelled = True
+            self.batcher.log(f"\n清理已取消，已移动 {len(moved)} 张图片到备份文件夹\n")
+            self.batcher.progress(self.progress_value(), "已取消")
+            self.finish(len(moved))
+            return
+
+        tracker.finish('move')
+        self.batcher.log(f"\n清理完成！耗时: {time.time() - start_time:.2f} 秒\n")
+        self.batcher.log(f"各阶段: {self.stats.summary()}\n")
+        self.batcher.log(f"共移动 {len(moved)} 张未引用的图片到备份文件夹\n")
+        self.batcher.progress(100, "清理完成")
+        self.finish(len(moved))
+
+    def on_cancelled(self):
+        self.batcher.log("\n清理已取消，未移动任何图片\n")
+        super().on_cancelled()
+
+
+class SimilarThread(WorkerThread):
+    """相似图片线程：在进程池中计算感知哈希（未变化的图片直接用索引缓存）并分组，只读不写
+
+    groups_signal 发送 [[图片路径, ...], ...]（取消时不发送），
+    finish_signal 的参数为相似组数。
+    """
+    groups_signal = pyqtSignal(list)
+
+    STAGES = ('similar',)
+
+    def __init__(self, md_file, images):
+        super().__init__(md_file)
+        self.images = list(images)  # 绝对路径
+
+    def work(self):
+        start_time = time.time()
+        self.tracker.set_total('similar', len(self.images))
+        self.tracker.begin('similar')
+        self.batcher.log(f"开始查找相似图片: {os.path.basename(self.md_file)}\n")
+        self.report("正在计算感知哈希...")
+
+        def advance():
+            self.tracker.advance('similar')
+            self.report("正在计算感知哈希...")
+
+        hashes = compute_hashes(self.images, self.index, stats=self.stats, progress=advance,
+                                should_stop=self.isInterruptionRequested)
+        self.check_cancel()
+        self.tracker.finish('similar')
+        groups = find_similar_groups(hashes)
+        self.batcher.flush()
+        self.groups_signal.emit(groups)
+        self.batcher.log(f"共 {len(groups)} 组相似图片，涉及 {sum(map(len, groups))} 张，"
+                         f"耗时: {time.time() - start_time:.2f} 秒"
+                         f"（缓存 {self.stats.counters.get('similar_cached', 0)} 张）\n")
+        self.batcher.progress(100, "相似分组完成")
+        self.finish(len(groups))
+
+    def on_cancelled(self):
+        self.batcher.log("\n查找相似图片已取消\n")
+        super().on_cancelled()
+
+
+class PreviewModel(QAbstractListModel):
+    """图片预览数据模型
+
+    只保存 (路径, 是否被使用)，缩略图在视图绘制到某一项时才请求解码，
+    解码结果保存在容量有限的 LRU 中，内存占用只与可见区域有关。
+    未引用的图片可勾选（默认勾选），只有勾选的图片会被清理；已移走的图片不再可勾选。
+    图片信息（大小、尺寸）由分析线程陆续送达，可按大小排序（分组保持未引用在前），
+    也可按相似分组排列：同组的图片相邻，组按大小从大到小，不属于任何组的图片排在最后。
+    """
+    PathRole = Qt.UserRole + 1
+    UsedRole = Qt.UserRole + 2
+    ThumbnailRole = Qt.UserRole + 3
+    MovedRole = Qt.UserRole + 4
+    InfoRole = Qt.UserRole + 5
+    GroupRole = Qt.UserRole + 6
+
+    checked_changed = pyqtSignal(int)  # 勾选数量
+
+    MAX_CACHED_THUMBNAILS = 150
+
+    def __init__(self, loader, parent=None):
+        super().__init__(parent)
+        self.items = []  # [(图片路径, 是否被使用)]
+        self.rows = {}  # 图片路径 -> 行号
+        self.thumbnails = OrderedDict()  # 图片路径 -> QPixmap（解码失败时为空 QPixmap）
+        self.checked = set()  # 勾选待清理的图片路径
+        self.moved = set()  # 已移入 deleted_images 的图片路径
+        self.sizes = {}  # 图片路径 -> 文件大小（列目录或读取文件头时得到）
+        self.infos = {}  # 图片路径 -> ImageInfo
+        self.sort_mode = 'default'  # 'default' / 'size' / 'similar'
+        self.groups = {}  # 图片路径 -> (相似组序号, 组内位置)
+        self.insertion_order = []  # 未排序时的显示顺序
+        self.pending = set()
+        self.assets_folder = None  # 用于推算已移入 deleted_images 的备份路径
+        self.loader = loader
+        self.loader.thumbnail_ready.connect(self.on_thumbnail_ready)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.items)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        image_path, is_used = self.items[index.row()]
+        if role == Qt.DisplayRole:
+            return os.path.basename(image_path)
+        if role == Qt.ToolTipRole or role == self.PathRole:
+            return image_path
+        if role == self.UsedRole:
+            return is_used
+        if role == self.MovedRole:
+            return image_path in self.moved
+        if role == self.InfoRole:
+            return self.infos.get(image_path)
+        if role == self.GroupRole:
+            group = self.groups.get(image_path)
+            return None if group is None else group[0] + 1
+        if role == Qt.CheckStateRole and self.is_checkable(image_path, is_used):
+            return Qt.Checked if image_path in self.checked else Qt.Unchecked
+        if role == self.ThumbnailRole:
+            return self.thumbnail(image_path, is_used)
+        return None
+
+    def is_checkable(self, image_path, is_used):
+        return not is_used and image_path not in self.moved
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.isValid() and self.is_checkable(*self.items[index.row()]):
+            flags |= Qt.ItemIsUserCheckable
+        return flags
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.CheckStateRole or not index.isValid():
+            return False
+        image_path, is_used = self.items[index.row()]
+        if not self.is_checkable(image_path, is_used):
+            return False
+        if value == Qt.Checked:
+            self.checked.add(image_path)
+        else:
+            self.checked.discard(image_path)
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        self.checked_changed.emit(len(self.checked))
+        return True
+
+    def set_all_checked(self, checked):
+        """勾选或取消勾选全部可清理的图片"""
+        if checked:
+            self.checked = {path for path, is_used in self.items if self.is_checkable(path, is_used)}
+        else:
+            self.checked = set()
+        if self.items:
+            self.dataChanged.emit(self.index(0), self.index(len(self.items) - 1), [Qt.CheckStateRole])
+        self.checked_changed.emit(len(self.checked))
+
+    def set_checked(self, paths, checked):
+        for path in paths:
+            row = self.rows.get(path)
+            if row is not None:
+                self.setData(self.index(row), Qt.Checked if checked else Qt.Unchecked,
+                             Qt.CheckStateRole)
+
+    def checked_bytes(self):
+        """勾选图片的总大小（尚未得到大小的图片不计入）"""
+        return sum(self.sizes.get(path, 0) for path in self.checked)
+
+    def update_infos(self, infos):
+        """批量更新图片信息 [(图片路径, ImageInfo)]"""
+        rows = []
+        for path, info in infos:
+            self.infos[path] = info
+            self.sizes[path] = info.size
+            row = self.rows.get(path)
+            if row is not None:
+                rows.append(row)
+        if rows:
+            self.dataChanged.emit(self.index(min(rows)), self.index(max(rows)), [self.InfoRole])
+        self.checked_changed.emit(len(self.checked))
+
+    def set_sort_mode(self, mode):
+        self.sort_mode = mode
+        self.apply_sort()
+
+    def set_groups(self, groups):
+        """设置相似分组 [[图片路径, ...], ...]（None 表示尚未计算）"""
+        self.groups = {path: (number, position)
+                       for number, group in enumerate(groups or ())
+                       for position, path in enumerate(group)}
+        if self.items:
+            self.dataChanged.emit(self.index(0), self.index(len(self.items) - 1), [self.GroupRole])
+        if self.sort_mode == 'similar':
+            self.apply_sort()
+
+    def apply_sort(self):
+        """按当前排序方式重排（大小未知的排在最后），保持视图中的选中项"""
+        if self.sort_mode == 'size':
+            items = sorted(self.insertion_order,
+                           key=lambda item: (item[1], -self.sizes.get(item[0], -1)))
+        elif self.sort_mode == 'similar':
+            last = (len(self.groups), 0)
+            items = sorted(self.insertion_order, key=lambda item: self.groups.get(item[0], last))
+        else:
+            items = list(self.insertion_order)
+        self.layoutAboutToBeChanged.emit()
+        old_items = self.items
+        self.items = items
+        self.rows = {path: row for row, (path, _) in enumerate(items)}
+        persistent = self.persistentIndexList()
+        self.changePersistentIndexList(
+            persistent, [self.index(self.rows[old_items[index.row()][0]]) for index in persistent])
+        self.layoutChanged.emit()
+
+    def checked_images(self):
+        """按显示顺序返回勾选的图片路径"""
+        return [path for path, _ in self.items if path in self.checked]
+
+    def set_result(self, result, infos=None, moved=(), checked=None, groups=None):
+        """展示一次分析结果（AnalysisResult），默认勾选全部未引用的图片
+
+        切换回之前的任务时传入已经读到的图片信息、已移动的图片、当时的勾选集合和相似分组。
+        """
+        self.clear(result.assets_folder)
+        self.sizes = {os.path.join(result.assets_folder, img): size
+                      for img, size in result.sizes.items()}
+        self.infos = dict(infos or {})
+        self.sizes.update((path, info.size) for path, info in self.infos.items())
+        self.moved = set(moved)
+        self.add_images(result.preview_items())
+        self.set_groups(groups)
+        if self.sort_mode != 'default':
+            self.apply_sort()
+        self.set_all_checked(True)
+        if checked is not None:
+            self.set_checked(self.checked - set(checked), False)
+
+    def mark_moved(self, paths):
+        """标记已移入 deleted_images 的图片（取消勾选，此后从备份位置读取缩略图）"""
+        for path in paths:
+            self.moved.add(path)
+            self.checked.discard(path)
+            row = self.rows.get(path)
+            if row is not None:
+                index = self.index(row)
+                self.dataChanged.emit(index, index)
+        self.checked_changed.emit(len(self.checked))
+
+    def add_images(self, images):
+        """批量追加 [(图片路径, 是否被使用)]，只触发一次行插入通知"""
+        images = [item for item in dict(images).items() if item[0] not in self.rows]
+        if not images:
+            return
+        first = len(self.items)
+        self.beginInsertRows(QModelIndex(), first, first + len(images) - 1)
+        for row, item in enumerate(images, first):
+            self.items.append(item)
+            self.insertion_order.append(item)
+            self.rows[item[0]] = row
+        self.endInsertRows()
+
+    def clear(self, assets_folder=None):
+        self.assets_folder = assets_folder
+        self.beginResetModel()
+        self.items = []
+        self.rows = {}
+        self.thumbnails.clear()
+        self.checked = set()
+        self.moved = set()
+        self.sizes = {}
+        self.infos = {}
+        self.groups = {}
+        self.insertion_order = []
+        self.endResetModel()
+        self.cancel_pending()
+
+    def cancel_pending(self):
+        """丢弃排队中的解码请求（例如快速滚动后），可见项会在重绘时重新请求"""
+        self.loader.cancel_pending()
+        self.pending.clear()
+
+    def thumbnail(self, image_path, is_used):
+        """返回已解码的缩略图；尚未解码时发起请求并返回 None"""
+        pixmap = self.thumbnails.get(image_path)
+        if pixmap is not None:
+            self.thumbnails.move_to_end(image_path)
+            return pixmap
+        if image_path not in self.pending:
+            self.pending.add(image_path)
+            # 未引用的图片可能在解码前就被移入备份文件夹，此时从备份位置读取
+            fallback_path = self.backup_path(image_path, is_used)
+            self.loader.request(image_path, fallback_path)
+        return None
+
+    def backup_path(self, image_path, is_used):
+        """未引用图片被移入 deleted_images 后的路径，无法推算时返回 None"""
+        if is_used or self.assets_folder is None:
+            return None
+        return backup_path_for(self.assets_folder, image_path)
+
+    def on_thumbnail_ready(self, image_path, image):
+        self.pending.discard(image_path)
+        row = self.rows.get(image_path)
+        if row is None:
+            return
+        self.thumbnails[image_path] = QPixmap() if image.isNull() else QPixmap.fromImage(image)
+        while len(self.thumbnails) > self.MAX_CACHED_THUMBNAILS:
+            self.thumbnails.popitem(last=False)
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [self.ThumbnailRole])
+
+
+class PreviewDelegate(QStyledItemDelegate):
+    """绘制单个预览项：缩略图、文件名、使用状态，以及未引用图片左上角的勾选框"""
+    PADDING = 10
+    TEXT_HEIGHT = 50
+    CHECK_SIZE = 20
+
+    def check_rect(self, rect):
+        return QRect(rect.left() + 4, rect.top() + 4, self.CHECK_SIZE, self.CHECK_SIZE)
+
+    def editorEvent(self, event, model, option, index):
+        """点击勾选框切换勾选（键盘空格由基类处理）"""
+        if event.type() in (QEvent.MouseButtonRelease, QEvent.MouseButtonDblClick):
+            if (index.flags() & Qt.ItemIsUserCheckable
+                    and self.check_rect(option.rect).contains(event.pos())):
+                if event.type() == QEvent.MouseButtonRelease:
+                    state = index.data(Qt.CheckStateRole)
+                    model.setData(index, Qt.Unchecked if state == Qt.Checked else Qt.Checked,
+                                  Qt.CheckStateRole)
+                return True
+            return False
+        return super().editorEvent(event, model, option, index)
+
+    def sizeHint(self, option, index):
+        side = THUMB_SIZE + 2 * self.PADDING
+        return QSize(side, side + self.TEXT_HEIGHT)
+
+    def paint(self, painter, option, index):
+        painter.save()
+        rect = option.rect
+        image_rect = QRect(rect.left() + self.PADDING, rect.top() + self.PADDING,
+                           THUMB_SIZE, THUMB_SIZE)
+
+        # 图片框
+        painter.setPen(QPen(QColor('#2196f3') if option.state & QStyle.State_Selected
+                            else QColor('#ddd'), 2))
+        painter.setBrush(QColor('white'))
+        painter.drawRoundedRect(image_rect.adjusted(-5, -5, 5, 5), 8, 8)
+
+        pixmap = index.data(PreviewModel.ThumbnailRole)
+        if pixmap is None:
+            painter.setPen(QColor('#888'))
+            painter.drawText(image_rect, Qt.AlignCenter, "加载中...")
+        elif pixmap.isNull():
+            painter.fillRect(image_rect, QColor(200, 200, 200))
+        else:
+            x = image_rect.left() + (THUMB_SIZE - pixmap.width()) // 2
+            y = image_rect.top() + (THUMB_SIZE - pixmap.height()) // 2
+            painter.drawPixmap(x, y, pixmap)
+
+        # 文件名
+        text_top = image_rect.bottom() + self.PADDING
+        name_rect = QRect(rect.left(), text_top, rect.width(), self.TEXT_HEIGHT // 2)
+        painter.setFont(QFont("微软雅黑", 12))
+        painter.setPen(QColor('#333'))
+        name = painter.fontMetrics().elidedText(index.data(Qt.DisplayRole),
+                                                Qt.ElideMiddle, rect.width() - 10)
+        painter.drawText(name_rect, Qt.AlignCenter, name)
+
+        # 状态
+        is_used = index.data(PreviewModel.UsedRole)
+        status_rect = QRect(rect.left(), text_top + self.TEXT_HEIGHT // 2,
+                            rect.width(), self.TEXT_HEIGHT // 2)
+        status_font = QFont("微软雅黑", 11)
+        status_font.setBold(True)
+        painter.setFont(status_font)
+        if index.data(PreviewModel.MovedRole):
+            painter.setPen(QColor('#888'))
+            status = "已移走"
+        else:
+            painter.setPen(QColor('green' if is_used else 'red'))
+            status = "已使用" if is_used else "未使用"
+        info = index.data(PreviewModel.InfoRole)
+        if info is not None:
+            details = [d for d in (format_dimensions(info), format_bytes(info.size)) if d]
+            status = ' · '.join([status] + details)
+        group = index.data(PreviewModel.GroupRole)
+        if group is not None:
+            status = f"相似组 {group} · {status}"
+        painter.drawText(status_rect, Qt.AlignCenter, status)
+
+        # 勾选框
+        state = index.data(Qt.CheckStateRole)
+        if state is not None:
+            check_option = QStyleOptionButton()
+            check_option.rect = self.check_rect(rect)
+            check_option.state = QStyle.State_Enabled | (
+                QStyle.State_On if state == Qt.Checked else QStyle.State_Off)
+            style = option.widget.style() if option.widget is not None else QApplication.style()
+            style.drawPrimitive(QStyle.PE_IndicatorCheckBox, check_option, painter, option.widget)
+        painter.restore()
+
+
+class Job:
+    """队列中的一个 Markdown 文件：状态、进度、分析结果和统计"""
+    STATE_LABELS = {
+        'queued': '排队中',
+        'analyzing': '分析中',
+        'analyzed': '待确认',
+        'move_queued': '等待清理',
+        'moving': '清理中',
+        'cleaned': '已清理',
+        'cancelled': '已取消',
+        'failed': '失败',
+    }
+    # 排队或运行中（可取消、重新加入时不重复创建）
+    ACTIVE_STATES = ('queued', 'analyzing', 'move_queued', 'moving')
+
+    def __init__(self, md_file):
+        self.md_file = md_file
+        self.name = os.path.basename(md_file)
+        self.reset()
+
+    def reset(self):
+        self.state = 'queued'
+        self.thread = None
+        self.result = None  # AnalysisResult
+        self.infos = {}  # 图片路径 -> ImageInfo
+        self.moved = set()  # 已移入 deleted_images 的图片路径
+        self.checked = None  # 切换到其他任务时保存的勾选集合
+        self.groups = None  # 相似分组（查找过之后才有）
+        self.images = []  # 等待清理的图片（相对路径）
+        self.progress = 0
+        self.progress_text = ''
+        self.stats = None  # 最近一次的 CleanStats 快照
+        self.unused_count = 0
+        self.moved_count = 0
+        self.cancelled = False  # 最近一次运行是否被取消
+
+    @property
+    def active(self):
+        return self.state in self.ACTIVE_STATES
+
+    def state_label(self):
+        return self.STATE_LABELS[self.state]
+
+    def summary(self):
+        if self.result is None:
+            return ''
+        parts = [f"未引用 {len(self.result.unused)} / 共 {self.result.total}"]
+        unused = {os.path.join(self.result.assets_folder, img) for img in self.result.unused}
+        reclaimable = sum(info.size for path, info in self.infos.items()
+                          if path in unused and path not in self.moved)
+        if reclaimable:
+            parts.append(f"可释放 {format_bytes(reclaimable)}")
+        if self.moved_count:
+            parts.append(f"已移动 {self.moved_count}")
+        return ' · '.join(parts)
+
+
+class JobQueue(QAbstractTableModel):
+    """多个 Markdown 文件的任务队列，同时也是任务表格的数据模型
+
+    行的顺序即优先级：有空闲名额时从上到下启动任务，已确认待清理的任务优先于待分析的任务
+    （用户正在等待结果）。同时运行的线程数不超过 max_workers。
+    各线程的信号连同所属任务转发出去，界面只需关心当前选中的任务。
+    """
+    COLUMNS = ('文件', '状态', '进度', '结果')
+    PROGRESS_COLUMN = 2
+    ProgressTextRole = Qt.UserRole + 1
+
+    log_signal = pyqtSignal(object, list)  # 任务, 日志行
+    progress_signal = pyqtSignal(object)  # 任务（进度已更新）
+    metrics_signal = pyqtSignal(object)  # 任务（统计已更新）
+    result_signal = pyqtSignal(object)  # 任务（分析结果已到达）
+    info_signal = pyqtSignal(object, list)  # 任务, [(图片路径, ImageInfo)]
+    moved_signal = pyqtSignal(object, list)  # 任务, 已移动的图片路径
+    skipped_signal = pyqtSignal(object, list)  # 任务, 因新被引用而跳过的图片路径
+    finished_signal = pyqtSignal(object, str, int)  # 任务, 'analysis' 或 'move', 数量（失败为 -1）
+
+    def __init__(self, max_workers=2, parent=None):
+        super().__init__(parent)
+        self.jobs = []
+        self.max_workers = max_workers
+        self.retired = set()  # 已发出完成信号、run() 尚未返回的线程，保留引用直到真正结束
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.jobs)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        job = self.jobs[index.row()]
+        column = index.column()
+        if role == Qt.ToolTipRole:
+            if column == 3 and job.stats is not None:
+                return job.stats.summary()
+            return job.md_file
+        if role == self.ProgressTextRole:
+            return job.progress_text
+        if role != Qt.DisplayRole:
+            return None
+        if column == 0:
+            return job.name
+        if column == 1:
+            return job.state_label()
+        if column == self.PROGRESS_COLUMN:
+            return job.progress
+        return job.summary()
+
+    def job_at(self, row):
+        return self.jobs[row] if 0 <= row < len(self.jobs) else None
+
+    def row_of(self, job):
+        return self.jobs.index(job)
+
+    def job_changed(self, job):
+        row = self.row_of(job)
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.COLUMNS) - 1))
+
+    def add(self, md_file):
+        """加入一个文件；已在排队或运行中时返回 None，已结束的任务重新排队分析"""
+        key = path_key(md_file)
+        for job in self.jobs:
+            if path_key(job.md_file) == key:
+                if job.active:
+                    return None
+                job.reset()
+                self.job_changed(job)
+                self.schedule()
+                return job
+        job = Job(md_file)
+        self.beginInsertRows(QModelIndex(), len(self.jobs), len(self.jobs))
+        self.jobs.append(job)
+        self.endInsertRows()
+        self.schedule()
+        return job
+
+    def move_job(self, job, target):
+        """调整任务在队列中的位置（优先级）"""
+        row = self.row_of(job)
+        target = max(0, min(target, len(self.jobs) - 1))
+        if target == row:
+            return
+        self.beginMoveRows(QModelIndex(), row, row, QModelIndex(),
+                           target + 1 if target > row else target)
+        self.jobs.insert(target, self.jobs.pop(row))
+        self.endMoveRows()
+
+    def set_max_workers(self, count):
+        self.max_workers = max(1, count)
+        self.schedule()
+
+    def running(self):
+        return [job for job in self.jobs if job.thread is not None]
+
+    def counts(self):
+        """{状态: 任务数}"""
+        counts = {}
+        for job in self.jobs:
+            counts[job.state] = counts.get(job.state, 0) + 1
+        return counts
+
+    def schedule(self):
+        """有空闲名额时按优先级启动任务"""
+        while len(self.running()) < self.max_workers:
+            job = (next((j for j in self.jobs if j.state == 'move_queued'), None)
+                   or next((j for j in self.jobs if j.state == 'queued'), None))
+            if job is None:
+                return
+            self.start(job)
+
+    def start(self, job):
+        if job.state == 'move_queued':
+            thread = MoveThread(job.md_file, job.images)
+            thread.moved_signal.connect(lambda paths: self.on_moved(job, paths))
+            thread.skipped_signal.connect(lambda paths: self.skipped_signal.emit(job, paths))
+            thread.finish_signal.connect(lambda count: self.on_finished(job, 'move', count))
+            job.state = 'moving'
+        else:
+            thread = AnalysisThread(job.md_file)
+            thread.result_signal.connect(lambda result: self.on_result(job, result))
+            thread.info_signal.connect(lambda infos: self.on_infos(job, infos))
+            thread.finish_signal.connect(lambda count: self.on_finished(job, 'analysis', count))
+            job.state = 'analyzing'
+        thread.update_signal.connect(lambda messages: self.log_signal.emit(job, messages))
+        thread.progress_signal.connect(lambda value, text: self.on_progress(job, value, text))
+        thread.metrics_signal.connect(lambda stats: self.on_metrics(job, stats))
+        # 启动前连接：完成信号排队送达时线程可能已经结束，之后再连接就收不到 finished 了
+        thread.finished.connect(lambda: self.retired.discard(thread))
+        job.thread = thread
+        job.progress = 0
+        job.progress_text = "准备中..."
+        self.job_changed(job)
+        thread.start()
+
+    def request_clean(self, job, images):
+        """把用户确认的图片交给队列清理"""
+        if job.active or job.result is None:
+            return
+        job.images = list(images)
+        job.state = 'move_queued'
+        self.job_changed(job)
+        self.schedule()
+
+    def cancel(self, job):
+        """排队中的任务直接取消，运行中的任务请求线程在下一个安全点停止"""
+        if job.thread is not None:
+            job.thread.requestInterruption()
+            job.progress_text = "正在取消..."
+        elif job.state == 'queued':
+            job.state = 'cancelled'
+        elif job.state == 'move_queued':
+            job.state = 'analyzed'
+        self.job_changed(job)
+
+    def on_progress(self, job, value, text):
+        job.progress = value
+        job.progress_text = text
+        self.job_changed(job)
+        self.progress_signal.emit(job)
+
+    def on_metrics(self, job, stats):
+        job.stats = stats
+        self.metrics_signal.emit(job)
+
+    def on_result(self, job, result):
+        job.result = result
+        self.job_changed(job)
+        self.result_signal.emit(job)
+
+    def on_infos(self, job, infos):
+        job.infos.update(infos)
+        self.info_signal.emit(job, infos)
+
+    def on_moved(self, job, paths):
+        job.moved.update(paths)
+        self.moved_signal.emit(job, paths)
+
+    def on_finished(self, job, kind, count):
+        thread = job.thread
+        job.thread = None
+        if not thread.isFinished():
+            self.retired.add(thread)
+        job.cancelled = thread.cancelled
+        if kind == 'analysis':
+            job.unused_count = count
+            if thread.cancelled:
+                job.state = 'cancelled' if job.result is None else 'analyzed'
+            else:
+                job.state = 'failed' if count < 0 else 'analyzed'
+        else:
+            job.moved_count += max(count, 0)
+            job.state = 'analyzed' if thread.cancelled or count < 0 else 'cleaned'
+        self.job_changed(job)
+        self.finished_signal.emit(job, kind, count)
+        self.schedule()
+
+    def shutdown(self):
+        """取消全部任务并等待线程结束（关闭窗口时调用）"""
+        for job in self.jobs:
+            if job.state in ('queued', 'move_queued'):
+                job.state = 'cancelled'
+        threads = [job.thread for job in self.jobs if job.thread is not None] + list(self.retired)
+        for thread in threads:
+            thread.requestInterruption()
+        for thread in threads:
+            thread.wait()
+
+
+class JobDelegate(QStyledItemDelegate):
+    """任务表格中进度列绘制为进度条，其余列按默认方式绘制"""
+
+    def paint(self, painter, option, index):
+        if index.column() != JobQueue.PROGRESS_COLUMN:
+            super().paint(painter, option, index)
+            return
+        bar = QStyleOptionProgressBar()
+        bar.rect = option.rect.adjusted(2, 3, -2, -3)
+        bar.minimum = 0
+        bar.maximum = 100
+        bar.progress = index.data() or 0
+        bar.text = f"{bar.progress}%"
+        bar.textVisible = True
+        style = option.widget.style() if option.widget is not None else QApplication.style()
+        style.drawControl(QStyle.CE_ProgressBar, bar, painter)
+
+    def helpEvent(self, event, view, option, index):
+        if index.column() == JobQueue.PROGRESS_COLUMN and index.data(JobQueue.ProgressTextRole):
+            QToolTip.showText(event.globalPos(), index.data(JobQueue.ProgressTextRole), view)
+            return True
+        return super().helpEvent(event, view, option, index)
+
+
+class MainWindow(QMainWindow):
+    """主窗口类"""
+    SELECT_TEXT = "选择Markdown文件并分析"
+    # 日志框只保留最近这么多行，完整日志写入 OperationLog 的文件
+    LOG_MAX_LINES = 2000
+    # 默认同时运行的任务数（分析主要是磁盘 I/O，过多反而互相争抢）
+    DEFAULT_CONCURRENCY = min(4, os.cpu_count() or 1)
+    # 排序下拉框各项对应的 PreviewModel 排序方式
+    SORT_MODES = ('default', 'size', 'similar')
+
+    def __init__(self):
+        super().__init__()
+        self.thumbnail_loader = ThumbnailLoader(self, cache=ThumbnailCache())
+        self.preview_model = PreviewModel(self.thumbnail_loader, self)
+        self.operation_log = OperationLog()
+        self.job_queue = JobQueue(self.DEFAULT_CONCURRENCY, self)
+        self.current_job = None  # 预览区正在展示的任务
+        self.current_md_file = None
+        self.analysis = None  # 当前任务的 AnalysisResult
+        self.similar_thread = None  # 正在计算相似分组的线程
+        self.similar_threads = set()  # 包括已取消、run() 尚未返回的线程，保留引用直到真正结束
+        self.init_ui()
+        self.job_queue.log_signal.connect(self.on_job_log)
+        self.job_queue.progress_signal.connect(self.on_job_progress)
+        self.job_queue.metrics_signal.connect(self.on_job_metrics)
+        self.job_queue.result_signal.connect(self.on_job_result)
+        self.job_queue.info_signal.connect(self.on_job_infos)
+        self.job_queue.moved_signal.connect(self.on_job_moved)
+        self.job_queue.skipped_signal.connect(self.on_job_skipped)
+        self.job_queue.finished_signal.connect(self.on_job_finished)
+        self.setAcceptDrops(True)
+
+    def init_ui(self):
+        self.setWindowTitle("Typora清理未引用图片")
+        self.setGeometry(300, 300, 1200, 750)
+
+        central_widget = QWidget()
+        self.setCentralWidget(central_widget)
+        main_layout = QVBoxLayout(central_widget)
+        main_layout.setContentsMargins(15, 15, 15, 15)
+
+        # 顶部信息栏优化
+        top_bar = QWidget()
+        top_bar.setStyleSheet("background-color: #e9ecef; padding: 12px; border-radius: 8px; margin-bottom: 15px;")
+        top_bar_layout = QHBoxLayout(top_bar)
+
+        # 文件路径显示优化（相对路径）
+        self.file_path_label = QLabel("未选择文件")
+        self.file_path_label.setStyleSheet("font-weight: bold; font-size: 13px; color: #333;")
+        self.file_path_label.setWordWrap(True)
+        self.file_path_label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Preferred)
+
+        # 打开文件夹按钮优化（更醒目）
+        self.open_assets_btn = QPushButton("打开.assets文件夹")
+        self.open_assets_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #ff6b6b;
+                color: white;
+                border-radius: 5px;
+                padding: 8px 16px;
+                font-size: 13px;
+            }
+            QPushButton:hover {
+                background-color: #ff4e4e;
+            }
+        """)
+        self.open_assets_btn.setEnabled(False)
+        self.open_assets_btn.clicked.connect(self.open_assets_folder)
+
+        top_bar_layout.addWidget(self.file_path_label)
+        top_bar_layout.addWidget(self.open_assets_btn, 0, Qt.AlignRight)
+        top_bar_layout.setSpacing(15)
+
+        main_layout.addWidget(top_bar)
+
+        # 分割器 - 左侧操作区，右侧预览区
+        splitter = QSplitter(Qt.Horizontal)
+        splitter.setSizes([382, 618])
+
+        # 左侧操作区优化
+        left_widget = QWidget()
+        left_layout = QVBoxLayout(left_widget)
+        left_layout.setContentsMargins(0, 0, 0, 0)
+        left_layout.setSpacing(18)
+
+        # 标题区域
+        title_label = QLabel("Typora未引用图片清理工具")
+        title_font = QFont("微软雅黑", 20, QFont.Bold)
+        title_label.setFont(title_font)
+        title_label.setAlignment(Qt.AlignCenter)
+        left_layout.addWidget(title_label)
+
+        # 设置描述标签为超链接
+        desc_label = QLabel('<a href="https://gitee.com/qiapicoco/typora-assets-image-cleaner">此工具可帮助您清理Typora Markdown文件对应的.assets文件夹中未被引用的图片</a>')
+        desc_label.setOpenExternalLinks(True)  # 允许点击链接打开外部浏览器
+        desc_font = QFont("微软雅黑", 12)
+        desc_label.setFont(desc_font)
+        desc_label.setAlignment(Qt.AlignCenter)
+        desc_label.setWordWrap(True)
+        left_layout.addWidget(desc_label)
+
+        # 按钮区域
+        button_layout = QHBoxLayout()
+        button_layout.setAlignment(Qt.AlignCenter)
+        button_layout.setContentsMargins(0, 15, 0, 0)
+
+        self.select_button = QPushButton(self.SELECT_TEXT)
+        self.select_button.setFont(QFont("微软雅黑", 14))
+        self.select_button.setStyleSheet("""
+            QPushButton {
+                background-color: #00c6a7;
+                color: white;
+                border-radius: 6px;
+                padding: 12px 28px;
+                font-size: 14px;
+            }
+            QPushButton:hover {
+                background-color: #00a38d;
+            }
+        """)
+        self.select_button.setMinimumHeight(50)
+        self.select_button.setToolTip("可多选，也可以把 .md 文件或文件夹拖入窗口")
+        self.select_button.clicked.connect(self.select_and_clean)
+        button_layout.addWidget(self.select_button)
+
+        self.folder_button = QPushButton("添加文件夹")
+        self.folder_button.setFont(QFont("微软雅黑", 12))
+        self.folder_button.setMinimumHeight(50)
+        self.folder_button.clicked.connect(self.select_folder)
+        button_layout.addWidget(self.folder_button)
+
+        left_layout.addLayout(button_layout)
+
+        # 任务队列：每个文件一行，行的顺序即优先级
+        self.job_view = QTableView()
+        self.job_view.setModel(self.job_queue)
+        self.job_view.setItemDelegate(JobDelegate(self.job_view))
+        self.job_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.job_view.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.job_view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.job_view.verticalHeader().setVisible(False)
+        self.job_view.setMinimumHeight(120)
+        header = self.job_view.horizontalHeader()
+        header.setSectionResizeMode(0, QHeaderView.Stretch)
+        header.setSectionResizeMode(1, QHeaderView.ResizeToContents)
+        header.resizeSection(JobQueue.PROGRESS_COLUMN, 110)
+        header.setSectionResizeMode(3, QHeaderView.ResizeToContents)
+        self.job_view.selectionModel().currentRowChanged.connect(self.on_current_row_changed)
+        left_layout.addWidget(self.job_view, 1)
+
+        queue_bar = QHBoxLayout()
+        self.queue_label = QLabel("")
+        self.queue_label.setFont(QFont("微软雅黑", 10))
+        self.queue_label.setStyleSheet("color: #666;")
+        queue_bar.addWidget(self.queue_label)
+        queue_bar.addStretch()
+        queue_bar.addWidget(QLabel("并发:"))
+        self.concurrency_spin = QSpinBox()
+        self.concurrency_spin.setRange(1, 16)
+        self.concurrency_spin.setValue(self.job_queue.max_workers)
+        self.concurrency_spin.setToolTip("同时运行的任务数")
+        self.concurrency_spin.valueChanged.connect(self.job_queue.set_max_workers)
+        queue_bar.addWidget(self.concurrency_spin)
+        for text, slot in (("置顶", lambda: self.move_selected_job('top')),
+                           ("上移", lambda: self.move_selected_job(-1)),
+                           ("下移", lambda: self.move_selected_job(1)),
+                           ("取消", self.cancel_selected_jobs)):
+            button = QPushButton(text)
+            button.clicked.connect(slot)
+            queue_bar.addWidget(button)
+        left_layout.addLayout(queue_bar)
+        self.update_queue_status()
+
+        # 进度条区域优化
+        progress_layout = QHBoxLayout()
+        progress_layout.setSpacing(10)
+
+        progress_label = QLabel("进度:")
+        progress_label.setFont(QFont("微软雅黑", 12))
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setTextVisible(True)
+        self.progress_bar.setStyleSheet("""
+            QProgressBar {
+                border: 1px solid #ced4da;
+                border-radius: 4px;
+                height: 20px;
+                font-size: 12px;
+            }
+            QProgressBar::chunk {
+                background-color: #2196f3;
+                width: 5px;
+            }
+        """)
+
+        self.progress_text = QLabel("就绪")
+        self.progress_text.setFont(QFont("微软雅黑", 12))
+
+        progress_layout.addWidget(progress_label)
+        progress_layout.addWidget(self.progress_bar, 1)
+        progress_layout.addWidget(self.progress_text)
+
+        left_layout.addLayout(progress_layout)
+
+        # 日志区域优化
+        result_group = QGroupBox("操作日志")
+        result_group.setFont(QFont("微软雅黑", 12, QFont.Bold))
+        result_group.setMinimumHeight(250)
+
+        # 统一所有QGroupBox的样式设置
+        group_box_style = """
+            QGroupBox {
+                border: 1px solid #dee2e6;
+                border-radius: 6px;
+                margin-top: 0.7em;
+                padding-top: 0.5em;
+            }
+            QGroupBox::title {
+                subcontrol-origin: margin;
+                left: 10px;
+                padding: 0 3px 0 3px;
+                background-color: transparent;
+            }
+        """
+
+        result_group.setStyleSheet(group_box_style)
+
+        self.result_text = QPlainTextEdit()
+        self.result_text.setFont(QFont("微软雅黑", 13))
+        self.result_text.setReadOnly(True)
+        self.result_text.setMaximumBlockCount(self.LOG_MAX_LINES)
+        self.result_text.setStyleSheet("""
+            QPlainTextEdit {
+                border: 1px solid #dee2e6;
+                border-radius: 6px;
+                padding: 12px;
+                background-color: #f8f9fa;
+                font-size: 13px;
+            }
+        """)
+        result_layout = QVBoxLayout(result_group)
+        result_layout.addWidget(self.result_text)
+        if self.operation_log.path is not None:
+            log_file_button = QPushButton("打开完整日志")
+            log_file_button.setToolTip(self.operation_log.path)
+            log_file_button.clicked.connect(self.open_log_file)
+            result_layout.addWidget(log_file_button, 0, Qt.AlignRight)
+
+        left_layout.addWidget(result_group)
+
+        # 右侧预览区优化
+        right_widget = QWidget()
+        right_layout = QVBoxLayout(right_widget)
+        right_layout.setContentsMargins(0, 0, 0, 0)
+
+        preview_group = QGroupBox("图片预览")
+        preview_group.setFont(QFont("微软雅黑", 12, QFont.Bold))
+        preview_group.setMinimumHeight(500)
+
+        # 使用统一的QGroupBox样式
+        preview_group.setStyleSheet(group_box_style)
+
+        preview_layout = QVBoxLayout(preview_group)
+        preview_layout.setContentsMargins(0, 0, 0, 0)
+
+        # 勾选操作栏：只清理勾选的未引用图片
+        selection_bar = QHBoxLayout()
+        selection_bar.setContentsMargins(10, 5, 10, 0)
+        self.selection_label = QLabel("已选 0 张")
+        self.selection_label.setFont(QFont("微软雅黑", 11))
+        self.sort_combo = QComboBox()
+        self.sort_combo.addItems(["默认顺序", "按大小（大→小）", "相似分组"])
+        self.sort_combo.currentIndexChanged.connect(self.on_sort_changed)
+        self.check_all_btn = QPushButton("全选")
+        self.check_all_btn.clicked.connect(lambda: self.preview_model.set_all_checked(True))
+        self.check_none_btn = QPushButton("全不选")
+        self.check_none_btn.clicked.connect(lambda: self.preview_model.set_all_checked(False))
+        self.clean_button = QPushButton("清理选中")
+        self.clean_button.setFont(QFont("微软雅黑", 12))
+        self.clean_button.setStyleSheet("""
+            QPushButton {
+                background-color: #ff6b6b;
+                color: white;
+                border-radius: 5px;
+                padding: 6px 16px;
+            }
+            QPushButton:hover {
+                background-color: #ff4e4e;
+            }
+            QPushButton:disabled {
+                background-color: #f3b4b4;
+            }
+        """)
+        self.clean_button.clicked.connect(self.clean_selected)
+        selection_bar.addWidget(self.selection_label)
+        selection_bar.addStretch()
+        selection_bar.addWidget(self.sort_combo)
+        selection_bar.addWidget(self.check_all_btn)
+        selection_bar.addWidget(self.check_none_btn)
+        selection_bar.addWidget(self.clean_button)
+        preview_layout.addLayout(selection_bar)
+        self.preview_model.checked_changed.connect(self.update_selection)
+        self.set_selection_enabled(False)
+
+        # 图片预览：虚拟化列表视图，只绘制可见的缩略图
+        self.preview_view = QListView()
+        self.preview_view.setViewMode(QListView.IconMode)
+        self.preview_view.setResizeMode(QListView.Adjust)
+        self.preview_view.setMovement(QListView.Static)
+        self.preview_view.setUniformItemSizes(True)
+        self.preview_view.setLayoutMode(QListView.Batched)
+        self.preview_view.setBatchSize(200)
+        self.preview_view.setSpacing(12)
+        self.preview_view.setSelectionMode(QListView.ExtendedSelection)
+        self.preview_view.setVerticalScrollMode(QListView.ScrollPerPixel)
+        self.preview_view.verticalScrollBar().setSingleStep(40)
+        self.preview_view.setStyleSheet("border: none;")
+        self.preview_view.setModel(self.preview_model)
+        self.preview_view.setItemDelegate(PreviewDelegate(self.preview_view))
+        self.preview_view.doubleClicked.connect(self.open_preview_image)
+        # 滚动后丢弃已离开视口的排队请求，可见项在重绘时会重新请求
+        self.preview_view.verticalScrollBar().valueChanged.connect(
+            self.preview_model.cancel_pending)
+        preview_layout.addWidget(self.preview_view)
+
+        right_layout.addWidget(preview_group)
+
+        splitter.addWidget(left_widget)
+        splitter.addWidget(right_widget)
+        main_layout.addWidget(splitter, 1)
+        splitter.setSizes([577, 423])
+
+        # 新增统计信息栏 - 移到底部
+        stats_bar = QWidget()
+        stats_bar.setStyleSheet("background-color: #f8f9fa; padding: 10px; border-radius: 6px; margin-top: 15px;")
+        stats_layout = QHBoxLayout(stats_bar)
+        stats_layout.setContentsMargins(10, 5, 10, 5)
+
+        self.stats_label = QLabel("图片统计: 未引用 0 张，已引用 0 张")
+        self.stats_label.setFont(QFont("微软雅黑", 13))
+        self.stats_label.setStyleSheet("font-weight: bold; color: #555;")
+
+        stats_layout.addWidget(self.stats_label)
+        stats_layout.addStretch()
+
+        # 各阶段耗时与字节数，鼠标悬停显示完整 JSON
+        self.metrics_label = QLabel("")
+        self.metrics_label.setFont(QFont("微软雅黑", 10))
+        self.metrics_label.setStyleSheet("color: #888;")
+        stats_layout.addWidget(self.metrics_label)
+        main_layout.addWidget(stats_bar)
+
+        # 状态栏
+        self.statusBar().setStyleSheet("font-size: 12px;")
+
+        # 设置应用样式
+        self.setStyleSheet("""
+            QMainWindow { background-color: #ffffff; }
+            QGroupBox { 
+                border: 1px solid #dee2e6; 
+                border-radius: 6px; 
+                margin-top: 0.7em;
+                padding-top: 0.5em;
+            }
+            QGroupBox::title {
+                subcontrol-origin: margin;
+                left: 10px;
+                padding: 0 3px 0 3px;
+                background-color: transparent;
+            }
+            QPlainTextEdit {
+                background-color: #f8f9fa; 
+                color: #333;
+                border: 1px solid #dee2e6;
+            }
+            QPushButton {
+                border: 1px solid #ced4da;
+                border-radius: 4px;
+                padding: 5px;
+            }
+            QPushButton:hover {
+                background-color: #e9ecef;
+            }
+        """)
+
+    def select_and_clean(self):
+        """选择一个或多个文件加入队列（清理在用户确认后由 clean_selected 执行）"""
+        md_files, _ = QFileDialog.getOpenFileNames(
+            self, "选择Markdown文件", "", "Markdown文件 (*.md)"
+        )
+        self.add_paths(md_files)
+
+    def select_folder(self):
+        """选择文件夹，把其中带 .assets 文件夹的 Markdown 文件全部加入队列"""
+        folder = QFileDialog.getExistingDirectory(self, "选择笔记文件夹")
+        if folder:
+            self.add_paths([folder])
+
+    def add_paths(self, paths):
+        """把文件或文件夹加入队列；文件夹只加入有对应 .assets 文件夹的 Markdown 文件"""
+        md_files = []
+        for path in paths:
+            if os.path.isdir(path):
+                md_files.extend(md for md in iter_markdown_files(path)
+                                if os.path.isdir(assets_folder_for(md)))
+            else:
+                md_files.append(path)
+        added = [job for job in map(self.analyze_file, md_files) if job is not None]
+        if len(md_files) > 1 or not added:
+            self.statusBar().showMessage(f"已加入 {len(added)} 个文件"
+                                         + (f"，跳过 {len(md_files) - len(added)} 个" if len(added) < len(md_files) else ""))
+        return added
+
+    def analyze_file(self, md_file):
+        """把一个 Markdown 文件加入分析队列，队列中还没有选中的任务时选中它
+
+        命令行传入文件时跳过选择对话框直接调用。文件不存在或已在队列中运行时返回 None。
+        """
+        md_file = os.path.abspath(md_file)
+        if not os.path.isfile(md_file):
+            self.statusBar().showMessage(f"文件不存在: {md_file}")
+            if len(self.job_queue.jobs) == 0:
+                QMessageBox.warning(self, "文件不存在", f"Markdown文件不存在: {md_file}")
+            return None
+        job = self.job_queue.add(md_file)
+        if job is not None and (self.current_job is None or self.current_job is job):
+            self.job_view.selectRow(self.job_queue.row_of(job))
+            self.set_current_job(job)
+        self.update_queue_status()
+        return job
+
+    def dragEnterEvent(self, event):
+        if event.mimeData().hasUrls() and any(
+                url.isLocalFile() and (url.toLocalFile().lower().endswith('.md')
+                                       or os.path.isdir(url.toLocalFile()))
+                for url in event.mimeData().urls()):
+            event.acceptProposedAction()
+
+    def dropEvent(self, event):
+        """拖入的 .md 文件或文件夹加入队列"""
+        self.add_paths([url.toLocalFile() for url in event.mimeData().urls() if url.isLocalFile()])
+        event.acceptProposedAction()
+
+    def selected_jobs(self):
+        rows = sorted({index.row() for index in self.job_view.selectionModel().selectedRows()})
+        return [self.job_queue.jobs[row] for row in rows]
+
+    def on_current_row_changed(self, current, previous):
+        job = self.job_queue.job_at(current.row())
+        if job is not None:
+            self.set_current_job(job)
+
+    def set_current_job(self, job):
+        """在右侧预览区和底部统计栏展示 job，保存上一个任务的勾选"""
+        if job is self.current_job and self.analysis is job.result:
+            return
+        previous = self.current_job
+        if previous is not None and previous.result is not None and previous is not job:
+            previous.checked = set(self.preview_model.checked)
+        self.current_job = job
+        self.analysis = None
+        self.clear_previews()
+        self.metrics_label.setText("")
+        self.metrics_label.setToolTip("")
+        self.current_md_file = job.md_file
+        self.current_assets_folder = assets_folder_for(job.md_file)
+        self.preview_model.assets_folder = self.current_assets_folder
+
+        # 显示文件路径
+        current_dir = QDir.currentPath()
+        try:
+            # 尝试获取相对路径
+            relative_path = QDir.toNativeSeparators(os.path.relpath(job.md_file, current_dir))
+            self.file_path_label.setText(f"当前文件: {relative_path}")
+        except ValueError:
+            # 如果路径不在同一个驱动器上，则显示绝对路径
+            absolute_path = QDir.toNativeSeparators(job.md_file)
+            self.file_path_label.setText(f"当前文件: {absolute_path}")
+        self.open_assets_btn.setEnabled(os.path.exists(self.current_assets_folder))
+
+        if job.result is not None:
+            self.show_analysis(job.result)
+        else:
+            self.stats_label.setText("图片统计: 未引用 0 张，已引用 0 张")
+        if job.stats is not None:
+            self.update_metrics(job.stats)
+        self.update_progress(job.progress, job.progress_text or job.state_label())
+        self.set_selection_enabled(self.can_clean(job))
+        if self.preview_model.sort_mode == 'similar':
+            self.find_similar(job)
+
+    def can_clean(self, job):
+        return job is not None and not job.active and job.result is not None \
+            and bool(job.result.unused)
+
+    def show_analysis(self, result):
+        """展示当前任务的分析结果，缩略图在滚动到时按需解码"""
+        job = self.current_job
+        self.analysis = result
+        self.preview_model.set_result(result, job.infos, job.moved, job.checked, job.groups)
+        self.update_stats(len(result.unused), len(result.used))
+
+    def on_job_log(self, job, messages):
+        """多个任务的日志交错出现，队列中不止一个任务时每行加上文件名"""
+        if len(self.job_queue.jobs) > 1:
+            prefix = f"[{job.name}] "
+            messages = [''.join(prefix + line if line.strip() else line
+                                for line in message.splitlines(True))
+                        for message in messages]
+        self.update_log(messages)
+
+    def on_job_progress(self, job):
+        if job is self.current_job:
+            self.update_progress(job.progress, job.progress_text)
+
+    def on_job_metrics(self, job):
+        if job is self.current_job:
+            self.update_metrics(job.stats)
+
+    def on_job_result(self, job):
+        if job is self.current_job:
+            self.show_analysis(job.result)
+
+    def on_job_infos(self, job, infos):
+        if job is self.current_job:
+            self.preview_model.update_infos(infos)
+
+    def on_job_moved(self, job, paths):
+        if job is self.current_job:
+            self.preview_model.mark_moved(paths)
+
+    def on_job_skipped(self, job, paths):
+        if job is self.current_job:
+            self.preview_model.set_checked(paths, False)
+        elif job.checked is not None:
+            job.checked.difference_update(paths)
+
+    def on_job_finished(self, job, kind, count):
+        self.update_queue_status()
+        if job is not self.current_job:
+            return
+        if kind == 'analysis':
+            self.analysis_finished(job, count)
+        else:
+            self.cleaning_finished(job, count)
+
+    def on_sort_changed(self, i):
+        mode = self.SORT_MODES[i]
+        if mode == 'similar' and not similar_available():
+            QMessageBox.information(self, "相似分组",
+                                    "相似分组需要 numpy 与 Pillow：pip install numpy pillow")
+            self.sort_combo.setCurrentIndex(0)
+            return
+        self.preview_model.set_sort_mode(mode)
+        if mode == 'similar':
+            self.find_similar(self.current_job)
+
+    def find_similar(self, job):
+        """为任务计算相似分组（每个任务只算一次，结果保存在 job.groups）
+
+        切换到其他任务时请求之前的线程停止（不在界面线程中等待），结果会被忽略。
+        """
+        if job is None or job.result is None or job.groups is not None or job.active:
+            return
+        thread = self.similar_thread
+        if thread is not None:
+            if thread.job is job:
+                return
+            thread.requestInterruption()
+        paths = [path for path, _ in job.result.preview_items()]
+        thread = SimilarThread(job.md_file, paths)
+        thread.job = job
+        thread.update_signal.connect(lambda messages: self.on_job_log(job, messages))
+        thread.progress_signal.connect(
+            lambda value, text: self.on_similar_progress(job, value, text))
+        thread.groups_signal.connect(lambda groups: self.on_similar_groups(job, groups))
+        thread.finish_signal.connect(lambda count: self.on_similar_finished(thread, count))
+        thread.finished.connect(lambda: self.similar_threads.discard(thread))
+        self.similar_thread = thread
+        self.similar_threads.add(thread)
+        self.statusBar().showMessage(f"{job.name}: 正在查找相似图片...")
+        thread.start()
+
+    def on_similar_progress(self, job, value, text):
+        if job is self.current_job:
+            self.update_progress(value, text)
+
+    def on_similar_groups(self, job, groups):
+        job.groups = groups
+        if job is self.current_job:
+            self.preview_model.set_groups(groups)
+
+    def on_similar_finished(self, thread, count):
+        if thread is self.similar_thread:
+            self.similar_thread = None
+        job = thread.job
+        if job is not self.current_job or thread.cancelled:
+            return
+        if count < 0:
+            self.statusBar().showMessage(f"{job.name}: 查找相似图片时发生错误")
+        else:
+            self.statusBar().showMessage(f"{job.name}: 找到 {count} 组相似图片")
+        self.preview_view.scrollToTop()
+
+    def analysis_finished(self, job, unused_count):
+        if self.preview_model.sort_mode == 'size':
+            self.preview_model.apply_sort()  # 图片大小此时已全部读到
+        if job.cancelled:
+            self.statusBar().showMessage(f"{job.name}: 分析已取消")
+        elif unused_count < 0:
+            self.statusBar().showMessage(f"{job.name}: 分析过程中发生错误")
+            QMessageBox.critical(self, "分析失败", "分析过程中发生错误，请查看日志获取详细信息。")
+        elif unused_count == 0:
+            self.statusBar().showMessage(f"{job.name}: 没有需要清理的图片")
+        else:
+            self.statusBar().showMessage(
+                f"{job.name}: 找到 {unused_count} 张未引用图片，请确认后点击“清理选中”")
+        self.set_selection_enabled(self.can_clean(job))
+        if self.preview_model.sort_mode == 'similar':
+            self.find_similar(job)
+
+    def set_selection_enabled(self, enabled):
+        for widget in (self.check_all_btn, self.check_none_btn):
+            widget.setEnabled(enabled)
+        self.clean_button.setEnabled(enabled and bool(self.preview_model.checked))
+
+    def update_selection(self, count):
+        selected = f"已选 {count} 张"
+        if count:
+            selected += f"，可释放 {format_bytes(self.preview_model.checked_bytes())}"
+        self.selection_label.setText(selected)
+        self.clean_button.setText(f"清理选中 ({count})" if count else "清理选中")
+        self.clean_button.setEnabled(self.can_clean(self.current_job) and count > 0)
+
+    def clean_selected(self):
+        """把当前任务中勾选的未引用图片交给队列移入备份文件夹（可取消）"""
+        job = self.current_job
+        if not self.can_clean(job):
+            return
+        images = [os.path.relpath(path, job.result.assets_folder)
+                  for path in self.preview_model.checked_images()]
+        if not images:
+            return
+        job.checked = None
+        self.set_selection_enabled(False)
+        self.statusBar().showMessage(f"{job.name}: 正在清理 {len(images)} 张图片")
+        self.job_queue.request_clean(job, images)
+        self.update_queue_status()
+
+    def cancel_selected_jobs(self):
+        for job in self.selected_jobs():
+            self.job_queue.cancel(job)
+        self.update_queue_status()
+
+    def move_selected_job(self, where):
+        """调整选中任务的优先级：'top' 置顶，-1 上移，1 下移"""
+        jobs = self.selected_jobs()
+        if not jobs:
+            return
+        job = jobs[0]
+        row = self.job_queue.row_of(job)
+        self.job_queue.move_job(job, 0 if where == 'top' else row + where)
+        self.job_view.selectRow(self.job_queue.row_of(job))
+
+    def update_queue_status(self):
+        counts = self.job_queue.counts()
+        running = counts.get('analyzing', 0) + counts.get('moving', 0)
+        waiting = counts.get('queued', 0) + counts.get('move_queued', 0)
+        self.queue_label.setText(f"运行 {running} · 排队 {waiting} · 待确认 {counts.get('analyzed', 0)}"
+                                 f" · 已清理 {counts.get('cleaned', 0)}")
+
+    def update_log(self, messages):
+        """追加一批日志：日志框只保留最近 LOG_MAX_LINES 行，完整内容在后台写入日志文件"""
+        self.operation_log.write(messages)
+        self.result_text.appendPlainText(''.join(messages).strip('\n'))
+
+    def open_log_file(self):
+        """用系统默认程序打开完整日志文件"""
+        if self.operation_log.path and os.path.exists(self.operation_log.path):
+            QDesktopServices.openUrl(QUrl.fromLocalFile(self.operation_log.path))
+        else:
+            QMessageBox.information(self, "日志", "还没有写入任何日志")
+
+    def update_progress(self, value, text):
+        """更新进度条和进度文本"""
+        self.progress_bar.setValue(value)
+        self.progress_text.setText(text)
+
+    def cleaning_finished(self, job, deleted_count):
+        """当前任务清理完成后的处理"""
+        self.set_selection_enabled(self.can_clean(job))
+        if job.cancelled:
+            self.statusBar().showMessage(f"{job.name}: 已取消，共移动 {deleted_count} 张图片")
+        elif deleted_count >= 0:
+            self.statusBar().showMessage(f"{job.name}: 清理完成，共处理 {deleted_count} 张图片")
+            QMessageBox.information(self, "清理完成",
+                                    f"清理完成！\n共移动 {deleted_count} 张未引用图片到备份文件夹。")
+        else:
+            self.statusBar().showMessage("清理过程中发生错误")
+            QMessageBox.critical(self, "清理失败", "清理过程中发生错误，请查看日志获取详细信息。")
+
+    def update_stats(self, unused_count, used_count):
+        """更新统计信息"""
+        self.stats_label.setText(f"图片统计: 未引用 {unused_count} 张，已引用 {used_count} 张")
+
+    def update_metrics(self, stats):
+        """更新各阶段耗时"""
+        self.metrics_label.setText(stats.summary())
+        self.metrics_label.setToolTip(stats.to_json())
+
+    def clear_previews(self):
+        """清除所有图片预览"""
+        self.preview_model.clear()
+
+    def open_preview_image(self, index):
+        """双击预览项 - 使用系统默认程序打开图片"""
+        image_path = index.data(PreviewModel.PathRole)
+        backup_path = self.preview_model.backup_path(image_path, index.data(PreviewModel.UsedRole))
+        if not os.path.exists(image_path) and backup_path is not None:
+            image_path = backup_path
+        if os.path.exists(image_path):
+            try:
+                if sys.platform.startswith('win'):
+                    os.startfile(image_path)
+                elif sys.platform.startswith('darwin'):  # macOS
+                    os.system(f'open "{image_path}"')
+                else:  # Linux
+                    os.system(f'xdg-open "{image_path}"')
+            except Exception as e:
+                QMessageBox.critical(self, "错误", f"无法打开图片: {str(e)}")
+        else:
+            QMessageBox.warning(self, "文件不存在", f"图片文件不存在: {image_path}")
+
+    def open_assets_folder(self):
+        """打开.assets文件夹"""
+        if hasattr(self, 'current_assets_folder') and os.path.exists(self.current_assets_folder):
+            if sys.platform.startswith('win'):
+                os.startfile(self.current_assets_folder)
+            elif sys.platform.startswith('darwin'):
+                os.system(f'open "{self.current_assets_folder}"')
+            else:
+                os.system(f'xdg-open "{self.current_assets_folder}"')
+
+    def closeEvent(self, event):
+        """关闭窗口前取消全部任务（等到安全点）并停止后台缩略图解码"""
+        self.job_queue.shutdown()
+        threads = list(self.similar_threads)
+        for thread in threads:
+            thread.requestInterruption()
+        for thread in threads:
+            thread.wait()
+        self.thumbnail_loader.shutdown()
+        self.operation_log.close()
+        super().closeEvent(event)
+
+
+def main(paths=()):
+    """启动界面；传入 .md 文件或文件夹时不弹出选择对话框，窗口显示后立即加入队列开始分析"""
+    os.environ["QT_FONT_DPI"] = "96"
+    app = QApplication(sys.argv[:1])
+    font = QFont("微软雅黑", 11)
+    app.setFont(font)
+    window = MainWindow()
+    window.show()
+    if paths:
+        window.add_paths(paths)
+    return app.exec_()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
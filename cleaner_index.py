@@ -0,0 +1,196 @@
+"""持久化引用索引：按路径 + mtime + 大小缓存每个 Markdown 的引用与每个文件夹的图片列表"""
+import json
+import os
+import sqlite3
+
+INDEX_FILE_NAME = '.typora_cleaner.db'
+# 缓存内容格式或引用提取规则变化时递增，旧索引会被清空重建
+# （3：识别 <img src>、引用定义与尖括号目标，跳过围栏代码块；4：按 typora-root-url 解析 / 开头的目标；
+#   5：识别跨行的 <img> 标签以及缩进、列表项和引用块中的引用定义）
+INDEX_VERSION = 5
+# 其他连接正在写入时最多等待的秒数（界面中多个任务线程各自打开同一个索引）
+INDEX_BUSY_TIMEOUT = 10
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    refs TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS folders (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    images TEXT NOT NULL,
+    subdirs TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS optimized (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS phashes (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL
+);
+"""
+
+
+def file_key(path):
+    """返回用于失效判断的 (mtime_ns, size)，文件不存在时返回 None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class ReferenceIndex:
+    """基于 SQLite 的增量扫描索引
+
+    - documents：Markdown 文件 -> 引用的图片（规范化的绝对路径），按 (mtime, size) 失效
+    - folders：.assets 文件夹 -> 图片列表（相对路径），按文件夹及各子文件夹的 mtime 失效
+      （增删文件都会更新所在目录的 mtime）
+    - optimized：已经优化过（或无法再变小）的图片，按 (mtime, size) 失效
+    - phashes：图片的感知哈希（64 位无符号数超出 SQLite 整数范围，存为十六进制），按 (mtime, size) 失效
+
+    多个连接可以同时使用同一个索引：每次写入都是单独提交的短事务，不会长时间占住写锁。
+    读写出错（例如等待写锁超时）时按未命中处理、跳过写入，调用方退化为不用缓存的扫描。
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        folder = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(folder, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=INDEX_BUSY_TIMEOUT)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        version = self.conn.execute('PRAGMA user_version').fetchone()[0]
+        if version != INDEX_VERSION:
+            self.conn.executescript('DROP TABLE IF EXISTS documents; DROP TABLE IF EXISTS folders;')
+            self.conn.execute(f'PRAGMA user_version = {INDEX_VERSION}')
+        self.conn.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+
+    def commit(self):
+        self.conn.commit()
+
+    def _query(self, sql, params):
+        """返回第一行结果；出错时返回 None（按未命中处理）"""
+        try:
+            return self.conn.execute(sql, params).fetchone()
+        except sqlite3.Error:
+            return None
+
+    def _write(self, sql, rows):
+        """在一个短事务中写入并立即提交；出错时回滚并跳过（只是少缓存一次）"""
+        try:
+            with self.conn:
+                self.conn.executemany(sql, rows)
+        except sqlite3.Error:
+            pass
+
+    def get_references(self, md_file, key):
+        """key 与缓存一致时返回引用集合，否则返回 None"""
+        if key is None:
+            return None
+        row = self._query(
+            'SELECT mtime_ns, size, refs FROM documents WHERE path = ?',
+            (os.path.abspath(md_file),))
+        if row is None or (row[0], row[1]) != key:
+            return None
+        return set(json.loads(row[2]))
+
+    def put_references(self, md_file, key, refs):
+        if key is None:
+            return
+        self._write(
+            'INSERT OR REPLACE INTO documents (path, mtime_ns, size, refs) VALUES (?, ?, ?, ?)',
+            [(os.path.abspath(md_file), key[0], key[1], json.dumps(sorted(refs)))])
+
+    def get_listing(self, folder, key):
+        """文件夹及其子文件夹的 mtime 均未变化时返回缓存的图片列表，否则返回 None"""
+        if key is None:
+            return None
+        row = self._query(
+            'SELECT mtime_ns, images, subdirs FROM folders WHERE path = ?',
+            (os.path.abspath(folder),))
+        if row is None or row[0] != key[0]:
+            return None
+        for subdir, mtime_ns in json.loads(row[2]).items():
+            sub_key = file_key(os.path.join(folder, subdir))
+            if sub_key is None or sub_key[0] != mtime_ns:
+                return None
+        return json.loads(row[1])
+
+    def put_listing(self, folder, key, images, subdirs=()):
+        if key is None:
+            return
+        sub_keys = {}
+        for subdir in subdirs:
+            sub_key = file_key(os.path.join(folder, subdir))
+            if sub_key is None:
+                return
+            sub_keys[subdir] = sub_key[0]
+        self._write(
+            'INSERT OR REPLACE INTO folders (path, mtime_ns, images, subdirs) VALUES (?, ?, ?, ?)',
+            [(os.path.abspath(folder), key[0], json.dumps(sorted(images)), json.dumps(sub_keys))])
+
+    def is_optimized(self, image_path, key):
+        """图片自上次优化以来未变化时返回 True"""
+        if key is None:
+            return False
+        row = self._query(
+            'SELECT mtime_ns, size FROM optimized WHERE path = ?',
+            (os.path.abspath(image_path),))
+        return row is not None and (row[0], row[1]) == tuple(key)
+
+    def put_optimized(self, image_path, key):
+        if key is None:
+            return
+        self._write(
+            'INSERT OR REPLACE INTO optimized (path, mtime_ns, size) VALUES (?, ?, ?)',
+            [(os.path.abspath(image_path), key[0], key[1])])
+
+    def get_phash(self, image_path, key):
+        """图片未变化时返回缓存的感知哈希，否则返回 None"""
+        if key is None:
+            return None
+        row = self._query(
+            'SELECT mtime_ns, size, hash FROM phashes WHERE path = ?',
+            (os.path.abspath(image_path),))
+        if row is None or (row[0], row[1]) != tuple(key):
+            return None
+        return int(row[2], 16)
+
+    def put_phash(self, image_path, key, value):
+        if key is None or value is None:
+            return
+        self._write(
+            'INSERT OR REPLACE INTO phashes (path, mtime_ns, size, hash) VALUES (?, ?, ?, ?)',
+            [(os.path.abspath(image_path), key[0], key[1], f'{value:016x}')])
+
+    def prune(self, root, keep_documents):
+        """删除 root 下不在 keep_documents 中的 Markdown 记录（文件已被删除或移动）"""
+        prefix = os.path.join(os.path.abspath(root), '')
+        keep = {os.path.abspath(p) for p in keep_documents}
+        try:
+            paths = [path for (path,) in self.conn.execute('SELECT path FROM documents')]
+        except sqlite3.Error:
+            return 0
+        stale = [path for path in paths if path.startswith(prefix) and path not in keep]
+        self._write('DELETE FROM documents WHERE path = ?', [(p,) for p in stale])
+        return len(stale)
@@ -0,0 +1,167 @@
+"""移动日志：记录每次移入 deleted_images 的文件，用于撤销"""
+import json
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+JOURNAL_FILE_NAME = '.journal.jsonl'
+
+
+def new_run_id():
+    """生成本次清理的标识（时间 + 进程号 + 随机后缀），同一批移动共享一个标识
+
+    界面中多个清理任务可能在同一秒内开始，随机后缀保证它们的取消与撤销互不影响。
+    """
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def rename_or_move(src, dst):
+    """同一文件系统内用 os.rename（一次元数据操作），否则退回 shutil.move"""
+    try:
+        os.rename(src, dst)
+    except OSError:
+        if os.path.exists(dst) or not os.path.exists(src):
+            raise
+        shutil.move(src, dst)
+
+
+class MoveJournal:
+    """deleted_images 文件夹中的移动日志（JSON Lines）
+
+    每行记录一次移动：{"run": 标识, "src": 相对 .assets 的路径, "dst": 相对 deleted_images 的路径}。
+    日志先于移动写入并落盘，因此中途崩溃时日志里可能有尚未移动的条目，
+    撤销时会根据目标文件是否存在跳过这些条目。
+    """
+
+    def __init__(self, deleted_folder):
+        self.deleted_folder = deleted_folder
+        self.assets_folder = os.path.dirname(os.path.abspath(deleted_folder))
+        self.path = os.path.join(deleted_folder, JOURNAL_FILE_NAME)
+
+    def record(self, run_id, moves):
+        """追加一批 (src, dst) 移动记录并 fsync"""
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for src, dst in moves:
+                f.write(json.dumps({'run': run_id, 'src': src, 'dst': dst},
+                                   ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def load(self):
+        entries = []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # 崩溃时可能留下半行
+                    if isinstance(entry, dict) and {'run', 'src', 'dst'} <= entry.keys():
+                        entries.append(entry)
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def discard(self, run_id, moves):
+        """从日志中删除某次运行里没有执行的 (src, dst) 条目（例如中途取消后）"""
+        moves = set(moves)
+        entries = self.load()
+        remaining = [e for e in entries
+                     if e['run'] != run_id or (e['src'], e['dst']) not in moves]
+        if len(remaining) != len(entries):
+            self.rewrite(remaining)
+
+    def rewrite(self, entries):
+        """用剩余条目原子地替换日志，没有剩余条目时删除日志"""
+        if not entries:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+def find_journals(path):
+    """根据 Markdown 文件、.assets 文件夹、deleted_images 文件夹、日志文件或任意目录查找日志"""
+    from cleaner_core import DELETED_FOLDER_NAME, assets_folder_for
+
+    if os.path.isfile(path):
+        if path.lower().endswith('.md'):
+            path = assets_folder_for(path)
+        else:
+            return [MoveJournal(os.path.dirname(os.path.abspath(path)))]
+
+    journals = []
+    for dirpath, dirnames, filenames in os.walk(path):
+        if os.path.basename(dirpath) == DELETED_FOLDER_NAME:
+            dirnames[:] = []
+            if JOURNAL_FILE_NAME in filenames:
+                journals.append(MoveJournal(dirpath))
+    return journals
+
+
+def _restore_one(journal, entry):
+    """把一个文件从 deleted_images 移回原位置，返回 (状态, 说明)"""
+    src = os.path.join(journal.assets_folder, entry['src'])
+    dst = os.path.join(journal.deleted_folder, entry['dst'])
+    if not os.path.exists(dst):
+        return 'gone', f"备份中不存在（未移动或已恢复）: {entry['dst']}"
+    if os.path.exists(src):
+        return 'conflict', f"原位置已有同名文件，跳过: {entry['src']}"
+    try:
+        parent = os.path.dirname(src)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        rename_or_move(dst, src)
+        return 'restored', f"已恢复: {entry['src']}"
+    except Exception as e:
+        return 'failed', f"错误: 无法恢复 {entry['src']}: {str(e)}"
+
+
+def undo_moves(journals, all_runs=False, workers=8, log=None):
+    """并行撤销日志中的移动，默认只撤销每个日志中最近一次运行
+
+    返回 {'restored': n, 'skipped': n, 'failed': n}。
+    已恢复和备份中不存在的条目会从日志中删除，冲突和失败的条目保留以便重试。
+    """
+    tasks = []
+    loaded = []
+    for journal in journals:
+        entries = journal.load()
+        if not entries:
+            continue
+        loaded.append((journal, entries))
+        last_run = entries[-1]['run']
+        for entry in entries:
+            if all_runs or entry['run'] == last_run:
+                tasks.append((journal, entry))
+
+    counts = {'restored': 0, 'skipped': 0, 'failed': 0}
+    finished = {}  # id(entry) -> 是否从日志中删除
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = pool.map(lambda task: _restore_one(*task), tasks)
+        for (journal, entry), (status, message) in zip(tasks, results):
+            if log is not None:
+                log(message + '\n')
+            if status == 'restored':
+                counts['restored'] += 1
+            elif status == 'failed':
+                counts['failed'] += 1
+            else:
+                counts['skipped'] += 1
+            finished[id(entry)] = status in ('restored', 'gone')
+
+    for journal, entries in loaded:
+        remaining = [e for e in entries if not finished.get(id(e), False)]
+        if len(remaining) != len(entries):
+            journal.rewrite(remaining)
+    return counts
@@ -0,0 +1,63 @@
+"""操作日志：完整写入按大小轮转的磁盘文件，写入在后台线程中进行，不阻塞界面"""
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from cleaner_core import user_cache_dir
+
+LOG_FILE_NAME = 'cleaner.log'
+# 单个日志文件的大小上限（字节）与保留的旧文件数
+LOG_MAX_BYTES = 5 << 20
+LOG_BACKUP_COUNT = 5
+
+
+def default_log_path():
+    return os.path.join(user_cache_dir(), 'logs', LOG_FILE_NAME)
+
+
+class OperationLog:
+    """把界面日志流式写入磁盘
+
+    write() 只把消息放入队列（调用方线程中没有文件 I/O），QueueListener 的后台线程
+    负责格式化并写入 RotatingFileHandler。close() 会等队列写完再关闭文件。
+    打开日志文件失败时退化为不写文件，界面照常工作。
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_log_path()
+        self.logger = logging.getLogger(f'typora_assets_cleaner.{id(self)}')
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.listener = None
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            handler = RotatingFileHandler(self.path, maxBytes=LOG_MAX_BYTES,
+                                          backupCount=LOG_BACKUP_COUNT, encoding='utf-8',
+                                          delay=True)
+        except OSError:
+            self.path = None
+            return
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        records = queue.SimpleQueue()
+        self.logger.addHandler(QueueHandler(records))
+        self.listener = QueueListener(records, handler)
+        self.listener.start()
+
+    def write(self, messages):
+        """写入一批日志（每条可以带结尾换行，空行不写）"""
+        if self.listener is None:
+            return
+        for message in messages:
+            for line in message.strip('\n').splitlines():
+                if line.strip():
+                    self.logger.info(line)
+
+    def close(self):
+        if self.listener is None:
+            return
+        self.listener.stop()  # 处理完队列中剩余的记录
+        for handler in self.listener.handlers:
+            handler.close()
+        self.logger.handlers.clear()
+        self.listener = None
@@ -0,0 +1,196 @@
+"""图片元数据：只读取文件头得到格式与尺寸，不解码像素"""
+import os
+import re
+import struct
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# 读取文件头的线程数（每张图片只读几十字节，耗时主要在打开文件的往返上）
+META_WORKERS = 8
+# 文件开头读取的字节数，足够覆盖 PNG/GIF/WebP/BMP 的尺寸字段
+HEAD_SIZE = 32
+# SVG 根元素之前可能有 XML 声明、注释和 DOCTYPE
+SVG_HEAD_SIZE = 8192
+
+# width / height 在无法从文件头得到时为 None
+ImageInfo = namedtuple('ImageInfo', 'size format width height')
+
+_SVG_TAG = re.compile(rb'<svg\b[^>]*>', re.IGNORECASE)
+_SVG_ATTR = re.compile(rb'''\b(width|height|viewBox)\s*=\s*["']([^"']*)["']''')
+_SVG_LENGTH = re.compile(rb'^\s*([0-9.]+)\s*(px)?\s*$')
+# JPEG 中携带图像尺寸的帧头标记（SOF0~SOF15，除去 DHT/JPG/DAC）
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _png(f, head):
+    if head[12:16] == b'IHDR':
+        return struct.unpack('>II', head[16:24])
+    return None
+
+
+def _gif(f, head):
+    return struct.unpack('<HH', head[6:10])
+
+
+def _bmp(f, head):
+    header_size = struct.unpack('<I', head[14:18])[0]
+    if header_size == 12:  # OS/2 BITMAPCOREHEADER
+        return struct.unpack('<HH', head[18:22])
+    width, height = struct.unpack('<ii', head[18:26])
+    return width, abs(height)  # 高度为负表示自上而下存储
+
+
+def _webp(f, head):
+    chunk = head[12:16]
+    if chunk == b'VP8 ':
+        width, height = struct.unpack('<HH', head[26:30])
+        return width & 0x3fff, height & 0x3fff
+    if chunk == b'VP8L':
+        bits = struct.unpack('<I', head[21:25])[0]
+        return (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1
+    if chunk == b'VP8X' and len(head) >= 30:
+        width = int.from_bytes(head[24:27], 'little') + 1
+        height = int.from_bytes(head[27:30], 'little') + 1
+        return width, height
+    return None
+
+
+def _jpeg(f, head):
+    """逐个跳过段（EXIF 等可能有几十 KB），直到帧头"""
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        while byte and byte != b'\xff':
+            byte = f.read(1)
+        while byte == b'\xff':  # 标记前可以有填充的 0xFF
+            byte = f.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            continue  # 没有长度字段的标记
+        if marker == 0xD9:
+            return None
+        length = f.read(2)
+        if len(length) < 2:
+            return None
+        length = struct.unpack('>H', length)[0]
+        if marker in _JPEG_SOF:
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack('>HH', data[1:5])
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def _tiff(f, head):
+    endian = '<' if head[:2] == b'II' else '>'
+    f.seek(struct.unpack(endian + 'I', head[4:8])[0])
+    count = f.read(2)
+    if len(count) < 2:
+        return None
+    size = {}
+    for _ in range(struct.unpack(endian + 'H', count)[0]):
+        entry = f.read(12)
+        if len(entry) < 12:
+            break
+        tag, kind = struct.unpack(endian + 'HH', entry[:4])
+        if tag in (256, 257):  # ImageWidth / ImageLength
+            fmt = endian + ('H' if kind == 3 else 'I')
+            size[tag] = struct.unpack(fmt, entry[8:8 + struct.calcsize(fmt)])[0]
+            if len(size) == 2:
+                return size[256], size[257]
+    return None
+
+
+def _svg(f, head):
+    """根元素的 width/height（无单位或 px），否则取 viewBox 的宽高"""
+    f.seek(0)
+    match = _SVG_TAG.search(f.read(SVG_HEAD_SIZE))
+    if match is None:
+        return None
+    attrs = dict(_SVG_ATTR.findall(match.group(0)))
+    width = _SVG_LENGTH.match(attrs.get(b'width', b''))
+    height = _SVG_LENGTH.match(attrs.get(b'height', b''))
+    if width and height:
+        return round(float(width.group(1))), round(float(height.group(1)))
+    box = attrs.get(b'viewBox', b'').replace(b',', b' ').split()
+    if len(box) == 4:
+        return round(float(box[2])), round(float(box[3]))
+    return None
+
+
+def _detect(head):
+    """根据文件头的魔数返回 (格式, 解析函数)，无法识别时返回 (None, None)"""
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png', _png
+    if head.startswith(b'\xff\xd8'):
+        return 'jpeg', _jpeg
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif', _gif
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp', _webp
+    if head[:2] == b'BM':
+        return 'bmp', _bmp
+    if head[:4] in (b'II*\x00', b'MM\x00*'):
+        return 'tiff', _tiff
+    if b'<svg' in head.lower() or head.lstrip().startswith(b'<'):
+        return 'svg', _svg
+    return None, None
+
+
+def read_image_info(path, size=None):
+    """只读取文件头，返回 ImageInfo；文件无法打开时返回 None
+
+    size 可传入列目录时已得到的文件大小，否则在打开的文件上 fstat。
+    文件头损坏或格式无法识别时 format/width/height 为 None。
+    """
+    try:
+        with open(path, 'rb') as f:
+            if size is None:
+                size = os.fstat(f.fileno()).st_size
+            head = f.read(HEAD_SIZE)
+            fmt, parse = _detect(head)
+            dimensions = None
+            if parse is not None:
+                try:
+                    # 不补齐截断的文件头：字段不完整时解析失败，而不是得到补零后的尺寸
+                    dimensions = parse(f, head)
+                except (struct.error, ValueError, OSError):
+                    dimensions = None
+    except OSError:
+        return None
+    width, height = dimensions if dimensions else (None, None)
+    return ImageInfo(size, fmt, width, height)
+
+
+def iter_image_info(paths, sizes=None, workers=META_WORKERS, should_stop=None):
+    """在线程池中并行读取文件头，按完成顺序产出 (路径, ImageInfo 或 None)
+
+    sizes 为 {路径: 大小}（可不完整）。只保持少量读取在进行中，
+    should_stop() 返回真时不再提交新的读取，进行中的完成后结束。
+    """
+    sizes = sizes or {}
+    paths = list(paths)
+    workers = max(1, min(workers, len(paths) or 1))
+    next_index = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        while True:
+            if should_stop is None or not should_stop():
+                while next_index < len(paths) and len(futures) < 4 * workers:
+                    path = paths[next_index]
+                    futures[pool.submit(read_image_info, path, sizes.get(path))] = path
+                    next_index += 1
+            if not futures:
+                break
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield futures.pop(future), future.result()
+
+
+def format_dimensions(info):
+    if info is None or info.width is None:
+        return ''
+    return f"{info.width}×{info.height}"
@@ -0,0 +1,179 @@
+"""无损压缩被引用的图片：PNG 重新压缩图像数据，JPEG 去掉元数据段，只在变小时替换原文件"""
+import os
+import shutil
+import struct
+import zlib
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# 只影响元数据、不影响显示的 PNG 辅助块（颜色相关的 gAMA/cHRM/sRGB/iCCP 等保留）
+PNG_STRIP_CHUNKS = {b'tEXt', b'zTXt', b'iTXt', b'tIME'}
+# 依次尝试的 zlib 策略，取结果最小的一个（截图类图片两者差别可达 10%）
+PNG_STRATEGIES = (zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED)
+# 去掉的 JPEG 段：APP1（EXIF/XMP）、APP3~APP13、APP15 与注释；
+# APP0（JFIF）、APP2（ICC 颜色配置）、APP14（Adobe 颜色变换）会影响显示，保留
+JPEG_STRIP_MARKERS = {0xE1} | set(range(0xE3, 0xEE)) | {0xEF, 0xFE}
+OPTIMIZE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+# 替换时临时文件的后缀（与原文件在同一目录，保证 os.replace 是原子的）
+TMP_SUFFIX = '.optimizing'
+
+
+def _png_chunks(data):
+    """逐个产出 (类型, 数据)，结构损坏时抛出 ValueError"""
+    pos = len(PNG_SIGNATURE)
+    while pos < len(data):
+        if pos + 8 > len(data):
+            raise ValueError("PNG 块头不完整")
+        length, kind = struct.unpack('>I4s', data[pos:pos + 8])
+        end = pos + 12 + length
+        if end > len(data):
+            raise ValueError("PNG 块数据不完整")
+        yield kind, data[pos + 8:pos + 8 + length]
+        pos = end
+        if kind == b'IEND':
+            break
+
+
+def _png_chunk(kind, payload):
+    return (struct.pack('>I', len(payload)) + kind + payload
+            + struct.pack('>I', zlib.crc32(kind + payload) & 0xffffffff))
+
+
+def optimize_png(data):
+    """重新压缩 IDAT（保留原有的行过滤方式，像素不变）并去掉文本和时间块
+
+    返回优化后的字节；动画 PNG 或无法解析时返回 None。
+    """
+    if not data.startswith(PNG_SIGNATURE):
+        return None
+    chunks = list(_png_chunks(data))
+    kinds = {kind for kind, _ in chunks}
+    if b'acTL' in kinds or b'IDAT' not in kinds:
+        return None
+    raw = zlib.decompress(b''.join(payload for kind, payload in chunks if kind == b'IDAT'))
+    best = None
+    for strategy in PNG_STRATEGIES:
+        compressor = zlib.compressobj(9, zlib.DEFLATED, 15, 9, strategy)
+        candidate = compressor.compress(raw) + compressor.flush()
+        if best is None or len(candidate) < len(best):
+            best = candidate
+
+    parts = [PNG_SIGNATURE]
+    for kind, payload in chunks:
+        if kind == b'IDAT':
+            if best is not None:
+                parts.append(_png_chunk(b'IDAT', best))  # 多个 IDAT 合并为一个
+                best = None
+        elif kind not in PNG_STRIP_CHUNKS:
+            parts.append(_png_chunk(kind, payload))
+    return b''.join(parts)
+
+
+def _exif_orientation(payload):
+    """APP1 段中 EXIF 的方向标记（0x0112），没有时返回 None"""
+    if not payload.startswith(b'Exif\0\0'):
+        return None
+    tiff = payload[6:]
+    endian = '<' if tiff[:2] == b'II' else '>'
+    offset = struct.unpack(endian + 'I', tiff[4:8])[0]
+    count = struct.unpack(endian + 'H', tiff[offset:offset + 2])[0]
+    for i in range(count):
+        entry = tiff[offset + 2 + 12 * i:offset + 14 + 12 * i]
+        if len(entry) < 12:
+            break
+        if struct.unpack(endian + 'H', entry[:2])[0] == 0x0112:
+            return struct.unpack(endian + 'H', entry[8:10])[0]
+    return None
+
+
+def _keep_jpeg_segment(marker, payload):
+    if marker not in JPEG_STRIP_MARKERS:
+        return True
+    # 旋转过的照片依赖 EXIF 方向显示，去掉后会横着显示，这种 EXIF 段保留
+    if marker == 0xE1:
+        try:
+            orientation = _exif_orientation(payload)
+        except struct.error:
+            return True
+        return orientation not in (None, 1)
+    return False
+
+
+def optimize_jpeg(data):
+    """去掉 EXIF/XMP/注释等元数据段，压缩数据原样保留；无法解析时返回 None"""
+    if not data.startswith(b'\xff\xd8'):
+        return None
+    parts = [b'\xff\xd8']
+    pos = 2
+    while True:
+        if pos + 4 > len(data) or data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:  # 填充字节
+            pos += 1
+            continue
+        if marker == 0xDA:  # 扫描开始：之后是压缩数据，直接复制
+            parts.append(data[pos:])
+            return b''.join(parts)
+        length = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+        end = pos + 2 + length
+        if length < 2 or end > len(data):
+            return None
+        if _keep_jpeg_segment(marker, data[pos + 4:end]):
+            parts.append(data[pos:end])
+        pos = end
+
+
+_OPTIMIZERS = {'.png': optimize_png, '.jpg': optimize_jpeg, '.jpeg': optimize_jpeg}
+
+
+def optimize_image(path, dry_run=False):
+    """优化单张图片，结果只在更小时原子地替换原文件
+
+    返回结果字典（可在进程之间传递）：before / after 为优化前后的字节数，
+    replaced 表示是否写回（dry_run 时始终为 False），key 为处理后的 (mtime_ns, size)，
+    供索引记录以便下次跳过；出错时 error 为错误信息。
+    """
+    result = {'path': path, 'before': 0, 'after': 0, 'replaced': False, 'key': None,
+              'error': None}
+    optimizer = _OPTIMIZERS.get(os.path.splitext(path)[1].lower())
+    try:
+        st = os.stat(path)
+        with open(path, 'rb') as f:
+            data = f.read()
+        result['before'] = result['after'] = len(data)
+        try:
+            optimized = optimizer(data) if optimizer is not None else None
+        except (ValueError, struct.error, zlib.error):
+            optimized = None  # 无法解析的文件保持原样
+        if optimized is not None and len(optimized) < len(data):
+            result['after'] = len(optimized)
+            if not dry_run:
+                result['replaced'] = _replace(path, optimized, st)
+                if not result['replaced']:
+                    result['after'] = result['before']
+        final = os.stat(path)
+        result['key'] = (final.st_mtime_ns, final.st_size)
+    except OSError as e:
+        result['error'] = str(e)
+    return result
+
+
+def _replace(path, data, st):
+    """写入临时文件并落盘后替换；读取之后原文件被修改过时放弃，返回是否替换"""
+    tmp = path + TMP_SUFFIX
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        shutil.copymode(path, tmp)
+        current = os.stat(path)
+        if (current.st_mtime_ns, current.st_size) != (st.st_mtime_ns, st.st_size):
+            os.remove(tmp)
+            return False
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return True
@@ -0,0 +1,222 @@
+"""相似图片：用感知哈希（pHash）找出重新粘贴、重新编码或轻微改动过的近似副本
+
+需要可选依赖 numpy 与 Pillow（pip install numpy pillow）。每张图片缩小为 32×32 灰度图，
+做二维 DCT 后取左上 8×8 低频系数与中位数比较得到 64 位哈希；两张图片哈希的
+汉明距离越小越相似。哈希按位段放入多重索引，查找相似对时只检查至少有一段
+足够接近的候选，不必两两比较。
+"""
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from cleaner_index import file_key
+
+try:  # 可选依赖
+    import numpy as np
+    from PIL import Image
+except ImportError:
+    np = None
+    Image = None
+
+# 缩小后的边长与参与比较的低频系数边长（哈希位数 = HASH_SIZE²）
+SAMPLE_SIZE = 32
+HASH_SIZE = 8
+# 汉明距离不超过该值视为相似（64 位中约 15% 的位不同）
+DEFAULT_DISTANCE = 10
+# Pillow 能解码的格式（SVG 是矢量图，跳过）
+SIMILAR_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.webp', '.tiff')
+
+_dct_matrix = None
+
+
+def similar_available():
+    return np is not None
+
+
+def _dct():
+    """SAMPLE_SIZE 阶正交 DCT-II 矩阵（每个进程计算一次）"""
+    global _dct_matrix
+    if _dct_matrix is None:
+        k = np.arange(SAMPLE_SIZE)[:, None]
+        i = np.arange(SAMPLE_SIZE)[None, :]
+        matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * SAMPLE_SIZE)) * np.sqrt(2 / SAMPLE_SIZE)
+        matrix[0] /= np.sqrt(2)
+        _dct_matrix = matrix.astype(np.float32)
+    return _dct_matrix
+
+
+def perceptual_hash(path):
+    """返回图片的 64 位感知哈希；无法解码或是纯色图片（哈希没有区分度）时返回 None"""
+    try:
+        with Image.open(path) as image:
+            # JPEG 可以直接按 1/2~1/8 的比例解码，大图省去大部分解码时间
+            image.draft('L', (SAMPLE_SIZE * 4, SAMPLE_SIZE * 4))
+            if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+                # 透明区域按白色背景处理，与 Typora 中的显示一致
+                rgba = image.convert('RGBA')
+                background = Image.new('RGBA', rgba.size, (255, 255, 255, 255))
+                image = Image.alpha_composite(background, rgba)
+            gray = image.convert('L').resize((SAMPLE_SIZE, SAMPLE_SIZE), Image.BOX,
+                                             reducing_gap=2.0)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    pixels = np.asarray(gray, dtype=np.float32)
+    dct = _dct()
+    low = (dct @ pixels @ dct.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    ac = low[1:]  # 直流分量只反映平均亮度，不参与比较
+    if np.ptp(ac) < 1e-3:
+        return None
+    bits = low > np.median(ac)
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def _hash_one(path):
+    return path, perceptual_hash(path)
+
+
+def iter_image_hashes(paths, workers=None, should_stop=None):
+    """在进程池中并行计算哈希，按完成顺序产出 (路径, 哈希或 None)
+
+    只保持少量任务在进行中，should_stop() 返回真时不再提交新任务，进行中的完成后结束。
+    """
+    paths = list(paths)
+    if not paths:
+        return
+    workers = max(1, min(workers or os.cpu_count() or 1, len(paths)))
+    next_index = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = set()
+        while True:
+            if should_stop is None or not should_stop():
+                while next_index < len(paths) and len(futures) < 4 * workers:
+                    futures.add(pool.submit(_hash_one, paths[next_index]))
+                    next_index += 1
+            if not futures:
+                break
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def compute_hashes(paths, index=None, workers=None, stats=None, progress=None, should_stop=None):
+    """计算一组图片的感知哈希，返回 {路径: 哈希}（无法计算的图片不在其中）
+
+    传入 index 时未变化的图片直接使用缓存，新算出的哈希写回索引。
+    传入 stats 时记录 similar 阶段的耗时与项数，以及命中缓存的数量（similar_cached）。
+    progress() 在每处理完一张图片时调用。should_stop() 返回真时停止计算并返回已得到的部分。
+    """
+    start = time.perf_counter()
+    hashes = {}
+    keys = {}
+    pending = []
+    for path in paths:
+        if not path.lower().endswith(SIMILAR_EXTENSIONS):
+            continue
+        key = file_key(path) if index is not None else None
+        cached = index.get_phash(path, key) if key is not None else None
+        if cached is not None:
+            hashes[path] = cached
+            if progress is not None:
+                progress()
+        else:
+            keys[path] = key
+            pending.append(path)
+    cached_count = len(hashes)
+    for path, value in iter_image_hashes(pending, workers, should_stop):
+        if value is not None:
+            hashes[path] = value
+            if index is not None:
+                index.put_phash(path, keys[path], value)
+        if progress is not None:
+            progress()
+    if stats is not None:
+        stats.stage('similar').add(time.perf_counter() - start, len(pending))
+        stats.count('similar_cached', cached_count)
+    return hashes
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class MultiIndexHash:
+    """按位段建立的多重索引（multi-index hashing）
+
+    64 位哈希切成 BANDS 段，每段一个 {段值: [项]} 的字典。两个哈希的距离不超过 r 时，
+    由抽屉原理至少有一段的差异不超过 r // BANDS 位，因此查询时只需在每段中
+    枚举差异不超过该位数的段值（r=10 时每段 137 个），再对候选项计算完整距离。
+    与逐对比较不同，查询的开销基本不随项数增长。
+    """
+    BANDS = 4
+    BAND_BITS = HASH_SIZE * HASH_SIZE // BANDS
+
+    def __init__(self):
+        self.tables = [{} for _ in range(self.BANDS)]
+        self.values = {}  # 项 -> 哈希
+        self._masks = {}  # 段内差异位数上限 -> 需要枚举的异或掩码
+
+    def __len__(self):
+        return len(self.values)
+
+    def _bands(self, value):
+        mask = (1 << self.BAND_BITS) - 1
+        return [(value >> (band * self.BAND_BITS)) & mask for band in range(self.BANDS)]
+
+    def _flip_masks(self, bits):
+        masks = self._masks.get(bits)
+        if masks is None:
+            masks = {0}
+            for _ in range(bits):
+                masks |= {mask | (1 << i) for mask in masks for i in range(self.BAND_BITS)}
+            masks = self._masks[bits] = sorted(masks)
+        return masks
+
+    def add(self, value, item):
+        self.values[item] = value
+        for table, band in zip(self.tables, self._bands(value)):
+            table.setdefault(band, []).append(item)
+
+    def search(self, value, radius):
+        """返回 [(距离, 项)]，距离不超过 radius"""
+        masks = self._flip_masks(radius // self.BANDS)
+        seen = set()
+        found = []
+        for table, band in zip(self.tables, self._bands(value)):
+            for mask in masks:
+                for item in table.get(band ^ mask, ()):
+                    if item in seen:
+                        continue
+                    seen.add(item)
+                    distance = hamming(value, self.values[item])
+                    if distance <= radius:
+                        found.append((distance, item))
+        return found
+
+
+def find_similar_groups(hashes, max_distance=DEFAULT_DISTANCE):
+    """把 {路径: 哈希} 中彼此相似的图片合并成组（相似关系可传递）
+
+    返回 [[路径, ...], ...]，每组至少 2 张，组按大小从大到小排列，组内按路径排序。
+    """
+    parent = {}
+
+    def find(path):
+        while parent[path] != path:
+            parent[path] = parent[parent[path]]
+            path = parent[path]
+        return path
+
+    index = MultiIndexHash()
+    for path, value in sorted(hashes.items()):
+        parent[path] = path
+        for _, other in index.search(value, max_distance):
+            root, other_root = find(path), find(other)
+            if root != other_root:
+                parent[max(root, other_root)] = min(root, other_root)
+        index.add(value, path)
+
+    groups = {}
+    for path in parent:
+        groups.setdefault(find(path), []).append(path)
+    return sorted((sorted(group) for group in groups.values() if len(group) > 1),
+                  key=lambda group: (-len(group), group[0]))
@@ -0,0 +1,315 @@
+"""运行统计：各阶段耗时与计数、移动延迟分布，可输出为 JSON 或 Prometheus 文本格式"""
+import json
+import time
+from contextlib import contextmanager
+
+# 单个文件移动延迟的直方图分桶上界（秒）
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+# 统计栏和文本摘要中各阶段的显示名称（按流程顺序）
+STAGE_LABELS = (
+    ('parse', '解析'),
+    ('listing', '列目录'),
+    ('diff', '比对'),
+    ('metadata', '读取信息'),
+    ('preview', '预览'),
+    ('move', '移动'),
+    ('archive', '归档'),
+    ('optimize', '优化'),
+    ('similar', '相似'),
+)
+
+
+class StageStats:
+    """单个阶段的计时器：累计耗时、处理项数和字节数"""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.items = 0
+        self.bytes = 0
+
+    def add(self, seconds=0.0, items=0, nbytes=0):
+        self.seconds += seconds
+        self.items += items
+        self.bytes += nbytes
+
+    def to_dict(self):
+        result = {'seconds': round(self.seconds, 6), 'items': self.items}
+        if self.bytes:
+            result['bytes'] = self.bytes
+        if self.seconds > 0:
+            result['items_per_second'] = round(self.items / self.seconds, 2)
+            if self.bytes:
+                result['mb_per_second'] = round(self.bytes / self.seconds / 1e6, 2)
+        return result
+
+
+class LatencyHistogram:
+    """延迟直方图（固定分桶），可在进程之间按字典合并"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个桶为 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        i = 0
+        while i < len(self.buckets) and seconds > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """按分桶估计分位数（返回所在桶的上界，落在 +Inf 桶时返回最大值）"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'max': round(self.max, 6),
+            'p50': round(self.quantile(0.5), 6),
+            'p95': round(self.quantile(0.95), 6),
+            'buckets': dict(zip([str(b) for b in self.buckets] + ['+Inf'], self.counts)),
+        }
+
+    def merge_dict(self, data):
+        self.counts = [a + b for a, b in zip(self.counts, data['buckets'].values())]
+        self.count += data['count']
+        self.sum += data['sum']
+        self.max = max(self.max, data['max'])
+
+
+class CleanStats:
+    """一次清理（或一批文件）的结构化统计
+
+    - stages：各阶段的耗时、项数和字节数（解析的字节为扫描的 Markdown 大小，移动的字节为移走的图片大小）
+    - counters：其他计数，如命中索引缓存的文件数、移动失败数
+    - move_latency：单个文件移动的延迟分布
+
+    to_dict() 的结果可以跨进程传递并用 merge_dict() 汇总。
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self.move_latency = LatencyHistogram()
+        self.started = time.time()
+
+    def stage(self, name):
+        if name not in self.stages:
+            self.stages[name] = StageStats()
+        return self.stages[name]
+
+    @contextmanager
+    def timed(self, name, items=0, nbytes=0):
+        """计时一个代码块并累加到阶段 name"""
+        start = time.perf_counter()
+        try:
+            yield self.stage(name)
+        finally:
+            self.stage(name).add(time.perf_counter() - start, items, nbytes)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def to_dict(self):
+        return {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'stages': {name: stage.to_dict() for name, stage in self.stages.items()},
+            'counters': dict(self.counters),
+            'move_latency': self.move_latency.to_dict(),
+        }
+
+    def merge_dict(self, data):
+        for name, stage in data['stages'].items():
+            self.stage(name).add(stage['seconds'], stage['items'], stage.get('bytes', 0))
+        for name, n in data['counters'].items():
+            self.count(name, n)
+        self.move_latency.merge_dict(data['move_latency'])
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self, prefix='typora_cleaner'):
+        """输出 Prometheus 文本格式（可写入 node_exporter 的 textfile 目录）"""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{prefix}_{name}{labels} {value}")
+
+        stages = sorted(self.stages.items())
+        metric('stage_seconds', 'gauge', '各阶段累计耗时（秒）',
+               [(f'{{stage="{n}"}}', round(s.seconds, 6)) for n, s in stages])
+        metric('stage_items', 'gauge', '各阶段处理的项数',
+               [(f'{{stage="{n}"}}', s.items) for n, s in stages])
+        metric('stage_bytes', 'gauge', '各阶段处理的字节数',
+               [(f'{{stage="{n}"}}', s.bytes) for n, s in stages])
+        for name, value in sorted(self.counters.items()):
+            metric(f'{name}_total', 'counter', f'计数 {name}', [('', value)])
+
+        histogram = self.move_latency
+        samples = []
+        cumulative = 0
+        for bound, n in zip(list(histogram.buckets) + ['+Inf'], histogram.counts):
+            cumulative += n
+            samples.append((f'_bucket{{le="{bound}"}}', cumulative))
+        lines.append(f"# HELP {prefix}_move_latency_seconds 单个文件移动的延迟（秒）")
+        lines.append(f"# TYPE {prefix}_move_latency_seconds histogram")
+        for suffix, value in samples:
+            lines.append(f"{prefix}_move_latency_seconds{suffix} {value}")
+        lines.append(f"{prefix}_move_latency_seconds_sum {round(histogram.sum, 6)}")
+        lines.append(f"{prefix}_move_latency_seconds_count {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """一行文字摘要，用于统计栏和日志"""
+        parts = []
+        for name, label in STAGE_LABELS:
+            stage = self.stages.get(name)
+            if stage is not None:
+                parts.append(f"{label} {_format_seconds(stage.seconds)}")
+        scanned = self.stages.get('parse')
+        if scanned is not None and scanned.bytes:
+            parts.append(f"扫描 {format_bytes(scanned.bytes)}")
+        moved = self.stages.get('move')
+        if moved is not None and moved.items:
+            parts.append(f"已移走 {format_bytes(moved.bytes)}")
+        archived = self.stages.get('archive')
+        if archived is not None and archived.items:
+            parts.append(f"已归档 {format_bytes(archived.bytes)}")
+        saved = self.counters.get('optimize_saved_bytes')
+        if saved:
+            parts.append(f"优化节省 {format_bytes(saved)}")
+        if self.move_latency.count:
+            parts.append(f"单张 p50 {_format_seconds(self.move_latency.quantile(0.5))} / "
+                         f"p95 {_format_seconds(self.move_latency.quantile(0.95))}")
+        return ' · '.join(parts)
+
+
+# 尚未测得吞吐量时各阶段假定的单位耗时（秒/字节或秒/个），只影响开始时的进度分配
+DEFAULT_UNIT_COSTS = {
+    'listing': 2e-5,  # 每张图片
+    'parse': 1e-8,    # 每字节
+    'diff': 1e-6,     # 每张图片
+    'metadata': 2e-4,  # 每张图片（读取文件头）
+    'preview': 2e-5,  # 每个预览项
+    'move': 1e-3,     # 每个文件
+    'archive': 2e-3,  # 每个文件（读取并写入归档）
+    'similar': 5e-3,  # 每张图片（解码缩小并计算哈希）
+}
+
+# 阶段至少运行这么久（秒）才用实测吞吐量代替假定值
+MIN_MEASURE_SECONDS = 0.05
+
+
+class ProgressTracker:
+    """按各阶段实际工作量加权的总体进度与剩余时间估计
+
+    每个阶段有总量（解析为字节数，其余为文件数）和已完成量。剩余时间按
+    “剩余量 × 单位耗时” 累加，单位耗时在阶段运行一段时间后改用实测值，
+    未开始的阶段使用 DEFAULT_UNIT_COSTS。总体进度 = 已用时间 / (已用时间 + 剩余时间)，
+    只增不减；还有阶段的总量未知时保持不变。
+    """
+
+    def __init__(self, stages, unit_costs=None):
+        self.stages = list(stages)
+        self.totals = dict.fromkeys(self.stages)  # None 表示总量未知
+        self.done = dict.fromkeys(self.stages, 0)
+        self.begun = {}  # 阶段 -> 开始时间
+        self.elapsed = {}  # 已结束阶段 -> 耗时
+        self.unit_costs = dict(DEFAULT_UNIT_COSTS, **(unit_costs or {}))
+        self.start = time.monotonic()
+        self.last_fraction = 0.0
+
+    def set_total(self, stage, total):
+        self.totals[stage] = total
+
+    def begin(self, stage):
+        self.begun[stage] = time.monotonic()
+
+    def advance(self, stage, n=1):
+        self.done[stage] += n
+
+    def finish(self, stage, total=None):
+        """结束一个阶段；total 为实际总量（例如列完目录后才知道的图片数）"""
+        if total is not None:
+            self.totals[stage] = total
+        self.done[stage] = self.totals[stage] or 0
+        self.elapsed[stage] = time.monotonic() - self.begun.get(stage, time.monotonic())
+
+    def measured(self, stage, now=None):
+        """阶段的实测单位耗时；运行时间还不够长时返回 None"""
+        started = self.begun.get(stage)
+        if started is None or self.done[stage] <= 0:
+            return None
+        seconds = self.elapsed.get(stage, (now or time.monotonic()) - started)
+        return seconds / self.done[stage] if seconds >= MIN_MEASURE_SECONDS else None
+
+    def unit_cost(self, stage, now=None):
+        cost = self.measured(stage, now)
+        return self.unit_costs.get(stage, 0.0) if cost is None else cost
+
+    def remaining(self):
+        """估计剩余秒数；有阶段总量未知时返回 None"""
+        now = time.monotonic()
+        seconds = 0.0
+        for stage in self.stages:
+            if stage in self.elapsed:
+                continue
+            total = self.totals[stage]
+            if total is None:
+                return None
+            seconds += max(0, total - self.done[stage]) * self.unit_cost(stage, now)
+        return seconds
+
+    def fraction(self):
+        """总体进度（0~1，结束前不超过 0.99）"""
+        remaining = self.remaining()
+        if remaining is not None:
+            elapsed = time.monotonic() - self.start
+            if elapsed + remaining > 0:
+                fraction = min(0.99, elapsed / (elapsed + remaining))
+                self.last_fraction = max(self.last_fraction, fraction)
+        return self.last_fraction
+
+    def eta_text(self):
+        """剩余时间的文字描述；当前阶段尚无实测吞吐量或剩余不足 1 秒时返回空字符串"""
+        current = next((s for s in self.stages if s in self.begun and s not in self.elapsed), None)
+        if current is None or self.measured(current) is None:
+            return ''
+        remaining = self.remaining()
+        if remaining is None or remaining < 1:
+            return ''
+        if remaining < 60:
+            return f"剩余约 {remaining:.0f} 秒"
+        return f"剩余约 {remaining // 60:.0f} 分 {remaining % 60:.0f} 秒"
+
+
+def _format_seconds(seconds):
+    if seconds < 0.01:
+        return f"{seconds * 1000:.1f}ms"
+    return f"{seconds * 1000:.0f}ms" if seconds < 1 else f"{seconds:.2f}s"
+
+
+def format_bytes(n):
+    """以 B/KB/MB/GB 显示字节数"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024 or unit == 'GB':
+            return f"{n:.0f}{unit}" if unit == 'B' else f"{n:.1f}{unit}"
+        n /= 1024
@@ -0,0 +1,198 @@
+"""缩略图流水线：在线程池中解码并缩小图片，只把成品交给 GUI 线程"""
+import hashlib
+import os
+import sys
+import threading
+
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThread, QThreadPool, pyqtSignal
+from PyQt5.QtGui import QImage, QImageReader, QImageWriter
+
+from cleaner_core import user_cache_dir
+
+THUMB_SIZE = 400
+DEFAULT_THUMB_CACHE_MB = 256
+
+
+def _cache_limit_mb():
+    """读取环境变量 TYPORA_CLEANER_THUMB_CACHE_MB；无法解析时使用默认值，负数按 0 处理"""
+    value = os.environ.get('TYPORA_CLEANER_THUMB_CACHE_MB')
+    if value is None:
+        return DEFAULT_THUMB_CACHE_MB
+    try:
+        return max(0, int(value))
+    except ValueError:
+        print(f"警告: TYPORA_CLEANER_THUMB_CACHE_MB={value!r} 不是整数，"
+              f"缩略图缓存上限使用默认的 {DEFAULT_THUMB_CACHE_MB} MB", file=sys.stderr)
+        return DEFAULT_THUMB_CACHE_MB
+
+
+# 缩略图缓存上限（MB），可通过环境变量覆盖
+THUMB_CACHE_LIMIT_MB = _cache_limit_mb()
+
+
+def read_thumbnail(image_path, size=THUMB_SIZE):
+    """按目标尺寸解码图片，返回 QImage（失败时为空图）
+
+    通过 QImageReader.setScaledSize 让解码器直接输出缩小后的图像，
+    JPEG 等格式无需解码完整分辨率；小于目标尺寸的图片保持原样。
+    """
+    reader = QImageReader(image_path)
+    reader.setAutoTransform(True)
+    original = reader.size()
+    if original.isValid() and (original.width() > size or original.height() > size):
+        reader.setScaledSize(original.scaled(size, size, Qt.KeepAspectRatio))
+    image = reader.read()
+    if image.isNull():
+        return QImage()
+    return image
+
+
+class ThumbnailCache:
+    """磁盘缩略图缓存
+
+    每张源图对应缓存目录中的一个小文件，文件名由 (路径, 大小, mtime, 缩略图尺寸)
+    的哈希得到，源图被修改后自然失效。命中时刷新缓存文件的 mtime，超出容量时
+    按 mtime 从旧到新淘汰（LRU）。可在多个解码线程中同时使用。
+    """
+
+    def __init__(self, folder=None, max_bytes=THUMB_CACHE_LIMIT_MB * 1024 * 1024):
+        self.folder = folder or os.path.join(user_cache_dir(), 'thumbnails')
+        self.max_bytes = max_bytes
+        formats = {bytes(f).decode() for f in QImageWriter.supportedImageFormats()}
+        self.format = 'webp' if 'webp' in formats else 'png'
+        self._lock = threading.Lock()
+        self._total = None  # 首次写入时统计
+
+    def _entry_path(self, image_path, st, size):
+        raw = f"{os.path.abspath(image_path)}|{st.st_size}|{st.st_mtime_ns}|{size}"
+        digest = hashlib.sha1(raw.encode('utf-8', 'surrogatepass')).hexdigest()
+        return os.path.join(self.folder, digest[:2], f"{digest}.{self.format}")
+
+    def get(self, image_path, st, size):
+        """返回缓存的缩略图 QImage，未命中时返回 None"""
+        entry = self._entry_path(image_path, st, size)
+        image = QImage(entry)
+        if image.isNull():
+            return None
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        return image
+
+    def put(self, image_path, st, size, image):
+        entry = self._entry_path(image_path, st, size)
+        tmp = f"{entry}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            if not image.save(tmp, self.format.upper()):
+                return
+        except OSError:
+            return
+        with self._lock:
+            # 同一张图可能被重复写入：在锁内替换，先减去被覆盖的旧文件大小
+            try:
+                replaced = os.path.getsize(entry) if os.path.exists(entry) else 0
+                os.replace(tmp, entry)
+                written = os.path.getsize(entry)
+            except OSError:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+                return
+            if self._total is None:
+                self._total = self._scan()[1]
+            else:
+                self._total += written - replaced
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _scan(self):
+        entries = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.folder):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        return entries, total
+
+    def _evict(self):
+        """淘汰最久未使用的缩略图，直到占用降到上限的 90%"""
+        entries, total = self._scan()
+        entries.sort()
+        target = self.max_bytes * 0.9
+        for _, file_size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= file_size
+            except OSError:
+                pass
+        self._total = total
+
+
+class _ThumbnailTask(QRunnable):
+    """单张缩略图的解码任务"""
+
+    def __init__(self, loader, image_path, fallback_path, size, cache):
+        super().__init__()
+        self.loader = loader
+        self.image_path = image_path
+        self.fallback_path = fallback_path
+        self.size = size
+        self.cache = cache
+
+    def run(self):
+        source = self.image_path
+        if self.fallback_path and not os.path.exists(source):
+            source = self.fallback_path
+        image = self.load(source)
+        # 信号跨线程发出时自动排队到 GUI 线程
+        self.loader.thumbnail_ready.emit(self.image_path, image)
+
+    def load(self, source):
+        if self.cache is None:
+            return read_thumbnail(source, self.size)
+        try:
+            st = os.stat(source)
+        except OSError:
+            return QImage()
+        image = self.cache.get(source, st, self.size)
+        if image is None:
+            image = read_thumbnail(source, self.size)
+            if not image.isNull():
+                self.cache.put(source, st, self.size, image)
+        return image
+
+
+class ThumbnailLoader(QObject):
+    """缩略图加载器，完成后发出 thumbnail_ready(图片路径, QImage)"""
+    thumbnail_ready = pyqtSignal(str, QImage)
+
+    def __init__(self, parent=None, size=THUMB_SIZE, cache=None):
+        super().__init__(parent)
+        self.size = size
+        self.cache = cache
+        self.pool = QThreadPool(self)
+        # 为 GUI 线程和清理线程各保留一个核心
+        self.pool.setMaxThreadCount(max(1, QThread.idealThreadCount() - 2))
+
+    def request(self, image_path, fallback_path=None):
+        """排队解码 image_path；文件不存在时改读 fallback_path（如已移入备份文件夹）"""
+        self.pool.start(_ThumbnailTask(self, image_path, fallback_path, self.size, self.cache))
+
+    def cancel_pending(self):
+        """丢弃尚未开始的解码任务"""
+        self.pool.clear()
+
+    def shutdown(self):
+        """丢弃排队任务并等待正在解码的任务结束（窗口关闭前调用）"""
+        self.pool.clear()
+        self.pool.waitForDone()
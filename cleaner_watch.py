@@ -0,0 +1,373 @@
+"""监视模式：订阅文件系统变化，增量维护引用与图片列表，随时给出当前的未引用图片集合"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+from cleaner_core import (DELETED_FOLDER_NAME, IMAGE_EXTENSIONS, path_key, scan_used_images)
+from cleaner_graph import ReferenceGraph
+
+
+def _is_skipped_dir(name):
+    return name.startswith('.') or name == DELETED_FOLDER_NAME
+
+
+class VaultState:
+    """笔记库的增量状态
+
+    - graph：所有 Markdown 的引用（反向引用计数）
+    - asset_roots：被监视的图片文件夹（每个 *.assets 以及共享文件夹）
+    - dir_images：图片文件夹树中每个目录 -> 其中的图片文件名
+    - orphans：引用计数为 0 的图片路径键，随每个事件增量更新
+    """
+
+    def __init__(self, root, shared=(), graph=None):
+        self.root = os.path.abspath(root)
+        self.shared = [os.path.abspath(folder) for folder in shared]
+        self.graph = graph if graph is not None else ReferenceGraph()
+        self.asset_roots = set()
+        self.dir_images = {}
+        self.dir_docs = {}  # 笔记目录 -> 其中的 Markdown 文件名
+        self.images = {}  # 图片路径键 -> 路径
+        self.orphans = set()
+
+    # ---- 初始加载 ----
+
+    def load(self, parse_documents=True):
+        """遍历一次笔记库建立初始状态；graph 已由调用方并行构建时可跳过解析"""
+        for folder in self.shared:
+            self.add_asset_root(folder)
+        self._scan_note_tree(self.root, parse_documents)
+
+    def _scan_note_tree(self, top, parse_documents=True):
+        for dirpath, dirnames, filenames in os.walk(top):
+            if self.asset_root_of(dirpath) is not None:
+                dirnames[:] = []
+                continue
+            for name in dirnames:
+                if name.endswith('.assets'):
+                    self.add_asset_root(os.path.join(dirpath, name))
+            dirnames[:] = [d for d in dirnames if not _is_skipped_dir(d) and not d.endswith('.assets')
+                           and os.path.join(dirpath, d) not in self.asset_roots]
+            docs = {name for name in filenames if name.lower().endswith('.md')}
+            self.dir_docs[dirpath] = docs
+            if parse_documents:
+                for name in docs:
+                    self.update_document(os.path.join(dirpath, name))
+
+    # ---- 图片文件夹 ----
+
+    def asset_root_of(self, path):
+        """返回 path 所在的图片文件夹，不在任何图片文件夹中时返回 None"""
+        current = path
+        while True:
+            if current in self.asset_roots:
+                return current
+            parent = os.path.dirname(current)
+            if parent == current:
+                return None
+            current = parent
+
+    def add_asset_root(self, folder):
+        folder = os.path.abspath(folder)
+        if folder in self.asset_roots:
+            return
+        self.asset_roots.add(folder)
+        self._scan_asset_tree(folder)
+
+    def _scan_asset_tree(self, top):
+        pending = [top]
+        while pending:
+            pending.extend(self._sync_dir(pending.pop()))
+
+    def _sync_dir(self, directory):
+        """重新列出单个目录中的图片并与旧状态做差，返回新出现的子目录"""
+        names = set()
+        new_subdirs = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not _is_skipped_dir(entry.name) and entry.path not in self.dir_images:
+                            new_subdirs.append(entry.path)
+                    elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                        names.add(entry.name)
+        except OSError:
+            self._remove_tree(directory)
+            return []
+        old = self.dir_images.get(directory, set())
+        for name in names - old:
+            self._add_image(os.path.join(directory, name))
+        for name in old - names:
+            self._remove_image(os.path.join(directory, name))
+        self.dir_images[directory] = names
+        return new_subdirs
+
+    def _remove_tree(self, top):
+        prefix = os.path.join(top, '')
+        for directory in [d for d in self.dir_images if d == top or d.startswith(prefix)]:
+            for name in self.dir_images.pop(directory):
+                self._remove_image(os.path.join(directory, name))
+        self.asset_roots = {r for r in self.asset_roots if r != top and not r.startswith(prefix)}
+
+    def _add_image(self, image_path):
+        key = path_key(image_path)
+        self.images[key] = image_path
+        if key not in self.graph.refcounts:
+            self.orphans.add(key)
+
+    def _remove_image(self, image_path):
+        key = path_key(image_path)
+        self.images.pop(key, None)
+        self.orphans.discard(key)
+
+    # ---- Markdown ----
+
+    def update_document(self, md_file):
+        """重新解析（或移除）一个 Markdown 文件，并据引用变化调整孤儿集合"""
+        if os.path.isfile(md_file):
+            try:
+                references = scan_used_images(md_file)
+            except (OSError, UnicodeDecodeError):
+                return  # Typora 保存过程中可能读到半个文件，等待下一次事件
+            added, removed = self.graph.set_document(md_file, references)
+        else:
+            added, removed = (), self.graph.remove_document(md_file)
+        for ref in added:
+            self.orphans.discard(ref)
+        for ref in removed:
+            if ref in self.images and ref not in self.graph.refcounts:
+                self.orphans.add(ref)
+
+    def _sync_note_dir(self, directory):
+        """笔记目录发生变化：处理新增/删除的 Markdown、.assets 文件夹和子目录"""
+        if not os.path.isdir(directory):
+            prefix = os.path.join(directory, '')
+            for d in [d for d in self.dir_docs if d == directory or d.startswith(prefix)]:
+                for name in self.dir_docs.pop(d):
+                    self.update_document(os.path.join(d, name))
+            self._remove_tree(directory)
+            return
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return
+        docs = set()
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name.endswith('.assets'):
+                    self.add_asset_root(entry.path)
+                elif not _is_skipped_dir(entry.name) and entry.path not in self.dir_docs \
+                        and entry.path not in self.asset_roots:
+                    self._scan_note_tree(entry.path)
+            elif entry.name.lower().endswith('.md'):
+                docs.add(entry.name)
+        old = self.dir_docs.get(directory, set())
+        for name in (docs - old) | (old - docs):
+            self.update_document(os.path.join(directory, name))
+        self.dir_docs[directory] = docs
+        for root in [r for r in self.asset_roots if os.path.dirname(r) == directory
+                     and r not in self.shared and not os.path.isdir(r)]:
+            self._remove_tree(root)
+
+    # ---- 事件 ----
+
+    def apply(self, events):
+        """应用一批事件 [(类型, 路径)]，类型为 'md'、'dir' 或 'rescan'
+
+        返回 (新增的孤儿路径, 不再是孤儿的路径)。
+        """
+        before = set(self.orphans)
+        if any(kind == 'rescan' for kind, _ in events):
+            # 内核事件队列溢出，事件已丢失，只能重新建立状态
+            self.__init__(self.root, self.shared)
+            self.load()
+        else:
+            for kind, path in events:
+                if kind == 'md':
+                    if self.asset_root_of(path) is None:
+                        self.update_document(path)
+                elif path.endswith('.assets') and path not in self.asset_roots:
+                    if os.path.isdir(path):
+                        self.add_asset_root(path)
+                elif self.asset_root_of(path) is not None:
+                    if os.path.isdir(path):
+                        self._scan_asset_tree(path)
+                    else:
+                        self._remove_tree(path)
+                else:
+                    self._sync_note_dir(path)
+        added = sorted(self.images[k] for k in self.orphans - before)
+        removed = sorted(k for k in before - self.orphans)
+        return added, removed
+
+    def orphan_paths(self):
+        """当前未被任何 Markdown 引用的图片路径（无需重新扫描）"""
+        return sorted(self.images[key] for key in self.orphans)
+
+
+class _InotifySource:
+    """Linux inotify 事件源（通过 ctypes 调用 libc，无需第三方依赖）"""
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+            | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+    _HEADER = struct.Struct('iIII')
+
+    def __init__(self, tops):
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), '无法初始化 inotify')
+        self.paths = {}  # 监视描述符 -> 目录
+        for top in tops:
+            self.add_tree(top)
+
+    def add_tree(self, top):
+        for dirpath, dirnames, _ in os.walk(top):
+            dirnames[:] = [d for d in dirnames if not _is_skipped_dir(d)]
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirpath), self.MASK)
+            if wd >= 0:
+                self.paths[wd] = dirpath
+
+    def wait(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 256 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self._HEADER.unpack_from(data, offset)
+            offset += self._HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                events.append(('rescan', None))
+                continue
+            directory = self.paths.get(wd)
+            if directory is None:
+                continue
+            if mask & self.IN_IGNORED:
+                self.paths.pop(wd, None)
+                continue
+            if mask & (self.IN_DELETE_SELF | self.IN_MOVE_SELF):
+                events.append(('dir', directory))
+                continue
+            path = os.path.join(directory, name)
+            if mask & self.IN_ISDIR:
+                if _is_skipped_dir(name):
+                    continue
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    self.add_tree(path)
+                events.append(('dir', path))
+                events.append(('dir', directory))
+            elif name.lower().endswith('.md'):
+                events.append(('md', path))
+            elif name.lower().endswith(IMAGE_EXTENSIONS):
+                events.append(('dir', directory))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _PollingSource:
+    """轮询事件源：定期比较目录与 Markdown 文件的 mtime（非 Linux 或 inotify 不可用时使用）"""
+
+    def __init__(self, tops, interval=2.0):
+        self.tops = tops
+        self.interval = interval
+        self.snapshot = self._take()
+
+    def _take(self):
+        snapshot = {}
+        for top in self.tops:
+            for dirpath, dirnames, filenames in os.walk(top):
+                dirnames[:] = [d for d in dirnames if not _is_skipped_dir(d)]
+                try:
+                    snapshot[('dir', dirpath)] = os.stat(dirpath).st_mtime_ns
+                except OSError:
+                    continue
+                for name in filenames:
+                    if name.lower().endswith('.md'):
+                        path = os.path.join(dirpath, name)
+                        try:
+                            snapshot[('md', path)] = os.stat(path).st_mtime_ns
+                        except OSError:
+                            pass
+        return snapshot
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        current = self._take()
+        events = [key for key in current.keys() | self.snapshot.keys()
+                  if current.get(key) != self.snapshot.get(key)]
+        self.snapshot = current
+        return events
+
+    def close(self):
+        pass
+
+
+class VaultWatcher:
+    """监视笔记库并在变化停止 debounce 秒后批量更新 VaultState
+
+    Typora 自动保存会在短时间内产生一串事件，合并后只处理一次；
+    持续有事件时最多等待 max_delay 秒。
+    """
+
+    def __init__(self, state, debounce=0.5, max_delay=5.0, poll_interval=2.0, polling=False):
+        self.state = state
+        self.debounce = debounce
+        self.max_delay = max_delay
+        tops = [state.root] + [f for f in state.shared if not f.startswith(os.path.join(state.root, ''))]
+        self.source = None
+        if not polling and sys.platform.startswith('linux'):
+            try:
+                self.source = _InotifySource(tops)
+            except OSError:
+                self.source = None
+        if self.source is None:
+            self.source = _PollingSource(tops, poll_interval)
+
+    @property
+    def backend(self):
+        return 'inotify' if isinstance(self.source, _InotifySource) else 'polling'
+
+    def run(self, on_change=None, should_stop=None):
+        """事件循环：on_change(新增孤儿, 不再是孤儿) 在每批事件应用后调用"""
+        pending = []
+        first = last = None
+        try:
+            while should_stop is None or not should_stop():
+                events = self.source.wait(self.debounce)
+                now = time.monotonic()
+                if events:
+                    pending.extend(events)
+                    first = first or now
+                    last = now
+                if pending and (now - last >= self.debounce or now - first >= self.max_delay):
+                    batch = list(dict.fromkeys(pending))
+                    pending = []
+                    first = last = None
+                    added, removed = self.state.apply(batch)
+                    if on_change is not None and (added or removed):
+                        on_change(added, removed)
+        finally:
+            self.source.close()
@@ -0,0 +1,93 @@
+"""cleaner_archive 的测试：归档后恢复，以及越界条目的拒绝"""
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from cleaner_archive import (MANIFEST_NAME, SIDECAR_SUFFIX, archive_available,
+                             archive_unused_images, find_archives, read_manifest, restore_archive)
+from cleaner_core import DELETED_FOLDER_NAME, OperationCancelled
+
+
+class ArchiveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        self.assets = os.path.join(self.root, 'n.assets')
+        self.images = ['a.png', 'b.txt', os.path.join('sub', 'c.jpg')]
+        for name in self.images:
+            self.write(name, name.encode() * 100)
+
+    def write(self, name, data):
+        path = os.path.join(self.assets, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def read(self, name):
+        with open(os.path.join(self.assets, name), 'rb') as f:
+            return f.read()
+
+    def archives(self):
+        return find_archives(os.path.join(self.assets, DELETED_FOLDER_NAME))
+
+    def round_trip(self, fmt):
+        mtime = os.stat(os.path.join(self.assets, 'a.png')).st_mtime_ns
+        removed = archive_unused_images(self.assets, self.images, fmt=fmt)
+        self.assertEqual(sorted(removed), sorted(self.images))
+        for name in self.images:
+            self.assertFalse(os.path.exists(os.path.join(self.assets, name)))
+        [archive] = self.archives()
+        self.assertEqual(len(read_manifest(archive)['entries']), 3)
+
+        # 只恢复部分条目
+        counts = restore_archive(archive, ['sub/*'])
+        self.assertEqual(counts, {'restored': 1, 'skipped': 0, 'failed': 0})
+        self.assertEqual(self.read(self.images[2]), self.images[2].encode() * 100)
+        self.assertFalse(os.path.exists(os.path.join(self.assets, 'a.png')))
+
+        counts = restore_archive(archive)
+        self.assertEqual(counts, {'restored': 2, 'skipped': 1, 'failed': 0})
+        for name in self.images:
+            self.assertEqual(self.read(name), name.encode() * 100)
+        self.assertEqual(os.stat(os.path.join(self.assets, 'a.png')).st_mtime_ns, mtime)
+
+    def test_zip_round_trip(self):
+        self.round_trip('zip')
+
+    @unittest.skipUnless(archive_available('tar.zst'), '需要 zstandard')
+    def test_tar_zst_round_trip(self):
+        self.round_trip('tar.zst')
+
+    def test_cancelled_archive_keeps_files(self):
+        with self.assertRaises(OperationCancelled):
+            archive_unused_images(self.assets, self.images, should_stop=lambda: True)
+        for name in self.images:
+            self.assertTrue(os.path.exists(os.path.join(self.assets, name)))
+        self.assertEqual(os.listdir(os.path.join(self.assets, DELETED_FOLDER_NAME)), [])
+
+    def test_entries_escaping_target_are_rejected(self):
+        archive = os.path.join(self.root, 'evil.zip')
+        names = ['ok.png', '../escaped.png', os.path.abspath(os.path.join(self.root, 'abs.png')),
+                 'sub/../../up.png']
+        entries = [{'src': name, 'name': f'm{i}', 'size': 1, 'mtime_ns': 0}
+                   for i, name in enumerate(names)]
+        manifest = {'run': 'x', 'assets_folder': self.assets, 'format': 'zip', 'entries': entries}
+        with zipfile.ZipFile(archive, 'w') as zf:
+            for entry in entries:
+                zf.writestr(entry['name'], b'x')
+            zf.writestr(MANIFEST_NAME, json.dumps(manifest))
+        with open(archive + SIDECAR_SUFFIX, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+
+        counts = restore_archive(archive)
+        self.assertEqual(counts, {'restored': 1, 'skipped': 0, 'failed': 3})
+        self.assertEqual(self.read('ok.png'), b'x')
+        self.assertEqual(sorted(os.listdir(self.root)), ['evil.zip', 'evil.zip.json', 'n.assets'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+"""cleaner_core 的回归测试：python -m pytest（或 python -m unittest）"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from cleaner_core import (ReferenceScanner, SCAN_CHUNK_SIZE, _scan_mapped, parse_root_url,
+                          path_key, scan_used_images)
+
+
+def scan(data, chunk_size):
+    scanner = ReferenceScanner()
+    for i in range(0, len(data), chunk_size):
+        scanner.feed(data[i:i + chunk_size])
+    return scanner.close()
+
+
+class ReferenceScannerTest(unittest.TestCase):
+    CHUNK_SIZES = (1, 2, 3, 7, 64, 4099)
+
+    def assert_chunking_invariant(self, data, expected):
+        self.assertEqual(scan(data, len(data) + 1), expected)
+        for chunk_size in self.CHUNK_SIZES:
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(scan(data, chunk_size), expected)
+        for window in (16, 100):
+            with self.subTest(window=window):
+                self.assertEqual({t.decode() for t in _scan_mapped(data, window)}, expected)
+
+    def test_tail_without_newline(self):
+        data = b'![](a.png)\n' + b'x' * 300 + b' ![](b.png) ![](c.png)'
+        self.assert_chunking_invariant(data, {'a.png', 'b.png', 'c.png'})
+
+    def test_long_line_crossing_chunk_boundary(self):
+        # 最后一行跨过默认块大小的边界，且末尾没有换行
+        data = b'![](a.png)\n' + b'x' * (SCAN_CHUNK_SIZE - 40) + b' ![](b.png) ![](c.png) tail'
+        self.assertEqual(scan(data, SCAN_CHUNK_SIZE), {'a.png', 'b.png', 'c.png'})
+        self.assert_chunking_invariant(data[-9000:], {'b.png', 'c.png'})
+
+    def test_all_syntaxes_after_long_line(self):
+        data = (b'y' * 5000 + b' ![](<f g.png>) ![](b.png "t") <img src="d.png"> <img src=h.png>'
+                b'\n[id]: e.png\n```\n![](z.png)\n```\n' + b'y' * 5000 + b' ![](<i.png>)')
+        self.assert_chunking_invariant(
+            data, {'f g.png', 'b.png', 'd.png', 'h.png', 'e.png', 'i.png'})
+
+    def test_img_tag_across_lines(self):
+        data = (b'<img\n  src="a.png">\n<IMG\n alt="x"\n src=\'m.png\' width=3>\n'
+                + b'z' * 100 + b'\n<img width="300"\n\tsrc = n.png\n/>\n<imgx\nsrc="no.png">\n')
+        self.assert_chunking_invariant(data, {'a.png', 'm.png', 'n.png'})
+
+    def test_definitions_in_containers(self):
+        data = (b'[a]: a.png\n- [b]: b.png\n> [c]: c.png\n    [d]: d.png\n1. [e]: <e e.png>\n'
+                b'> - [f]: f.png "t"\n- [x] task\n[^1]: note.png\ntext [g]: g.png\n'
+                b'```\n- [h]: h.png\n```\n')
+        self.assert_chunking_invariant(data, {'a.png', 'b.png', 'c.png', 'd.png', 'e e.png', 'f.png'})
+
+
+class RootUrlTest(unittest.TestCase):
+    """以 / 开头的目标按 typora-root-url 解析，没有设置时保守地保留"""
+
+    def setUp(self):
+        self.vault = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.vault, True)
+        os.makedirs(os.path.join(self.vault, 'notes'))
+
+    def note(self, name, text):
+        path = os.path.join(self.vault, 'notes', name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def key(self, *parts):
+        return path_key(os.path.join(self.vault, *parts))
+
+    def test_parse_root_url(self):
+        self.assertEqual(parse_root_url('---\ntitle: x\ntypora-root-url: "../a b"\n---\n'), '../a b')
+        self.assertIsNone(parse_root_url('---\ntitle: x\n---\ntypora-root-url: ..\n'))
+        self.assertIsNone(parse_root_url('typora-root-url: ..\n'))
+
+    def test_root_url_front_matter(self):
+        md_file = self.note('a.md', '---\ntypora-root-url: ..\n---\n![](/assets/a.png)\n')
+        self.assertIn(self.key('assets', 'a.png'), scan_used_images(md_file))
+
+    def test_without_root_url_ancestors_are_kept(self):
+        md_file = self.note('b.md', '![](/assets/b.png)\n')
+        used = scan_used_images(md_file)
+        self.assertIn(self.key('assets', 'b.png'), used)
+        self.assertIn(self.key('notes', 'assets', 'b.png'), used)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+"""cleaner_dedup 的测试：改写引用"""
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+from unittest import mock
+
+import cleaner_dedup
+from cleaner_core import path_key
+from cleaner_dedup import DocumentChanged, rewrite_references
+
+
+class RewriteReferencesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, True)
+        self.md_file = os.path.join(self.folder, 'n.md')
+
+    def write(self, text):
+        with open(self.md_file, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+
+    def read(self):
+        with open(self.md_file, encoding='utf-8', newline='') as f:
+            return f.read()
+
+    def replacements(self, old, new):
+        return {path_key(os.path.join(self.folder, old)): os.path.join(self.folder, new)}
+
+    def test_targets_with_spaces_and_parens_stay_valid(self):
+        self.write('![](n.assets/dup.png) <img src=n.assets/dup.png>\n[id]: n.assets/dup.png\n')
+        count = rewrite_references(self.md_file,
+                                   self.replacements('n.assets/dup.png', 'n.assets/a (1) b.png'))
+        self.assertEqual(count, 3)
+        self.assertEqual(self.read(), '![](<n.assets/a (1) b.png>) <img src="n.assets/a (1) b.png">\n'
+                                      '[id]: <n.assets/a (1) b.png>\n')
+
+    def test_url_encoded_targets_stay_encoded(self):
+        self.write('![](n.assets/my%20dup.png)\n')
+        rewrite_references(self.md_file, self.replacements('n.assets/my dup.png', 'n.assets/a b.png'))
+        self.assertEqual(self.read(), '![](n.assets/a%20b.png)\n')
+
+    @unittest.skipIf(os.name == 'nt', '需要 POSIX 权限位')
+    def test_file_mode_is_kept(self):
+        self.write('![](dup.png)\n')
+        os.chmod(self.md_file, 0o640)
+        rewrite_references(self.md_file, self.replacements('dup.png', 'a.png'))
+        self.assertEqual(stat.S_IMODE(os.stat(self.md_file).st_mode), 0o640)
+        self.assertEqual(self.read(), '![](a.png)\n')
+
+    def test_concurrent_edit_is_not_overwritten(self):
+        self.write('![](dup.png)\n')
+        copymode = shutil.copymode
+
+        def autosave(src, dst):
+            with open(self.md_file, 'a', encoding='utf-8') as f:
+                f.write('新写入的内容\n')
+            copymode(src, dst)
+
+        with mock.patch.object(cleaner_dedup.shutil, 'copymode', autosave):
+            with self.assertRaises(DocumentChanged):
+                rewrite_references(self.md_file, self.replacements('dup.png', 'a.png'))
+        self.assertEqual(self.read(), '![](dup.png)\n新写入的内容\n')
+        self.assertEqual(os.listdir(self.folder), ['n.md'])
+
+
+if __name__ == '__main__':
+    unittest.main()
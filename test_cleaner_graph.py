@@ -0,0 +1,60 @@
+"""cleaner_graph 的测试：共享图片的引用计数"""
+import os
+import unittest
+
+from cleaner_core import path_key
+from cleaner_graph import ReferenceGraph
+
+VAULT = os.path.abspath('vault')
+ASSETS = os.path.join(VAULT, 'assets')
+
+
+def image(name):
+    return path_key(os.path.join(ASSETS, name))
+
+
+class ReferenceGraphTest(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = ReferenceGraph()
+        self.a = os.path.join(VAULT, 'a.md')
+        self.b = os.path.join(VAULT, 'b.md')
+        self.c = os.path.join(VAULT, 'sub', 'c.md')
+        self.graph.set_document(self.a, {image('shared.png'), image('a.png')})
+        self.graph.set_document(self.b, {image('shared.png')})
+        self.graph.set_document(self.c, {image('shared.png'), image('c.png')})
+
+    def orphans(self):
+        return self.graph.orphans(ASSETS, ['a.png', 'c.png', 'shared.png', 'unused.png'])
+
+    def test_shared_image_counts_every_document(self):
+        self.assertEqual(len(self.graph), 3)
+        self.assertEqual(self.graph.refcount(os.path.join(ASSETS, 'shared.png')), 3)
+        self.assertEqual(self.graph.refcount(os.path.join(ASSETS, 'a.png')), 1)
+        self.assertEqual(self.orphans(), ['unused.png'])
+
+    def test_shared_image_orphaned_only_after_last_reference(self):
+        self.graph.remove_document(self.a)
+        self.assertEqual(self.graph.refcount(os.path.join(ASSETS, 'shared.png')), 2)
+        self.assertEqual(self.orphans(), ['a.png', 'unused.png'])
+
+        added, removed = self.graph.set_document(self.b, set())
+        self.assertEqual((added, removed), (frozenset(), {image('shared.png')}))
+        self.assertEqual(self.graph.refcount(os.path.join(ASSETS, 'shared.png')), 1)
+
+        self.graph.remove_document(self.c)
+        self.assertEqual(self.graph.refcount(os.path.join(ASSETS, 'shared.png')), 0)
+        self.assertEqual(self.orphans(), ['a.png', 'c.png', 'shared.png', 'unused.png'])
+        self.assertEqual(dict(self.graph.refcounts), {})
+
+    def test_resetting_same_references_keeps_counts(self):
+        added, removed = self.graph.set_document(self.a, {image('shared.png'), image('a.png')})
+        self.assertEqual((added, removed), (frozenset(), frozenset()))
+        self.assertEqual(self.graph.refcount(os.path.join(ASSETS, 'shared.png')), 3)
+        # 删除不存在的文档不影响计数
+        self.assertEqual(self.graph.remove_document(os.path.join(VAULT, 'missing.md')), frozenset())
+        self.assertEqual(self.graph.refcount(os.path.join(ASSETS, 'shared.png')), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
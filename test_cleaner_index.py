@@ -0,0 +1,104 @@
+"""cleaner_index 的测试：python -m pytest（或 python -m unittest）"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from cleaner_index import ReferenceIndex, file_key
+
+
+class ReferenceIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, True)
+        self.db_path = os.path.join(self.folder, 'index.db')
+
+    def open_index(self):
+        index = ReferenceIndex(self.db_path)
+        self.addCleanup(index.close)
+        return index
+
+    def write(self, name, data):
+        path = os.path.join(self.folder, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_references_invalidated_by_size_or_mtime(self):
+        index = self.open_index()
+        md_file = self.write('a.md', b'![](x.png)\n')
+        index.put_references(md_file, file_key(md_file), {'x.png'})
+        self.assertEqual(index.get_references(md_file, file_key(md_file)), {'x.png'})
+
+        self.write('a.md', b'![](x.png)\n![](y.png)\n')
+        self.assertIsNone(index.get_references(md_file, file_key(md_file)))
+
+        # 大小不变、只有 mtime 变化（例如同长度的改写）也要失效
+        index.put_references(md_file, file_key(md_file), {'x.png', 'y.png'})
+        mtime_ns, _ = file_key(md_file)
+        os.utime(md_file, ns=(mtime_ns + 10 ** 9, mtime_ns + 10 ** 9))
+        self.assertIsNone(index.get_references(md_file, file_key(md_file)))
+        self.assertIsNone(index.get_references(md_file, None))
+
+    def test_listing_invalidated_by_subfolder_change(self):
+        index = self.open_index()
+        assets = os.path.join(self.folder, 'a.assets')
+        self.write(os.path.join('a.assets', 'sub', 'x.png'), b'x')
+        index.put_listing(assets, file_key(assets), ['sub/x.png'], ['sub'])
+        self.assertEqual(index.get_listing(assets, file_key(assets)), ['sub/x.png'])
+
+        # 在子文件夹中新增文件只会改变子文件夹的 mtime
+        sub = os.path.join(assets, 'sub')
+        mtime_ns, _ = file_key(sub)
+        self.write(os.path.join('a.assets', 'sub', 'y.png'), b'y')
+        os.utime(sub, ns=(mtime_ns + 10 ** 9, mtime_ns + 10 ** 9))
+        self.assertIsNone(index.get_listing(assets, file_key(assets)))
+
+    def test_phash_and_optimized_invalidated_by_change(self):
+        index = self.open_index()
+        image = self.write('x.png', b'png')
+        key = file_key(image)
+        index.put_phash(image, key, 2 ** 64 - 1)
+        index.put_optimized(image, key)
+        self.assertEqual(index.get_phash(image, key), 2 ** 64 - 1)
+        self.assertTrue(index.is_optimized(image, key))
+
+        self.write('x.png', b'png!')
+        self.assertIsNone(index.get_phash(image, file_key(image)))
+        self.assertFalse(index.is_optimized(image, file_key(image)))
+
+    def test_prune_removes_only_missing_documents_under_root(self):
+        index = self.open_index()
+        keep, gone = self.write('n/a.md', b''), self.write('n/b.md', b'')
+        outside = self.write('other/c.md', b'')
+        for md_file in (keep, gone, outside):
+            index.put_references(md_file, file_key(md_file), set())
+        self.assertEqual(index.prune(os.path.join(self.folder, 'n'), [keep]), 1)
+        self.assertIsNone(index.get_references(gone, file_key(gone)))
+        self.assertEqual(index.get_references(keep, file_key(keep)), set())
+        self.assertEqual(index.get_references(outside, file_key(outside)), set())
+
+    def test_connections_do_not_hold_the_write_lock(self):
+        # 界面中每个任务线程各自打开索引，一个连接写入后另一个连接立即可以写入
+        first, second = self.open_index(), self.open_index()
+        first.put_references('/notes/a.md', (1, 10), {'/notes/a.assets/x.png'})
+        second.put_references('/notes/b.md', (2, 20), {'/notes/b.assets/y.png'})
+        self.assertEqual(first.get_references('/notes/b.md', (2, 20)), {'/notes/b.assets/y.png'})
+        self.assertEqual(second.get_references('/notes/a.md', (1, 10)), {'/notes/a.assets/x.png'})
+
+    def test_locked_database_falls_back_to_no_cache(self):
+        index = self.open_index()
+        index.conn.execute('PRAGMA busy_timeout = 50')
+        other = sqlite3.connect(self.db_path)
+        self.addCleanup(other.close)
+        other.execute('BEGIN IMMEDIATE')
+        index.put_references('/notes/a.md', (1, 10), {'x'})  # 不抛出异常，只是不缓存
+        other.rollback()
+        self.assertIsNone(index.get_references('/notes/a.md', (1, 10)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+"""cleaner_journal 的测试：移动日志的记录、取消与撤销"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from cleaner_core import DELETED_FOLDER_NAME, move_unused_images
+from cleaner_journal import MoveJournal, new_run_id, undo_moves
+
+
+class MoveJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.assets = tempfile.mkdtemp(suffix='.assets')
+        self.addCleanup(shutil.rmtree, self.assets, True)
+        self.images = ['a.png', 'b.png', os.path.join('sub', 'c.png')]
+        for name in self.images:
+            self.write(name)
+
+    def write(self, name):
+        path = os.path.join(self.assets, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(name.encode())
+
+    def journal(self):
+        return MoveJournal(os.path.join(self.assets, DELETED_FOLDER_NAME))
+
+    def test_run_ids_are_unique(self):
+        self.assertEqual(len({new_run_id() for _ in range(100)}), 100)
+
+    def test_move_then_undo_round_trip(self):
+        moved = move_unused_images(self.assets, self.images, workers=2)
+        self.assertEqual(sorted(moved), sorted(self.images))
+        for name in self.images:
+            self.assertFalse(os.path.exists(os.path.join(self.assets, name)))
+        self.assertEqual(len(self.journal().load()), 3)
+
+        counts = undo_moves([self.journal()])
+        self.assertEqual(counts, {'restored': 3, 'skipped': 0, 'failed': 0})
+        for name in self.images:
+            with open(os.path.join(self.assets, name), 'rb') as f:
+                self.assertEqual(f.read(), name.encode())
+        self.assertEqual(self.journal().load(), [])
+
+    def test_undo_reverts_only_the_last_run(self):
+        move_unused_images(self.assets, ['a.png'])
+        move_unused_images(self.assets, ['b.png'])
+        undo_moves([self.journal()])
+        self.assertFalse(os.path.exists(os.path.join(self.assets, 'a.png')))
+        self.assertTrue(os.path.exists(os.path.join(self.assets, 'b.png')))
+        self.assertEqual([e['src'] for e in self.journal().load()], ['a.png'])
+
+    def test_cancelled_run_keeps_journal_consistent(self):
+        moved = move_unused_images(self.assets, self.images, workers=1,
+                                   should_stop=lambda: True)
+        # 取消前没有提交任何移动：日志中不应留下未执行的条目
+        self.assertEqual(moved, [])
+        self.assertEqual(self.journal().load(), [])
+
+        calls = []
+
+        def stop_after_first():
+            calls.append(1)
+            return len(calls) > 1
+
+        moved = move_unused_images(self.assets, self.images, workers=1,
+                                   should_stop=stop_after_first)
+        # 取消时进行中的几个文件照常完成，日志只保留实际移动的条目
+        self.assertTrue(0 < len(moved) < len(self.images))
+        self.assertEqual(sorted(e['src'] for e in self.journal().load()), sorted(moved))
+
+    def test_discard_only_touches_its_own_run(self):
+        journal = self.journal()
+        os.makedirs(journal.deleted_folder)
+        journal.record('run-1', [('a.png', 'a.png')])
+        journal.record('run-2', [('a.png', 'a.png')])
+        journal.discard('run-2', [('a.png', 'a.png')])
+        self.assertEqual([e['run'] for e in journal.load()], ['run-1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
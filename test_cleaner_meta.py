@@ -0,0 +1,109 @@
+"""cleaner_meta 的测试：从手工构造的最小文件头读取格式与尺寸"""
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from cleaner_meta import ImageInfo, iter_image_info, read_image_info
+
+try:  # 可选依赖，用于与真实编码器生成的文件核对
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+def png(width, height):
+    ihdr = struct.pack('>II', width, height) + b'\x08\x06\x00\x00\x00'
+    return b'\x89PNG\r\n\x1a\n' + struct.pack('>I', 13) + b'IHDR' + ihdr + b'\0' * 4
+
+
+def gif(width, height):
+    return b'GIF89a' + struct.pack('<HH', width, height) + b'\x00\x00\x00;'
+
+
+def jpeg(width, height, app_size=100):
+    # APP1 段比文件头长，帧头前还有填充的 0xFF，检查按段跳过的逻辑
+    app = b'\xff\xe1' + struct.pack('>H', app_size + 2) + b'\x00' * app_size
+    sof = b'\xff\xff\xc2' + struct.pack('>HBHH', 17, 8, height, width) + b'\x00' * 10
+    return b'\xff\xd8' + app + b'\xff\xdb' + struct.pack('>H', 4) + b'\x00\x00' + sof + b'\xff\xd9'
+
+
+def riff(chunk, payload):
+    data = b'WEBP' + chunk + struct.pack('<I', len(payload)) + payload
+    return b'RIFF' + struct.pack('<I', len(data)) + data
+
+
+def webp_vp8(width, height):
+    return riff(b'VP8 ', b'\x00\x00\x00\x9d\x01\x2a' + struct.pack('<HH', width, height) + b'\0' * 4)
+
+
+def webp_vp8l(width, height):
+    bits = (width - 1) | ((height - 1) << 14)
+    return riff(b'VP8L', b'\x2f' + struct.pack('<I', bits) + b'\0' * 4)
+
+
+def webp_vp8x(width, height):
+    return riff(b'VP8X', b'\0' * 4 + (width - 1).to_bytes(3, 'little')
+                + (height - 1).to_bytes(3, 'little'))
+
+
+class ReadImageInfoTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, True)
+
+    def write(self, name, data):
+        path = os.path.join(self.folder, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_headers(self):
+        cases = [
+            ('a.png', png(640, 480), 'png', 640, 480),
+            ('a.gif', gif(3, 65535), 'gif', 3, 65535),
+            ('a.jpg', jpeg(1920, 1080), 'jpeg', 1920, 1080),
+            ('lossy.webp', webp_vp8(300, 200), 'webp', 300, 200),
+            ('lossless.webp', webp_vp8l(16383, 1), 'webp', 16383, 1),
+            ('extended.webp', webp_vp8x(20000, 3), 'webp', 20000, 3),
+        ]
+        for name, data, fmt, width, height in cases:
+            with self.subTest(name=name):
+                info = read_image_info(self.write(name, data))
+                self.assertEqual(info, ImageInfo(len(data), fmt, width, height))
+
+    def test_truncated_or_unknown(self):
+        self.assertEqual(read_image_info(self.write('t.png', png(1, 1)[:20])),
+                         ImageInfo(20, 'png', None, None))
+        self.assertEqual(read_image_info(self.write('t.jpg', jpeg(5, 5)[:60])),
+                         ImageInfo(60, 'jpeg', None, None))
+        self.assertEqual(read_image_info(self.write('t.webp', webp_vp8x(2, 2)[:28])),
+                         ImageInfo(28, 'webp', None, None))
+        self.assertEqual(read_image_info(self.write('x.png', b'not an image')),
+                         ImageInfo(12, None, None, None))
+        self.assertEqual(read_image_info(self.write('empty.png', b'')), ImageInfo(0, None, None, None))
+        self.assertIsNone(read_image_info(os.path.join(self.folder, 'missing.png')))
+
+    def test_size_hint_and_parallel_reads(self):
+        paths = [self.write(f'{i}.gif', gif(i + 1, 2)) for i in range(20)]
+        results = dict(iter_image_info(paths, {paths[0]: 999}, workers=3))
+        self.assertEqual(set(results), set(paths))
+        self.assertEqual(results[paths[0]].size, 999)
+        self.assertEqual(results[paths[5]], ImageInfo(len(gif(6, 2)), 'gif', 6, 2))
+
+    @unittest.skipIf(Image is None, '需要 Pillow')
+    def test_matches_pillow(self):
+        for fmt, ext, kwargs in (('PNG', 'png', {}), ('JPEG', 'jpg', {'progressive': True}),
+                                 ('GIF', 'gif', {}), ('WEBP', 'webp', {'lossless': True}),
+                                 ('WEBP', 'webp', {'quality': 50})):
+            with self.subTest(fmt=fmt, **kwargs):
+                path = os.path.join(self.folder, f'pil.{ext}')
+                Image.new('RGB', (37, 23), (200, 10, 10)).save(path, fmt, **kwargs)
+                info = read_image_info(path)
+                self.assertEqual((info.width, info.height), (37, 23))
+
+
+if __name__ == '__main__':
+    unittest.main()
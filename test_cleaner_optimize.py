@@ -0,0 +1,170 @@
+"""cleaner_optimize 的测试：优化前后像素不变，只在变小时替换"""
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import zlib
+from unittest import mock
+
+import cleaner_optimize
+from cleaner_optimize import PNG_SIGNATURE, optimize_image, optimize_jpeg, optimize_png
+
+try:  # 可选依赖，用于解码比较像素
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+def chunk(kind, payload):
+    return (struct.pack('>I', len(payload)) + kind + payload
+            + struct.pack('>I', zlib.crc32(kind + payload) & 0xffffffff))
+
+
+def make_png(width=64, height=48, extra=()):
+    """未压缩（level 0）、拆成多个 IDAT 并带文本块的 RGB PNG"""
+    rows = b''.join(bytes([row % 5]) + bytes((x * 7 + row * 3 + c) % 256
+                                              for x in range(width) for c in range(3))
+                    for row in range(height))
+    data = zlib.compress(rows, 0)
+    half = len(data) // 2
+    return b''.join([
+        PNG_SIGNATURE,
+        chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)),
+        chunk(b'tEXt', b'Software\0test'),
+        *extra,
+        chunk(b'IDAT', data[:half]),
+        chunk(b'IDAT', data[half:]),
+        chunk(b'tIME', b'\x07\xea\x01\x01\x00\x00\x00'),
+        chunk(b'IEND', b''),
+    ])
+
+
+def png_chunks(data):
+    return list(cleaner_optimize._png_chunks(data))
+
+
+def idat(data):
+    return zlib.decompress(b''.join(p for kind, p in png_chunks(data) if kind == b'IDAT'))
+
+
+def exif(orientation):
+    ifd = struct.pack('<H', 1) + struct.pack('<HHII', 0x0112, 3, 1, orientation) + b'\0' * 4
+    return b'Exif\0\0' + b'II*\0' + struct.pack('<I', 8) + ifd
+
+
+def segment(marker, payload):
+    return bytes([0xFF, marker]) + struct.pack('>H', len(payload) + 2) + payload
+
+
+class OptimizePngTest(unittest.TestCase):
+
+    def test_pixels_unchanged_and_metadata_stripped(self):
+        data = make_png(extra=[chunk(b'gAMA', struct.pack('>I', 45455))])
+        optimized = optimize_png(data)
+        self.assertLess(len(optimized), len(data))
+        self.assertEqual(idat(optimized), idat(data))
+        kinds = [kind for kind, _ in png_chunks(optimized)]
+        self.assertEqual(kinds, [b'IHDR', b'gAMA', b'IDAT', b'IEND'])
+
+    def test_animated_or_broken_png_is_skipped(self):
+        self.assertIsNone(optimize_png(make_png(extra=[chunk(b'acTL', b'\0' * 8)])))
+        self.assertIsNone(optimize_png(b'not a png'))
+        with self.assertRaises(ValueError):
+            optimize_png(make_png()[:-20])
+
+
+class OptimizeJpegTest(unittest.TestCase):
+
+    def jpeg(self, *segments):
+        scan = segment(0xDA, b'\x01\x01\x00\x00\x3f\x00') + b'\x12\x34\xff\x00\x56' + b'\xff\xd9'
+        return b'\xff\xd8' + b''.join(segments) + scan
+
+    def test_metadata_segments_removed(self):
+        jfif = segment(0xE0, b'JFIF\0\x01\x01\0\0\x01\0\x01\0\0')
+        icc = segment(0xE2, b'ICC_PROFILE\0' + b'\0' * 10)
+        data = self.jpeg(jfif, segment(0xE1, exif(1)), icc, segment(0xFE, b'comment'),
+                         segment(0xED, b'Photoshop 3.0\0'))
+        self.assertEqual(optimize_jpeg(data), self.jpeg(jfif, icc))
+
+    def test_rotated_exif_is_kept(self):
+        data = self.jpeg(segment(0xE1, exif(6)), segment(0xFE, b'comment'))
+        self.assertEqual(optimize_jpeg(data), self.jpeg(segment(0xE1, exif(6))))
+
+    def test_broken_jpeg_is_skipped(self):
+        self.assertIsNone(optimize_jpeg(b'\xff\xd8\xff\xe1\xff\xff'))
+        self.assertIsNone(optimize_jpeg(b'GIF89a'))
+
+
+class OptimizeImageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, True)
+
+    def write(self, name, data):
+        path = os.path.join(self.folder, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_round_trip_replaces_file(self):
+        path = self.write('a.png', make_png())
+        before = os.path.getsize(path)
+        dry = optimize_image(path, dry_run=True)
+        self.assertFalse(dry['replaced'])
+        self.assertEqual(os.path.getsize(path), before)
+
+        result = optimize_image(path)
+        self.assertTrue(result['replaced'])
+        self.assertEqual(result['before'], before)
+        self.assertEqual(result['after'], os.path.getsize(path))
+        st = os.stat(path)
+        self.assertEqual(result['key'], (st.st_mtime_ns, st.st_size))
+        self.assertEqual(os.listdir(self.folder), ['a.png'])
+
+        # 再次优化不会继续变小，也不替换
+        again = optimize_image(path)
+        self.assertFalse(again['replaced'])
+        self.assertEqual(again['after'], again['before'])
+
+    @unittest.skipIf(Image is None, '需要 Pillow')
+    def test_decoded_pixels_identical(self):
+        source = Image.new('RGBA', (50, 30))
+        source.putdata([(x * 5 % 256, y * 8 % 256, (x * y) % 256, 200) for y in range(30)
+                        for x in range(50)])
+        png_path = os.path.join(self.folder, 'b.png')
+        source.save(png_path, compress_level=1)
+        jpg_path = os.path.join(self.folder, 'c.jpg')
+        exif_data = Image.Exif()
+        exif_data[0x010E] = 'description'
+        source.convert('RGB').save(jpg_path, quality=90, exif=exif_data.tobytes())
+
+        for path in (png_path, jpg_path):
+            with self.subTest(path=os.path.basename(path)):
+                with Image.open(path) as image:
+                    expected = image.convert('RGBA').tobytes()
+                self.assertTrue(optimize_image(path)['replaced'])
+                with Image.open(path) as image:
+                    self.assertEqual(image.convert('RGBA').tobytes(), expected)
+
+    def test_file_modified_during_optimize_is_kept(self):
+        path = self.write('a.png', make_png())
+        copymode = shutil.copymode
+
+        def modify(src, dst):
+            with open(path, 'ab') as f:
+                f.write(b'!')
+            copymode(src, dst)
+
+        with mock.patch.object(cleaner_optimize.shutil, 'copymode', modify):
+            result = optimize_image(path)
+        self.assertFalse(result['replaced'])
+        self.assertEqual(result['after'], result['before'])
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), make_png() + b'!')
+        self.assertEqual(os.listdir(self.folder), ['a.png'])
+
+
+if __name__ == '__main__':
+    unittest.main()
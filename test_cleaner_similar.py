@@ -0,0 +1,107 @@
+"""cleaner_similar 的测试：多重索引查询与逐对比较的结果一致"""
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from cleaner_similar import (MultiIndexHash, find_similar_groups, hamming, perceptual_hash,
+                             similar_available)
+
+try:  # 可选依赖
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+def flip(value, bits, rng):
+    for bit in rng.sample(range(64), bits):
+        value ^= 1 << bit
+    return value
+
+
+def random_hashes(rng, count=300):
+    """若干簇：每簇一个中心和几个翻转了 0~16 位的变体，距离覆盖查询半径的两侧"""
+    hashes = {}
+    while len(hashes) < count:
+        center = rng.getrandbits(64)
+        for _ in range(rng.randint(1, 6)):
+            hashes[f'img{len(hashes):03d}.png'] = flip(center, rng.randint(0, 16), rng)
+    return hashes
+
+
+class MultiIndexHashTest(unittest.TestCase):
+
+    def test_search_matches_brute_force(self):
+        rng = random.Random(1)
+        hashes = random_hashes(rng)
+        index = MultiIndexHash()
+        for item, value in hashes.items():
+            index.add(value, item)
+        self.assertEqual(len(index), len(hashes))
+        queries = list(hashes.values())[:100] + [rng.getrandbits(64) for _ in range(20)]
+        for radius in (0, 3, 4, 7, 10, 12):
+            for query in queries:
+                expected = sorted((hamming(query, value), item) for item, value in hashes.items()
+                                  if hamming(query, value) <= radius)
+                self.assertEqual(sorted(index.search(query, radius)), expected)
+
+    def test_groups_match_brute_force(self):
+        hashes = random_hashes(random.Random(2), 200)
+        parent = {path: path for path in hashes}
+
+        def find(path):
+            while parent[path] != path:
+                path = parent[path]
+            return path
+
+        paths = sorted(hashes)
+        for i, a in enumerate(paths):
+            for b in paths[i + 1:]:
+                if hamming(hashes[a], hashes[b]) <= 10:
+                    parent[find(b)] = find(a)
+        groups = {}
+        for path in paths:
+            groups.setdefault(find(path), []).append(path)
+        expected = sorted((group for group in groups.values() if len(group) > 1),
+                          key=lambda group: (-len(group), group[0]))
+        self.assertEqual(find_similar_groups(hashes, 10), expected)
+
+    def test_hamming(self):
+        self.assertEqual(hamming(0, 0), 0)
+        self.assertEqual(hamming(0, 2 ** 64 - 1), 64)
+        self.assertEqual(hamming(0b1011, 0b0110), 3)
+
+
+@unittest.skipUnless(similar_available() and Image is not None, '需要 numpy 与 Pillow')
+class PerceptualHashTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, True)
+
+    def save(self, image, name, **kwargs):
+        path = os.path.join(self.folder, name)
+        image.save(path, **kwargs)
+        return path
+
+    def test_reencoded_copy_is_close(self):
+        image = Image.new('RGB', (200, 120), 'white')
+        image.paste((30, 60, 200), (20, 10, 120, 90))
+        image.paste((220, 40, 40), (130, 50, 190, 110))
+        original = perceptual_hash(self.save(image, 'a.png'))
+        resized = perceptual_hash(self.save(image.resize((150, 90)), 'b.jpg', quality=70))
+        other = perceptual_hash(self.save(image.transpose(Image.FLIP_LEFT_RIGHT), 'c.png'))
+        self.assertLessEqual(hamming(original, resized), 10)
+        self.assertGreater(hamming(original, other), 10)
+
+    def test_flat_or_broken_images_have_no_hash(self):
+        self.assertIsNone(perceptual_hash(self.save(Image.new('RGB', (50, 50), 'red'), 'flat.png')))
+        path = os.path.join(self.folder, 'broken.png')
+        with open(path, 'wb') as f:
+            f.write(b'\x89PNG\r\n\x1a\nbroken')
+        self.assertIsNone(perceptual_hash(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
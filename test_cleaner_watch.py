@@ -0,0 +1,93 @@
+"""cleaner_watch 的测试：VaultState 按事件增量更新孤儿集合"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from cleaner_watch import VaultState
+
+
+class VaultStateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        self.assets = os.path.join(self.root, 'a.assets')
+        self.md_file = os.path.join(self.root, 'a.md')
+        self.write('a.assets/x.png', '')
+        self.write('a.assets/y.png', '')
+        self.write('a.md', '![](a.assets/x.png)\n')
+        self.state = VaultState(self.root)
+        self.state.load()
+
+    def path(self, name):
+        return os.path.join(self.root, *name.split('/'))
+
+    def write(self, name, text):
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def apply(self, *events):
+        """应用事件，并检查增量结果与重新加载整个笔记库的结果一致"""
+        changes = self.state.apply(list(events))
+        fresh = VaultState(self.root)
+        fresh.load()
+        self.assertEqual(self.state.orphan_paths(), fresh.orphan_paths())
+        return changes
+
+    def test_initial_orphans(self):
+        self.assertEqual(self.state.orphan_paths(), [self.path('a.assets/y.png')])
+
+    def test_create_image(self):
+        self.write('a.assets/sub/z.png', '')
+        added, removed = self.apply(('dir', self.path('a.assets/sub')), ('dir', self.assets))
+        self.assertEqual((added, removed), ([self.path('a.assets/sub/z.png')], []))
+
+    def test_modify_document(self):
+        self.write('a.md', '![](a.assets/y.png)\n')
+        added, removed = self.apply(('md', self.md_file))
+        self.assertEqual(added, [self.path('a.assets/x.png')])
+        self.assertEqual(len(removed), 1)
+        self.assertEqual(self.state.orphan_paths(), [self.path('a.assets/x.png')])
+
+    def test_delete_document_and_image(self):
+        os.remove(self.md_file)
+        added, _ = self.apply(('md', self.md_file))
+        self.assertEqual(added, [self.path('a.assets/x.png')])
+
+        os.remove(self.path('a.assets/y.png'))
+        added, removed = self.apply(('dir', self.assets))
+        self.assertEqual((added, len(removed)), ([], 1))
+        self.assertEqual(self.state.orphan_paths(), [self.path('a.assets/x.png')])
+
+    def test_rename_image_and_document(self):
+        os.rename(self.path('a.assets/x.png'), self.path('a.assets/w.png'))
+        added, _ = self.apply(('dir', self.assets))
+        self.assertEqual(added, [self.path('a.assets/w.png')])  # 文档仍引用旧名字
+
+        self.write('a.md', '![](a.assets/w.png)\n')
+        os.rename(self.md_file, self.path('c.md'))
+        added, removed = self.apply(('md', self.md_file), ('md', self.path('c.md')))
+        self.assertEqual(added, [])
+        self.assertEqual(len(removed), 1)
+        self.assertEqual(self.state.orphan_paths(), [self.path('a.assets/y.png')])
+        self.assertEqual(self.state.graph.refcount(self.path('a.assets/w.png')), 1)
+
+    def test_rename_assets_folder(self):
+        os.rename(self.assets, self.path('b.assets'))
+        added, _ = self.apply(('dir', self.assets), ('dir', self.path('b.assets')),
+                              ('dir', self.root))
+        self.assertEqual(added, [self.path('b.assets/x.png'), self.path('b.assets/y.png')])
+        self.assertNotIn(self.assets, self.state.asset_roots)
+
+    def test_rescan(self):
+        self.write('a.md', '')
+        self.write('c.assets/c.png', '')
+        added, _ = self.apply(('rescan', None))
+        self.assertEqual(added, [self.path('a.assets/x.png'), self.path('c.assets/c.png')])
+
+
+if __name__ == '__main__':
+    unittest.main()